@@ -0,0 +1,62 @@
+"""Add search analytics rollups
+
+Revision ID: 1648ad67cd99
+Revises: 945392376599
+Create Date: 2026-10-18 11:52:37.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1648ad67cd99'
+down_revision: Union[str, Sequence[str], None] = '945392376599'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'search_analytics_rollups',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('site_id', sa.BigInteger(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('dimension', sa.String(length=10), nullable=False),
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), nullable=False),
+        sa.Column('impressions', sa.BigInteger(), nullable=False),
+        sa.Column('position_sum', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_search_analytics_rollups_site_dimension_date',
+        'search_analytics_rollups',
+        ['site_id', 'dimension', 'date'],
+        unique=False
+    )
+
+    # Daha önce senkronize edilmiş günlerin rollup'larını oluştur
+    for dimension in ('query', 'page', 'country', 'device'):
+        op.execute(f"""
+            INSERT INTO search_analytics_rollups (site_id, date, dimension, value, clicks, impressions, position_sum)
+            SELECT site_id, date, '{dimension}', {dimension}, sum(clicks), sum(impressions), sum(position * impressions)
+            FROM search_analytics_rows
+            GROUP BY site_id, date, {dimension}
+        """)
+    op.execute("""
+        INSERT INTO search_analytics_rollups (site_id, date, dimension, value, clicks, impressions, position_sum)
+        SELECT site_id, date, 'total', '', sum(clicks), sum(impressions), sum(position * impressions)
+        FROM search_analytics_rows
+        GROUP BY site_id, date
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_search_analytics_rollups_site_dimension_date', table_name='search_analytics_rollups')
+    op.drop_table('search_analytics_rollups')
@@ -0,0 +1,75 @@
+"""Add scheduled jobs and dashboard snapshots
+
+Revision ID: 2f6c9d3b7e41
+Revises: 8e2b5f4c1a70
+Create Date: 2026-10-18 16:21:44.907312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6c9d3b7e41'
+down_revision: Union[str, Sequence[str], None] = '8e2b5f4c1a70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'scheduled_jobs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('site_id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('run_key', sa.String(length=40), nullable=True),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('locked_by', sa.String(length=64), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_scheduled_jobs_status_run_at', 'scheduled_jobs', ['status', 'run_at'], unique=False)
+    op.create_index(
+        'ix_scheduled_jobs_site_kind_run_key',
+        'scheduled_jobs',
+        ['site_id', 'kind', 'run_key'],
+        unique=True
+    )
+    op.create_index('ix_scheduled_jobs_user_locked', 'scheduled_jobs', ['user_id', 'locked_at'], unique=False)
+
+    op.create_table(
+        'dashboard_snapshots',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('site_id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=True),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_dashboard_snapshots_site_kind', 'dashboard_snapshots', ['site_id', 'kind'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_dashboard_snapshots_site_kind', table_name='dashboard_snapshots')
+    op.drop_table('dashboard_snapshots')
+    op.drop_index('ix_scheduled_jobs_user_locked', table_name='scheduled_jobs')
+    op.drop_index('ix_scheduled_jobs_site_kind_run_key', table_name='scheduled_jobs')
+    op.drop_index('ix_scheduled_jobs_status_run_at', table_name='scheduled_jobs')
+    op.drop_table('scheduled_jobs')
@@ -0,0 +1,49 @@
+"""Add site host
+
+Revision ID: 5c0d7a1e9b23
+Revises: b3e91f0c2d47
+Create Date: 2026-10-18 12:41:09.287614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c0d7a1e9b23'
+down_revision: Union[str, Sequence[str], None] = 'b3e91f0c2d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# site_utils.site_host ile aynı normalizasyon: baştaki protokol ve sondaki slaşlar atılır, küçük harfe çevrilir
+SITE_HOST_SQL = "lower(rtrim(regexp_replace(btrim(site_url), '^https?://', '', 'i'), '/'))"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Aynı hosta çözülen siteler benzersiz indeksi bozar; farklı kullanıcılara ait
+    # olabilecekleri için otomatik birleştirilmez, migration değişiklik yapmadan durur
+    duplicates = op.get_bind().execute(sa.text(f"""
+        SELECT {SITE_HOST_SQL} AS host, string_agg(id::text || ':' || site_url, ', ' ORDER BY id)
+        FROM sites
+        GROUP BY 1
+        HAVING count(*) > 1
+    """)).all()
+    if duplicates:
+        listing = "; ".join(f"{host} -> {sites}" for host, sites in duplicates)
+        raise RuntimeError(f"Sites resolving to the same host must be merged before this migration: {listing}")
+
+    op.add_column('sites', sa.Column('site_host', sa.String(length=255), nullable=True))
+    op.execute(f"UPDATE sites SET site_host = {SITE_HOST_SQL}")
+
+    op.alter_column('sites', 'site_host', nullable=False)
+    op.create_index(op.f('ix_sites_site_host'), 'sites', ['site_host'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sites_site_host'), table_name='sites')
+    op.drop_column('sites', 'site_host')
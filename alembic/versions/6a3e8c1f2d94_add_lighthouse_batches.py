@@ -0,0 +1,66 @@
+"""Add lighthouse batches
+
+Revision ID: 6a3e8c1f2d94
+Revises: 2f6c9d3b7e41
+Create Date: 2026-10-18 18:05:12.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a3e8c1f2d94'
+down_revision: Union[str, Sequence[str], None] = '2f6c9d3b7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'lighthouse_batches',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('site', sa.String(length=255), nullable=False),
+        sa.Column('strategy', sa.String(length=20), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('claimed_by', sa.String(length=64), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_lighthouse_batches_user_id'), 'lighthouse_batches', ['user_id'], unique=False)
+
+    op.create_table(
+        'lighthouse_batch_items',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.String(length=32), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=True),
+        sa.Column('cache', sa.String(length=10), nullable=True),
+        sa.Column('scores', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['lighthouse_batches.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_lighthouse_batch_items_job_status', 'lighthouse_batch_items', ['job_id', 'status'], unique=False)
+    op.create_index('ix_lighthouse_batch_items_job_seq', 'lighthouse_batch_items', ['job_id', 'seq'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lighthouse_batch_items_job_seq', table_name='lighthouse_batch_items')
+    op.drop_index('ix_lighthouse_batch_items_job_status', table_name='lighthouse_batch_items')
+    op.drop_table('lighthouse_batch_items')
+    op.drop_index(op.f('ix_lighthouse_batches_user_id'), table_name='lighthouse_batches')
+    op.drop_table('lighthouse_batches')
@@ -20,9 +20,105 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    pass
+    # Eski sürümler bu tabloları açılışta create_all ile oluşturuyordu; var olanlar atlanır
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('username', sa.String(length=50), nullable=False),
+            sa.Column('email', sa.String(length=100), nullable=True),
+            sa.Column('hashed_password', sa.String(length=255), nullable=False),
+            sa.Column('google_id', sa.String(length=50), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('google_id')
+        )
+        op.create_index(op.f('ix_users_username'), 'users', ['username'], unique=True)
+        op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+        op.create_index(op.f('ix_users_is_active'), 'users', ['is_active'], unique=False)
+
+    if 'tokens' not in existing:
+        op.create_table(
+            'tokens',
+            sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('access_token', sa.Text(), nullable=False),
+            sa.Column('refresh_token', sa.Text(), nullable=True),
+            sa.Column('token_uri', sa.String(length=255), nullable=False),
+            sa.Column('client_id', sa.String(length=255), nullable=False),
+            sa.Column('client_secret', sa.String(length=255), nullable=False),
+            sa.Column('scopes', sa.String(length=500), nullable=False),
+            sa.Column('expiry', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('user_id')
+        )
+
+    if 'sites' not in existing:
+        op.create_table(
+            'sites',
+            sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('site_url', sa.String(length=255), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_sites_site_url'), 'sites', ['site_url'], unique=True)
+
+    if 'site_settings' not in existing:
+        op.create_table(
+            'site_settings',
+            sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('site_id', sa.BigInteger(), nullable=False),
+            sa.Column('api_key', sa.String(length=255), nullable=True),
+            sa.Column('api_key_status', sa.String(length=20), nullable=True),
+            sa.Column('last_tested', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('site_id')
+        )
+
+    if 'google_analytics_properties' not in existing:
+        op.create_table(
+            'google_analytics_properties',
+            sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+            sa.Column('site_id', sa.BigInteger(), nullable=False),
+            sa.Column('property_id', sa.String(length=255), nullable=False),
+            sa.Column('measurement_id', sa.String(length=50), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('property_id')
+        )
+        op.create_index(
+            op.f('ix_google_analytics_properties_is_active'),
+            'google_analytics_properties',
+            ['is_active'],
+            unique=False
+        )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    pass
+    op.drop_index(op.f('ix_google_analytics_properties_is_active'), table_name='google_analytics_properties')
+    op.drop_table('google_analytics_properties')
+    op.drop_table('site_settings')
+    op.drop_index(op.f('ix_sites_site_url'), table_name='sites')
+    op.drop_table('sites')
+    op.drop_table('tokens')
+    op.drop_index(op.f('ix_users_is_active'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_table('users')
@@ -0,0 +1,70 @@
+"""Add url inspection history
+
+Revision ID: 8e2b5f4c1a70
+Revises: d41a7c3e8f15
+Create Date: 2026-10-18 15:02:11.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2b5f4c1a70'
+down_revision: Union[str, Sequence[str], None] = 'd41a7c3e8f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'inspected_urls',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('property_url', sa.String(length=255), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('verdict', sa.String(length=20), nullable=True),
+        sa.Column('coverage_state', sa.String(length=255), nullable=True),
+        sa.Column('google_canonical', sa.Text(), nullable=True),
+        sa.Column('user_canonical', sa.Text(), nullable=True),
+        sa.Column('last_crawl_time', sa.DateTime(), nullable=True),
+        sa.Column('impressions', sa.BigInteger(), nullable=True),
+        sa.Column('checked_at', sa.DateTime(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inspected_urls_property_url', 'inspected_urls', ['property_url', 'url'], unique=True)
+    op.create_index('ix_inspected_urls_property_checked', 'inspected_urls', ['property_url', 'checked_at'], unique=False)
+
+    op.create_table(
+        'url_inspection_snapshots',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('url_id', sa.BigInteger(), nullable=False),
+        sa.Column('verdict', sa.String(length=20), nullable=True),
+        sa.Column('coverage_state', sa.String(length=255), nullable=True),
+        sa.Column('google_canonical', sa.Text(), nullable=True),
+        sa.Column('user_canonical', sa.Text(), nullable=True),
+        sa.Column('last_crawl_time', sa.DateTime(), nullable=True),
+        sa.Column('inspected_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['inspected_urls.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_url_inspection_snapshots_url_inspected',
+        'url_inspection_snapshots',
+        ['url_id', 'inspected_at'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_url_inspection_snapshots_url_inspected', table_name='url_inspection_snapshots')
+    op.drop_table('url_inspection_snapshots')
+    op.drop_index('ix_inspected_urls_property_checked', table_name='inspected_urls')
+    op.drop_index('ix_inspected_urls_property_url', table_name='inspected_urls')
+    op.drop_table('inspected_urls')
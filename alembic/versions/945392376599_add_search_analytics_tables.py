@@ -0,0 +1,61 @@
+"""Add search analytics tables
+
+Revision ID: 945392376599
+Revises: 7df6228ba9c4
+Create Date: 2026-10-18 11:25:04.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '945392376599'
+down_revision: Union[str, Sequence[str], None] = '7df6228ba9c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'search_analytics_rows',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('site_id', sa.BigInteger(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('page', sa.Text(), nullable=False),
+        sa.Column('country', sa.String(length=3), nullable=False),
+        sa.Column('device', sa.String(length=10), nullable=False),
+        sa.Column('clicks', sa.Integer(), nullable=False),
+        sa.Column('impressions', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_search_analytics_rows_site_date', 'search_analytics_rows', ['site_id', 'date'], unique=False)
+
+    op.create_table(
+        'search_analytics_syncs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('site_id', sa.BigInteger(), nullable=False),
+        sa.Column('first_date', sa.Date(), nullable=True),
+        sa.Column('last_date', sa.Date(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['site_id'], ['sites.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('site_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('search_analytics_syncs')
+    op.drop_index('ix_search_analytics_rows_site_date', table_name='search_analytics_rows')
+    op.drop_table('search_analytics_rows')
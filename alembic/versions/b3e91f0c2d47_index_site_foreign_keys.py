@@ -0,0 +1,35 @@
+"""Index site foreign keys
+
+Revision ID: b3e91f0c2d47
+Revises: 1648ad67cd99
+Create Date: 2026-10-18 12:20:41.553108
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e91f0c2d47'
+down_revision: Union[str, Sequence[str], None] = '1648ad67cd99'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_sites_user_id'), 'sites', ['user_id'], unique=False)
+    op.create_index(
+        op.f('ix_google_analytics_properties_site_id'),
+        'google_analytics_properties',
+        ['site_id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_google_analytics_properties_site_id'), table_name='google_analytics_properties')
+    op.drop_index(op.f('ix_sites_user_id'), table_name='sites')
@@ -0,0 +1,34 @@
+"""Add url inspection quota usage
+
+Revision ID: c7b2e4f19a36
+Revises: 6a3e8c1f2d94
+Create Date: 2026-10-18 20:41:37.902516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7b2e4f19a36'
+down_revision: Union[str, Sequence[str], None] = '6a3e8c1f2d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'url_inspection_quota_usage',
+        sa.Column('property_url', sa.String(length=255), nullable=False),
+        sa.Column('day_start', sa.DateTime(), nullable=False),
+        sa.Column('used', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('property_url', 'day_start')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('url_inspection_quota_usage')
@@ -0,0 +1,67 @@
+"""Add url inspection jobs
+
+Revision ID: d41a7c3e8f15
+Revises: 5c0d7a1e9b23
+Create Date: 2026-10-18 13:34:52.640183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7c3e8f15'
+down_revision: Union[str, Sequence[str], None] = '5c0d7a1e9b23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'url_inspection_jobs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('property_url', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('completed', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('claimed_by', sa.String(length=64), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_url_inspection_jobs_user_id'), 'url_inspection_jobs', ['user_id'], unique=False)
+
+    op.create_table(
+        'url_inspection_items',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('job_id', sa.BigInteger(), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=True),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('inspected_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['url_inspection_jobs.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_url_inspection_items_job_status', 'url_inspection_items', ['job_id', 'status'], unique=False)
+    op.create_index('ix_url_inspection_items_job_seq', 'url_inspection_items', ['job_id', 'seq'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_url_inspection_items_job_seq', table_name='url_inspection_items')
+    op.drop_index('ix_url_inspection_items_job_status', table_name='url_inspection_items')
+    op.drop_table('url_inspection_items')
+    op.drop_index(op.f('ix_url_inspection_jobs_user_id'), table_name='url_inspection_jobs')
+    op.drop_table('url_inspection_jobs')
@@ -0,0 +1,130 @@
+# auth.py
+import hmac
+import os
+import time
+from collections import OrderedDict
+
+import jwt
+from fastapi import HTTPException
+
+# Varsayılan bir anahtarla imzalanan token'lar taklit edilebilir; anahtar yoksa uygulama başlamaz
+SECRET = os.getenv("JWT_SECRET")
+if not SECRET:
+    raise ValueError("JWT_SECRET environment variable is not set")
+JWT_ALGORITHM = "HS256"
+# Oturum süresi (cookie max_age ile aynı)
+JWT_TTL_SECONDS = int(os.getenv("JWT_TTL_SECONDS", "86400"))
+# /metrics için izleme sistemlerine verilen token; boşsa endpoint kapalıdır
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Doğrulanmış token önbelleğinin en fazla eleman sayısı
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+
+
+def create_jwt(user_id: int):
+    """Kullanıcı ID'sine göre iat/exp içeren JWT oluşturur"""
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": str(user_id), "iat": now, "exp": now + JWT_TTL_SECONDS},
+        SECRET,
+        algorithm=JWT_ALGORITHM
+    )
+
+
+class TokenCache:
+    """
+    Doğrulanmış JWT'lerin LRU önbelleği.
+
+    Token -> (user_id, exp); süresi dolan kayıt okunurken, boyut aşılınca en eski kayıt atılır.
+    """
+
+    def __init__(self, max_size=AUTH_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user_id, exp = entry
+        if exp <= time.time():
+            del self._entries[token]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return user_id
+
+    def put(self, token, user_id, exp):
+        self._entries[token] = (user_id, exp)
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache()
+
+
+def verify_token(token):
+    """
+    JWT'yi doğrular ve user_id döndürür; doğrulanmış token'lar süreleri dolana kadar önbellekten döner.
+
+    Raises:
+        jwt.InvalidTokenError: İmza/süre geçersizse ya da exp/sub yoksa
+    """
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    payload = jwt.decode(token, SECRET, algorithms=[JWT_ALGORITHM], options={"require": ["exp", "sub"]})
+    try:
+        user_id = int(payload["sub"])
+    except (ValueError, TypeError):
+        raise jwt.InvalidTokenError("Invalid subject")
+    token_cache.put(token, user_id, payload["exp"])
+    return user_id
+
+
+def authenticate(request):
+    """İstekteki 'token' cookie'sinden user_id döndürür, yoksa/geçersizse 401"""
+    jwt_token = request.cookies.get("token")
+    if not jwt_token:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    try:
+        return verify_token(jwt_token)
+    except jwt.InvalidTokenError as e:
+        print(f"Token doğrulama hatası: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def require_metrics_token(request):
+    """İç metrikler yalnızca 'Authorization: Bearer <METRICS_TOKEN>' ile okunabilir"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+
+class UserContext:
+    """
+    İstek boyunca oturumdaki kullanıcı.
+
+    Google kimlik bilgileri ilk ihtiyaçta bir kez yüklenir.
+    """
+
+    def __init__(self, user_id, db, credential_loader):
+        self.user_id = user_id
+        self.db = db
+        self._credential_loader = credential_loader
+        self._credentials = None
+
+    async def credentials(self):
+        if self._credentials is None:
+            self._credentials = await self._credential_loader(self.user_id, self.db)
+        return self._credentials
@@ -0,0 +1,161 @@
+# credential_store.py
+import asyncio
+import datetime
+import os
+
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request as GoogleRequest
+from sqlalchemy.future import select
+
+from google_services import run_blocking
+from models import TokenStorage
+
+# Token süresinin dolmasına bu kadar süre kala arka planda yenilenir
+REFRESH_AHEAD = datetime.timedelta(
+    seconds=int(os.getenv("CREDENTIAL_REFRESH_AHEAD_SECONDS", "300"))
+)
+
+
+class CredentialError(Exception):
+    """Kimlik bilgisi alınamadığında fırlatılan temel hata"""
+
+
+class CredentialNotFoundError(CredentialError):
+    """Kullanıcı için kayıtlı Google token'ı yok"""
+
+
+class CredentialRefreshError(CredentialError):
+    """Token süresi dolmuş ve yenilenemedi"""
+
+
+def _credentials_from_storage(token_storage):
+    return Credentials(
+        token=token_storage.access_token,
+        refresh_token=token_storage.refresh_token,
+        token_uri=token_storage.token_uri,
+        client_id=token_storage.client_id,
+        client_secret=token_storage.client_secret,
+        scopes=token_storage.scopes.split(","),
+        expiry=token_storage.expiry
+    )
+
+
+def _copy_credentials(creds):
+    return Credentials(
+        token=creds.token,
+        refresh_token=creds.refresh_token,
+        token_uri=creds.token_uri,
+        client_id=creds.client_id,
+        client_secret=creds.client_secret,
+        scopes=creds.scopes,
+        expiry=creds.expiry
+    )
+
+
+def _expires_soon(creds):
+    if creds.expiry is None:
+        return False
+    # google-auth expiry değerini naive UTC olarak tutar
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now <= REFRESH_AHEAD
+
+
+class CredentialStore:
+    """
+    Kullanıcı bazlı Google kimlik bilgisi önbelleği.
+
+    Geçerli kimlik bilgileri DB'ye gitmeden döndürülür, süresi yaklaşanlar arka
+    planda yenilenir ve aynı kullanıcı için eşzamanlı yenilemeler tek bir Google
+    çağrısında birleştirilir. Her yenileme tokens tablosuna bir kez yazılır.
+    """
+
+    def __init__(self, session_factory):
+        self._session_factory = session_factory
+        # user_id -> Credentials
+        self._credentials = {}
+        # user_id -> devam eden yenileme görevi
+        self._refreshing = {}
+
+    async def get(self, user_id, db=None):
+        """
+        Kullanıcının kullanıma hazır kimlik bilgisini döndürür.
+
+        Args:
+            user_id (int): Kullanıcı ID'si
+            db (AsyncSession): Önbellekte yoksa okuma için kullanılacak session
+
+        Returns:
+            Credentials: Geçerli Google kimlik bilgisi
+        """
+        creds = self._credentials.get(user_id)
+        if creds is None:
+            creds = await self._load(user_id, db)
+
+        if creds.valid:
+            if creds.refresh_token and _expires_soon(creds):
+                self._start_refresh(user_id, creds)
+            return creds
+
+        if not creds.refresh_token:
+            raise CredentialRefreshError("Token süresi doldu ve refresh token yok")
+
+        # Aynı anda gelen istekler aynı yenileme görevini bekler
+        return await asyncio.shield(self._start_refresh(user_id, creds))
+
+    def put(self, user_id, creds):
+        """OAuth callback sonrası yeni kimlik bilgisini önbelleğe koyar"""
+        self._credentials[user_id] = creds
+
+    def invalidate(self, user_id):
+        self._credentials.pop(user_id, None)
+
+    async def _load(self, user_id, db):
+        if db is not None:
+            token_storage = await self._fetch_token_storage(db, user_id)
+        else:
+            async with self._session_factory() as session:
+                token_storage = await self._fetch_token_storage(session, user_id)
+
+        if not token_storage:
+            raise CredentialNotFoundError(f"user_id={user_id} için Google token'ı bulunamadı")
+
+        creds = _credentials_from_storage(token_storage)
+        self._credentials[user_id] = creds
+        return creds
+
+    async def _fetch_token_storage(self, session, user_id):
+        res = await session.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
+        return res.scalar_one_or_none()
+
+    def _start_refresh(self, user_id, creds):
+        task = self._refreshing.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(user_id, creds))
+            self._refreshing[user_id] = task
+            task.add_done_callback(lambda t: self._on_refresh_done(user_id, t))
+        return task
+
+    def _on_refresh_done(self, user_id, task):
+        self._refreshing.pop(user_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Token yenileme hatası (user_id={user_id}): {task.exception()}")
+
+    async def _refresh(self, user_id, creds):
+        # Diğer istekler eski token'ı kullanmaya devam ederken kopya üzerinde yenile
+        fresh = _copy_credentials(creds)
+        try:
+            await run_blocking("token.refresh", fresh.refresh, GoogleRequest())
+        except Exception as e:
+            raise CredentialRefreshError(str(e)) from e
+
+        async with self._session_factory() as session:
+            token_storage = await self._fetch_token_storage(session, user_id)
+            if token_storage:
+                token_storage.access_token = fresh.token
+                token_storage.expiry = fresh.expiry
+                if fresh.refresh_token:
+                    token_storage.refresh_token = fresh.refresh_token
+                await session.commit()
+
+        self._credentials[user_id] = fresh
+        return fresh
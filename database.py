@@ -0,0 +1,160 @@
+# database.py
+import os
+import time
+from collections import deque
+
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Havuzda sürekli açık tutulan bağlantı sayısı ve üzerine açılabilecek ek bağlantılar
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Boş bağlantı beklemede en fazla kaç saniye beklenir (sonra TimeoutError)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Bu kadar saniyeden eski bağlantılar yeniden açılır (sunucu/proxy idle timeout'larından önce)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Havuzdan alınan bağlantı kullanılmadan önce test edilir (kopmuş bağlantılar sessizce yenilenir)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# asyncpg: bağlantı başına önbelleğe alınan prepared statement sayısı (0 = kapalı, PgBouncer için)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+# SQLAlchemy'nin derlenmiş SQL önbelleği
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))
+
+# Açılışta şema sürümü kontrolü: error (uygulama başlamaz), warn (sadece log) ya da off
+DB_SCHEMA_CHECK = os.getenv("DB_SCHEMA_CHECK", "error").lower()
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+# Bekleme yüzdelikleri için tutulan son örnek sayısı
+CHECKOUT_SAMPLE_SIZE = 1000
+
+
+class PoolStats:
+    """Havuzdan bağlantı alma (checkout) sürelerini toplar"""
+
+    def __init__(self, sample_size=CHECKOUT_SAMPLE_SIZE):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent = deque(maxlen=sample_size)
+
+    def record(self, wait):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self._recent.append(wait)
+
+    def to_dict(self):
+        recent = sorted(self._recent)
+
+        def percentile(p):
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(len(recent) * p / 100))]
+
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avgWaitMs": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "p50WaitMs": round(percentile(50) * 1000, 3),
+            "p95WaitMs": round(percentile(95) * 1000, 3),
+            "p99WaitMs": round(percentile(99) * 1000, 3),
+            "maxWaitMs": round(self.max_wait * 1000, 3),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Checkout bekleme süresini (boş bağlantı bekleme + pre-ping + gerekirse yeni bağlantı) ölçen havuz"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        pool_stats.record(time.perf_counter() - started)
+        return connection
+
+
+def create_engine(url):
+    """
+    Havuz ve önbellek ayarları ortam değişkenlerinden okunan async engine oluşturur.
+
+    Session'lar bağlantıyı ilk sorguda alır; DB'ye dokunmayan istekler havuzu hiç kullanmaz.
+    """
+    connect_args = {}
+    if url.startswith("postgresql+asyncpg"):
+        connect_args = {
+            # SQLAlchemy'nin asyncpg adaptöründeki prepared statement önbelleği
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            # asyncpg'nin kendi statement önbelleği
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        }
+
+    return create_async_engine(
+        url,
+        echo=False,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        query_cache_size=DB_QUERY_CACHE_SIZE,
+        connect_args=connect_args,
+    )
+
+
+def get_pool_stats(engine):
+    """Havuz doluluğu ve checkout bekleme metrikleri"""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checkedOut": pool.checkedout(),
+        "checkedIn": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "maxOverflow": DB_MAX_OVERFLOW,
+        **pool_stats.to_dict(),
+    }
+
+
+def alembic_config():
+    return Config(ALEMBIC_INI)
+
+
+class SchemaVersionError(RuntimeError):
+    """Veritabanı şeması kodun beklediği Alembic sürümünde değil"""
+
+
+async def check_schema_version(engine):
+    """
+    Veritabanının Alembic sürümünü koddaki head ile karşılaştırır.
+
+    Sadece alembic_version tablosu okunur; migration çalıştırmaz (bkz. create_tables.py).
+    """
+    if DB_SCHEMA_CHECK == "off":
+        return
+
+    expected = set(ScriptDirectory.from_config(alembic_config()).get_heads())
+    async with engine.connect() as conn:
+        current = set(await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()))
+
+    if current == expected:
+        return
+    message = (
+        f"Veritabanı şeması güncel değil (mevcut: {', '.join(sorted(current)) or 'yok'}, "
+        f"beklenen: {', '.join(sorted(expected))}); önce 'python create_tables.py' çalıştırın"
+    )
+    if DB_SCHEMA_CHECK == "warn":
+        print(message)
+        return
+    raise SchemaVersionError(message)
@@ -0,0 +1,199 @@
+# ga_reports.py
+from google_services import execute
+from quota import quota_manager
+
+# GA4 tek bir batchRunReports isteğinde en fazla 5 rapor kabul eder
+MAX_REPORTS_PER_BATCH = 5
+
+# Kanal adlarının Türkçe karşılıkları
+CHANNEL_NAMES = {
+    'Organic Search': 'Organik Arama',
+    'Direct': 'Direkt',
+    'Social': 'Sosyal Medya',
+    'Referral': 'Referans',
+    'Paid Search': 'Ücretli Arama',
+    'Display': 'Görüntülü Reklam',
+    'Email': 'E-posta'
+}
+
+# Özet metriklerinin rapordaki sırası
+SUMMARY_METRICS = ['activeUsers', 'screenPageViews', 'averageSessionDuration', 'bounceRate']
+
+
+def plan_batches(reports):
+    """
+    Rapor isteklerini batchRunReports gövdelerine böler.
+
+    Args:
+        reports (list): RunReportRequest gövdeleri
+
+    Returns:
+        list: Her biri en fazla MAX_REPORTS_PER_BATCH rapor içeren batch gövdeleri
+    """
+    return [
+        {'requests': reports[i:i + MAX_REPORTS_PER_BATCH]}
+        for i in range(0, len(reports), MAX_REPORTS_PER_BATCH)
+    ]
+
+
+async def run_reports(service, property_path, reports):
+    """
+    Raporları en az sayıda batchRunReports çağrısıyla çalıştırır, yanıtları sırayla döndürür.
+
+    Her batch'in ilk raporunda propertyQuota istenir; kalan token'lar kota yöneticisine bildirilir.
+    """
+    responses = []
+    for batch in plan_batches(reports):
+        batch['requests'][0] = {**batch['requests'][0], 'returnPropertyQuota': True}
+        response = await execute(
+            service.properties().batchRunReports(
+                property=property_path,
+                body=batch
+            ),
+            "runReport",
+            property_key=property_path
+        )
+        batch_reports = response.get('reports', [])
+        if batch_reports:
+            quota_manager.observe_ga_quota(property_path, batch_reports[0].get('propertyQuota'))
+        responses.extend(batch_reports)
+    return responses
+
+
+def _date_range(start, end, name):
+    return {
+        'startDate': start.strftime("%Y-%m-%d"),
+        'endDate': end.strftime("%Y-%m-%d"),
+        'name': name
+    }
+
+
+def build_traffic_reports(start_date, end_date, prev_start_date, prev_end_date):
+    """
+    Trafik analizi için gereken raporları hazırlar.
+
+    Özet metrikler önceki dönemle birlikte tek raporda (iki dateRange) istenir;
+    en popüler sayfalar ve trafik kaynakları ayrı raporlardır. Üçü tek batch'e sığar.
+    """
+    current = _date_range(start_date, end_date, 'current')
+    previous = _date_range(prev_start_date, prev_end_date, 'previous')
+
+    return [
+        # Özet metrikler (bu dönem + önceki dönem)
+        {
+            'dateRanges': [current, previous],
+            'metrics': [{'name': name} for name in SUMMARY_METRICS]
+        },
+        # En popüler sayfalar
+        {
+            'dateRanges': [current],
+            'dimensions': [{'name': 'pagePath'}],
+            'metrics': [{'name': 'screenPageViews'}],
+            'orderBys': [{'metric': {'metricName': 'screenPageViews'}, 'desc': True}],
+            'metricAggregations': ['TOTAL'],
+            'limit': 5
+        },
+        # Trafik kaynakları
+        {
+            'dateRanges': [current],
+            'dimensions': [{'name': 'sessionDefaultChannelGroup'}],
+            'metrics': [{'name': 'activeUsers'}]
+        }
+    ]
+
+
+def _summary_by_range(report):
+    """Özet raporunu {dateRange adı: {metrik: değer}} biçimine çevirir"""
+    summary = {}
+    for row in report.get('rows', []):
+        range_name = row['dimensionValues'][0]['value']
+        summary[range_name] = {
+            name: float(value['value'])
+            for name, value in zip(SUMMARY_METRICS, row['metricValues'])
+        }
+    return summary
+
+
+def parse_traffic_reports(reports):
+    """
+    build_traffic_reports ile istenen raporların yanıtlarını endpoint yanıtına dönüştürür.
+
+    Returns:
+        dict: Trafik analizi verileri
+    """
+    summary_report, top_pages_report, sources_report = reports
+
+    summary = _summary_by_range(summary_report)
+    current = summary.get('current', {})
+    previous = summary.get('previous', {})
+
+    total_users = int(current.get('activeUsers', 0))
+    total_pageviews = int(current.get('screenPageViews', 0))
+    bounce_rate = current.get('bounceRate', 0) * 100
+
+    avg_session_duration = "00:00"
+    if current:
+        avg_seconds = current.get('averageSessionDuration', 0)
+        minutes = int(avg_seconds // 60)
+        seconds = int(avg_seconds % 60)
+        avg_session_duration = f"{minutes:02d}:{seconds:02d}"
+
+    # En popüler sayfalar (yüzdeler tüm sayfaların toplamına göre)
+    top_pages = []
+    page_rows = top_pages_report.get('rows', [])
+    if page_rows:
+        totals = top_pages_report.get('totals', [])
+        if totals:
+            total_pageviews_in_top = int(totals[0]['metricValues'][0]['value'])
+        else:
+            total_pageviews_in_top = sum(int(row['metricValues'][0]['value']) for row in page_rows)
+
+        for page in page_rows:
+            page_views = int(page['metricValues'][0]['value'])
+            percentage = (page_views / total_pageviews_in_top) * 100 if total_pageviews_in_top > 0 else 0
+
+            top_pages.append({
+                "page": page['dimensionValues'][0]['value'],
+                "visits": page_views,
+                "percentage": percentage
+            })
+
+    # Trafik kaynakları
+    traffic_sources = []
+    source_rows = sources_report.get('rows', [])
+    if source_rows:
+        total_users_in_sources = sum(int(row['metricValues'][0]['value']) for row in source_rows)
+
+        for source in source_rows:
+            channel = source['dimensionValues'][0]['value']
+            users = int(source['metricValues'][0]['value'])
+            percentage = (users / total_users_in_sources) * 100 if total_users_in_sources > 0 else 0
+
+            traffic_sources.append({
+                "source": CHANNEL_NAMES.get(channel, channel),
+                "visits": users,
+                "percentage": percentage
+            })
+
+    # Büyüme oranını hesapla
+    prev_users = int(previous.get('activeUsers', 0))
+    monthly_growth = 0
+    if prev_users > 0:
+        monthly_growth = ((total_users - prev_users) / prev_users) * 100
+
+    return {
+        "totalVisits": total_users,
+        "organicTraffic": int(total_users * 0.7),  # Yaklaşık değer
+        "bounceRate": bounce_rate,
+        "avgSessionDuration": avg_session_duration,
+        "pageViews": total_pageviews,
+        "monthlyGrowth": monthly_growth,
+        "topPages": top_pages,
+        "trafficSources": traffic_sources
+    }
+
+
+async def fetch_traffic_analysis(service, property_path, start_date, end_date, prev_start_date, prev_end_date):
+    """Trafik analizini tek bir batchRunReports çağrısıyla getirir"""
+    reports = build_traffic_reports(start_date, end_date, prev_start_date, prev_end_date)
+    return parse_traffic_reports(await run_reports(service, property_path, reports))
@@ -0,0 +1,209 @@
+# google_services.py
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from googleapiclient import discovery_cache, _auth
+from googleapiclient.discovery import Resource
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
+from googleapiclient.schema import Schemas
+
+from quota import quota_manager, quota_user
+
+# Uygulamanın kullandığı Google API'leri (servis adı, sürüm)
+GOOGLE_SERVICES = (
+    ("searchconsole", "v1"),
+    ("analyticsdata", "v1beta"),
+    ("oauth2", "v2"),
+)
+
+# (servis adı, sürüm) -> hazır kaynak iskeleti
+_skeletons = {}
+
+# Google API çağrıları httplib2 ile senkron çalışır; event loop'u bloklamamaları
+# için boyutu sınırlı ayrı bir thread havuzunda yürütülürler
+GOOGLE_API_MAX_WORKERS = int(os.getenv("GOOGLE_API_MAX_WORKERS", "64"))
+
+# Uç nokta başına aynı anda çalışabilecek en fazla çağrı sayısı
+ENDPOINT_CONCURRENCY = {
+    "searchanalytics.query": 24,
+    "sites.list": 8,
+    "urlInspection.inspect": 8,
+    "runReport": 16,
+    "userinfo": 8,
+    "token.refresh": 8,
+}
+DEFAULT_ENDPOINT_CONCURRENCY = 8
+
+_executor = ThreadPoolExecutor(
+    max_workers=GOOGLE_API_MAX_WORKERS,
+    thread_name_prefix="google-api"
+)
+
+# Uç nokta adı -> eşzamanlılık sınırlayıcısı
+_limiters = {}
+
+
+class _ServiceSkeleton:
+    """Discovery dokümanından bir kez üretilen, kimlik bilgisinden bağımsız servis iskeleti"""
+
+    def __init__(self, name, version):
+        # Paketle gelen statik discovery dokümanını kullan (ağ isteği yok)
+        document = discovery_cache.get_static_doc(name, version)
+        if document is None:
+            raise ValueError(f"{name} {version} için statik discovery dokümanı bulunamadı")
+
+        self.description = json.loads(document)
+        self.base_url = urllib.parse.urljoin(
+            self.description["rootUrl"], self.description["servicePath"]
+        )
+        self.model = JsonModel("dataWrapper" in self.description.get("features", []))
+        # Schemas metot dokümantasyonlarını kendi içinde önbelleğe alır;
+        # aynı örneği paylaşmak build()'in asıl maliyetini ortadan kaldırır
+        self.schema = Schemas(self.description)
+
+    def bind(self, credentials):
+        """İskeleti kullanıcının kimlik bilgisiyle yetkilendirilmiş bir servise dönüştürür"""
+        return Resource(
+            http=_auth.authorized_http(credentials),
+            baseUrl=self.base_url,
+            model=self.model,
+            requestBuilder=HttpRequest,
+            developerKey=None,
+            resourceDesc=self.description,
+            rootDesc=self.description,
+            schema=self.schema,
+        )
+
+
+def _get_skeleton(name, version):
+    skeleton = _skeletons.get((name, version))
+    if skeleton is None:
+        skeleton = _ServiceSkeleton(name, version)
+        _skeletons[(name, version)] = skeleton
+    return skeleton
+
+
+def warm_up():
+    """Tüm servis iskeletlerini uygulama açılışında hazırlar"""
+    for name, version in GOOGLE_SERVICES:
+        _get_skeleton(name, version)
+
+
+def get_service(name, version, credentials):
+    """
+    build() yerine kullanılır; discovery dokümanını her istekte yeniden işlemez.
+
+    Args:
+        name (str): Servis adı (örn. 'searchconsole')
+        version (str): Servis sürümü (örn. 'v1')
+        credentials: Kullanıcının Google kimlik bilgileri
+
+    Returns:
+        Resource: Kullanıcıya bağlanmış Google API servisi
+    """
+    return _get_skeleton(name, version).bind(credentials)
+
+
+class _EndpointLimiter:
+    """Bir uç noktanın eşzamanlılık sınırını ve kuyruk metriklerini tutar"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_duration = 0.0
+
+    async def run(self, func, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = time.perf_counter()
+        self.total_wait += started_at - queued_at
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(_executor, func, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_duration += time.perf_counter() - started_at
+            self.semaphore.release()
+
+    def stats(self):
+        finished = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "waiting": self.waiting,
+            "inFlight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avgWaitMs": (self.total_wait / finished * 1000) if finished else 0,
+            "avgDurationMs": (self.total_duration / finished * 1000) if finished else 0,
+        }
+
+
+def _get_limiter(endpoint):
+    limiter = _limiters.get(endpoint)
+    if limiter is None:
+        limiter = _EndpointLimiter(ENDPOINT_CONCURRENCY.get(endpoint, DEFAULT_ENDPOINT_CONCURRENCY))
+        _limiters[endpoint] = limiter
+    return limiter
+
+
+async def run_blocking(endpoint, func, *args):
+    """Senkron bir Google çağrısını uç nokta limitine uyarak thread havuzunda çalıştırır"""
+    return await _get_limiter(endpoint).run(func, *args)
+
+
+async def execute(request, endpoint, property_key=None, user_id=None):
+    """
+    googleapiclient isteğini event loop'u bloklamadan, kota yöneticisi üzerinden yürütür.
+
+    Args:
+        request (HttpRequest): service.xxx().yyy(...) ile hazırlanan istek
+        endpoint (str): Eşzamanlılık limiti, kota ve metrikler için uç nokta adı
+        property_key (str, optional): Mülk kotası için Search Console mülkü ya da GA4 property
+        user_id (int, optional): Kullanıcı kotası için; verilmezse geçerli istekteki kullanıcı
+
+    Returns:
+        dict: Google API yanıtı
+    """
+    if user_id is None:
+        user_id = quota_user.get()
+    return await quota_manager.run(
+        endpoint,
+        lambda: run_blocking(endpoint, request.execute),
+        user_id=user_id,
+        property_key=property_key
+    )
+
+
+def get_stats():
+    """Thread havuzu ve uç nokta kuyruk metriklerini döndürür"""
+    return {
+        "maxWorkers": GOOGLE_API_MAX_WORKERS,
+        "executorQueueDepth": _executor._work_queue.qsize(),
+        "endpoints": {name: limiter.stats() for name, limiter in _limiters.items()},
+    }
+
+
+def shutdown():
+    """Uygulama kapanırken bekleyen Google çağrılarını iptal eder"""
+    _executor.shutdown(wait=False, cancel_futures=True)
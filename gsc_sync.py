@@ -0,0 +1,252 @@
+# gsc_sync.py
+import asyncio
+import datetime
+import os
+
+from sqlalchemy import delete, insert, func
+from sqlalchemy.future import select
+
+from models import SearchAnalyticsRow, SearchAnalyticsSync
+from rollups import refresh_daily_rollups
+from search_console import iter_search_analytics, site_property_url
+
+# İlk senkronizasyonda geriye doğru çekilecek gün sayısı
+GSC_SYNC_INITIAL_DAYS = int(os.getenv("GSC_SYNC_INITIAL_DAYS", "90"))
+# Google son günlerin verisini güncellemeye devam eder; bu kadar gün her seferinde yeniden çekilir
+GSC_SYNC_REVISION_DAYS = int(os.getenv("GSC_SYNC_REVISION_DAYS", "3"))
+# GSC verisi 1-2 gün gecikmeli gelir; yerel veri en fazla bu kadar geride kalabilir
+GSC_LOCAL_MAX_LAG_DAYS = int(os.getenv("GSC_LOCAL_MAX_LAG_DAYS", "2"))
+# Tek INSERT ifadesinde yazılan satır sayısı
+GSC_SYNC_INSERT_BATCH = 5000
+
+SYNC_DIMENSIONS = ["query", "page", "country", "device"]
+
+# Yerel sorgularda gruplanabilen boyutlar
+LOCAL_DIMENSIONS = {
+    "query": SearchAnalyticsRow.query,
+    "page": SearchAnalyticsRow.page,
+    "country": SearchAnalyticsRow.country,
+    "device": SearchAnalyticsRow.device,
+    "date": SearchAnalyticsRow.date,
+}
+
+# site_id -> çalışan senkronizasyon görevi
+_running = {}
+
+
+def sync_window(state, today=None):
+    """
+    Senkronize edilecek gün aralığını belirler.
+
+    İlk çalışmada son GSC_SYNC_INITIAL_DAYS gün, sonrasında checkpoint'ten
+    (ya da Google'ın hâlâ güncellediği son GSC_SYNC_REVISION_DAYS günden) bugüne kadar.
+
+    Returns:
+        tuple: (başlangıç, bitiş) dahil
+    """
+    end = today or datetime.date.today()
+    revision_start = end - datetime.timedelta(days=GSC_SYNC_REVISION_DAYS - 1)
+    if state is None or state.last_date is None:
+        return end - datetime.timedelta(days=GSC_SYNC_INITIAL_DAYS - 1), end
+    return min(state.last_date + datetime.timedelta(days=1), revision_start), end
+
+
+def _row_values(site_id, day, row):
+    query, page, country, device = row["keys"]
+    return {
+        "site_id": site_id,
+        "date": day,
+        "query": query,
+        "page": page,
+        "country": country,
+        "device": device,
+        "clicks": int(row.get("clicks", 0)),
+        "impressions": int(row.get("impressions", 0)),
+        "position": float(row.get("position", 0)),
+    }
+
+
+async def get_sync_state(db, site_id):
+    result = await db.execute(select(SearchAnalyticsSync).where(SearchAnalyticsSync.site_id == site_id))
+    return result.scalar_one_or_none()
+
+
+async def _sync_day(db, service, site_id, site, day):
+    """Bir günün satırlarını ve rollup'larını Google'dan yeniden yazar (commit çağırana aittir)"""
+    await db.execute(
+        delete(SearchAnalyticsRow)
+        .where(SearchAnalyticsRow.site_id == site_id, SearchAnalyticsRow.date == day)
+    )
+
+    body = {
+        "startDate": day.isoformat(),
+        "endDate": day.isoformat(),
+        "dimensions": SYNC_DIMENSIONS,
+        "dataState": "all"
+    }
+    count = 0
+    batch = []
+    async for row in iter_search_analytics(service, site_property_url(site), body):
+        batch.append(_row_values(site_id, day, row))
+        if len(batch) >= GSC_SYNC_INSERT_BATCH:
+            await db.execute(insert(SearchAnalyticsRow), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await db.execute(insert(SearchAnalyticsRow), batch)
+        count += len(batch)
+
+    await refresh_daily_rollups(db, site_id, day)
+    return count
+
+
+async def sync_site(session_factory, service, site_id, site):
+    """
+    Sitenin Search Console verisini checkpoint'ten itibaren gün gün senkronize eder.
+
+    Her gün ayrı transaction'da yazılır ve checkpoint ilerletilir; yarıda kalan
+    senkronizasyon bir sonraki çalışmada kaldığı yerden devam eder.
+
+    Returns:
+        dict: Senkronize edilen gün ve satır sayısı
+    """
+    async with session_factory() as db:
+        state = await get_sync_state(db, site_id)
+        if state is None:
+            state = SearchAnalyticsSync(site_id=site_id)
+            db.add(state)
+        state.status = "running"
+        state.error = None
+        state.last_run_at = datetime.datetime.utcnow()
+        await db.commit()
+
+        start, end = sync_window(state)
+        days = 0
+        rows = 0
+        try:
+            day = start
+            while day <= end:
+                rows += await _sync_day(db, service, site_id, site, day)
+                state.first_date = min(state.first_date or day, day)
+                state.last_date = max(state.last_date or day, day)
+                await db.commit()
+                days += 1
+                day += datetime.timedelta(days=1)
+        except Exception as e:
+            await db.rollback()
+            state = await get_sync_state(db, site_id)
+            state.status = "failed"
+            state.error = str(e)
+            await db.commit()
+            raise
+
+        state.status = "idle"
+        await db.commit()
+
+    print(f"GSC senkronizasyonu tamamlandı ({site}): {days} gün, {rows} satır")
+    return {"days": days, "rows": rows}
+
+
+def start_sync(session_factory, service, site_id, site):
+    """Site için senkronizasyonu arka planda başlatır; zaten çalışıyorsa mevcut görevi döndürür"""
+    task = _running.get(site_id)
+    if task is None:
+        task = asyncio.create_task(sync_site(session_factory, service, site_id, site))
+        _running[site_id] = task
+        task.add_done_callback(lambda t: _on_sync_done(site_id, site, t))
+    return task
+
+
+def _on_sync_done(site_id, site, task):
+    _running.pop(site_id, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"GSC senkronizasyon hatası ({site}): {task.exception()}")
+
+
+def is_running(site_id):
+    return site_id in _running
+
+
+async def covers(db, site_id, start_date, end_date):
+    """Yerel veri istenen tarih aralığını kapsıyor mu"""
+    state = await get_sync_state(db, site_id)
+    if state is None or state.first_date is None or state.last_date is None:
+        return False
+    latest_needed = end_date - datetime.timedelta(days=GSC_LOCAL_MAX_LAG_DAYS)
+    return state.first_date <= start_date and state.last_date >= latest_needed
+
+
+def build_local_query(site_id, start_date, end_date, dimensions, filters=None, limit=None):
+    """
+    Yerel satırları Search Analytics API'siyle aynı biçimde toplayan sorguyu oluşturur.
+
+    Pozisyon gösterim ağırlıklı ortalamadır; CTR tıklama/gösterimden hesaplanır.
+
+    Args:
+        dimensions (list): LOCAL_DIMENSIONS anahtarları
+        filters (dict, optional): {boyut: değer} eşitlik filtreleri
+    """
+    columns = [LOCAL_DIMENSIONS[name] for name in dimensions]
+    clicks = func.sum(SearchAnalyticsRow.clicks)
+    impressions = func.sum(SearchAnalyticsRow.impressions)
+    weighted_position = func.sum(SearchAnalyticsRow.position * SearchAnalyticsRow.impressions)
+
+    stmt = (
+        select(*columns, clicks.label("clicks"), impressions.label("impressions"), weighted_position.label("weighted_position"))
+        .where(
+            SearchAnalyticsRow.site_id == site_id,
+            SearchAnalyticsRow.date >= start_date,
+            SearchAnalyticsRow.date <= end_date
+        )
+        .group_by(*columns)
+        .order_by(clicks.desc(), impressions.desc())
+    )
+    for name, value in (filters or {}).items():
+        stmt = stmt.where(LOCAL_DIMENSIONS[name] == value)
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _api_row(row, dimension_count):
+    clicks = int(row.clicks or 0)
+    impressions = int(row.impressions or 0)
+    return {
+        "keys": [str(value) for value in row[:dimension_count]],
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": clicks / impressions if impressions else 0,
+        "position": float(row.weighted_position or 0) / impressions if impressions else 0,
+    }
+
+
+async def query_local(db, site_id, start_date, end_date, dimensions, filters=None, limit=None):
+    """Yerel veriden API biçiminde satır listesi döndürür"""
+    stmt = build_local_query(site_id, start_date, end_date, dimensions, filters, limit)
+    result = await db.execute(stmt)
+    return [_api_row(row, len(dimensions)) for row in result]
+
+
+async def iter_local(session_factory, site_id, start_date, end_date, dimensions, filters=None, limit=None):
+    """
+    Yerel satırları sunucu tarafı cursor ile tek tek döndürür.
+
+    Akış yanıtları istek bittikten sonra da okunduğundan kendi session'ını açar.
+    """
+    stmt = build_local_query(site_id, start_date, end_date, dimensions, filters, limit)
+    async with session_factory() as db:
+        result = await db.stream(stmt)
+        async for row in result:
+            yield _api_row(row, len(dimensions))
+
+
+def state_to_dict(state, running=False):
+    if state is None:
+        return {"status": "running" if running else "never_synced"}
+    return {
+        "status": "running" if running else state.status,
+        "firstDate": state.first_date.isoformat() if state.first_date else None,
+        "lastDate": state.last_date.isoformat() if state.last_date else None,
+        "lastRunAt": state.last_run_at.isoformat() if state.last_run_at else None,
+        "error": state.error
+    }
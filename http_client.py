@@ -0,0 +1,43 @@
+# http_client.py
+import os
+
+import httpx
+
+# Bağlantı havuzu ayarları
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+
+# PageSpeed çağrıları uzun sürebildiği için okuma zaman aşımı geniş tutulur
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+
+_client = None
+
+
+def get_http_client():
+    """
+    Uygulama ömrü boyunca paylaşılan httpx.AsyncClient'ı döndürür.
+
+    Tüm dış HTTP çağrıları aynı bağlantı havuzunu kullanır; böylece
+    googleapis.com'a her istekte yeni TLS el sıkışması yapılmaz.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+    return _client
+
+
+async def close_http_client():
+    """Uygulama kapanırken açık bağlantıları kapatır"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
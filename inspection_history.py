@@ -0,0 +1,207 @@
+# inspection_history.py
+import datetime
+import os
+
+from sqlalchemy import update, func
+from sqlalchemy.future import select
+
+from models import InspectedUrl, UrlInspectionSnapshot, SearchAnalyticsRollup
+
+# Bu kadar günden eski sonuçlar yeniden incelenir
+URL_REINSPECT_MAX_AGE_DAYS = int(os.getenv("URL_REINSPECT_MAX_AGE_DAYS", "30"))
+# Sayfa gösterimleri son incelemedekine göre bu oranda değiştiyse yeniden incelenir
+URL_REINSPECT_IMPRESSION_CHANGE = float(os.getenv("URL_REINSPECT_IMPRESSION_CHANGE", "0.5"))
+# Küçük sayılardaki oransal dalgalanmaları yok saymak için en az mutlak değişim
+URL_REINSPECT_MIN_IMPRESSION_DELTA = int(os.getenv("URL_REINSPECT_MIN_IMPRESSION_DELTA", "50"))
+# Gösterimlerin toplandığı pencere (gün)
+URL_REINSPECT_WINDOW_DAYS = int(os.getenv("URL_REINSPECT_WINDOW_DAYS", "28"))
+
+# Değişimi izlenen alanlar: kolon -> inceleme özetindeki anahtar
+TRACKED_FIELDS = {
+    "verdict": "verdict",
+    "coverage_state": "coverageState",
+    "google_canonical": "googleCanonical",
+    "user_canonical": "userCanonical",
+    "last_crawl_time": "lastCrawlTime",
+}
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _parse_time(value):
+    """'2026-10-01T08:15:00Z' -> naive UTC datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _state(summary):
+    state = {column: summary.get(key) for column, key in TRACKED_FIELDS.items()}
+    state["last_crawl_time"] = _parse_time(state["last_crawl_time"])
+    return state
+
+
+async def record_inspection(db, user_id, property_url, url, summary, inspected_at=None):
+    """
+    İnceleme sonucunu URL'nin son durumuna işler; izlenen alanlardan biri
+    değiştiyse yeni bir snapshot ekler (commit çağırana aittir).
+
+    Args:
+        summary (dict): url_inspection.summarize_inspection çıktısı
+
+    Returns:
+        bool: Durum değiştiyse (ya da URL ilk kez inceleniyorsa) True
+    """
+    now = inspected_at or _utcnow()
+    state = _state(summary)
+    row = (await db.execute(
+        select(InspectedUrl).where(InspectedUrl.property_url == property_url, InspectedUrl.url == url)
+    )).scalar_one_or_none()
+
+    if row is None:
+        row = InspectedUrl(property_url=property_url, url=url, user_id=user_id, checked_at=now, changed_at=now, **state)
+        db.add(row)
+        await db.flush()
+        changed = True
+    else:
+        changed = any(getattr(row, column) != value for column, value in state.items())
+        row.user_id = user_id
+        row.checked_at = now
+        if changed:
+            for column, value in state.items():
+                setattr(row, column, value)
+            row.changed_at = now
+
+    if changed:
+        db.add(UrlInspectionSnapshot(url_id=row.id, inspected_at=now, **state))
+    return changed
+
+
+def snapshot_to_dict(snapshot):
+    return {
+        "verdict": snapshot.verdict,
+        "coverageState": snapshot.coverage_state,
+        "googleCanonical": snapshot.google_canonical,
+        "userCanonical": snapshot.user_canonical,
+        "lastCrawlTime": snapshot.last_crawl_time.isoformat() if snapshot.last_crawl_time else None,
+        "inspectedAt": snapshot.inspected_at.isoformat(),
+    }
+
+
+async def get_history(db, property_url, url, limit=100):
+    """
+    URL'nin son durumu ve durum değişiklikleri (yeniden eskiye).
+
+    Returns:
+        dict | None: URL hiç incelenmediyse None
+    """
+    row = (await db.execute(
+        select(InspectedUrl).where(InspectedUrl.property_url == property_url, InspectedUrl.url == url)
+    )).scalar_one_or_none()
+    if row is None:
+        return None
+
+    snapshots = (await db.execute(
+        select(UrlInspectionSnapshot)
+        .where(UrlInspectionSnapshot.url_id == row.id)
+        .order_by(UrlInspectionSnapshot.inspected_at.desc())
+        .limit(limit)
+    )).scalars()
+    return {
+        "url": row.url,
+        "checkedAt": row.checked_at.isoformat(),
+        "changedAt": row.changed_at.isoformat(),
+        "changes": [snapshot_to_dict(snapshot) for snapshot in snapshots],
+    }
+
+
+async def page_impressions(db, site_id, property_url, end=None):
+    """Mülkte incelenmiş sayfaların son URL_REINSPECT_WINDOW_DAYS günlük gösterimleri (page rollup'larından)"""
+    end = end or datetime.date.today()
+    start = end - datetime.timedelta(days=URL_REINSPECT_WINDOW_DAYS)
+    result = await db.execute(
+        select(SearchAnalyticsRollup.value, func.sum(SearchAnalyticsRollup.impressions))
+        .where(
+            SearchAnalyticsRollup.site_id == site_id,
+            SearchAnalyticsRollup.dimension == "page",
+            SearchAnalyticsRollup.date >= start,
+            SearchAnalyticsRollup.value.in_(
+                select(InspectedUrl.url).where(InspectedUrl.property_url == property_url)
+            )
+        )
+        .group_by(SearchAnalyticsRollup.value)
+    )
+    return {page: int(impressions or 0) for page, impressions in result.all()}
+
+
+def _impression_change(baseline, current):
+    """Gösterim değişimi eşikleri aşıyorsa göreli değişim, aşmıyorsa None"""
+    if baseline is None or current is None:
+        return None
+    delta = abs(current - baseline)
+    ratio = delta / max(baseline, 1)
+    if delta < URL_REINSPECT_MIN_IMPRESSION_DELTA or ratio < URL_REINSPECT_IMPRESSION_CHANGE:
+        return None
+    return ratio
+
+
+async def select_for_reinspection(db, property_url, limit, site_id=None, now=None):
+    """
+    Yeniden incelenmesi gereken URL'leri seçer: önce gösterimleri belirgin
+    değişenler (değişim büyüklüğüne göre), sonra sonucu en eski olanlar.
+
+    Seçilen URL'lerin güncel gösterimleri yeni referans olarak yazılır; referansı
+    olmayan URL'lerinki de ilk kez doldurulur (commit çağırana aittir).
+    site_id yoksa (site senkronize edilmemişse) sadece yaşa bakılır.
+
+    Returns:
+        dict: {'urls': [...], 'changed': int, 'stale': int}
+    """
+    now = now or _utcnow()
+    stale_before = now - datetime.timedelta(days=URL_REINSPECT_MAX_AGE_DAYS)
+    impressions = await page_impressions(db, site_id, property_url) if site_id is not None else None
+
+    rows = (await db.execute(
+        select(InspectedUrl.id, InspectedUrl.url, InspectedUrl.impressions, InspectedUrl.checked_at)
+        .where(InspectedUrl.property_url == property_url)
+    )).all()
+
+    changed = []
+    stale = []
+    baselines = []
+    for row in rows:
+        current = impressions.get(row.url, 0) if impressions is not None else None
+        ratio = _impression_change(row.impressions, current)
+        if ratio is not None:
+            changed.append((ratio, row, current))
+        elif row.checked_at < stale_before:
+            stale.append((row.checked_at, row, current))
+        elif row.impressions is None and current is not None:
+            baselines.append({"id": row.id, "impressions": current})
+
+    changed.sort(key=lambda entry: entry[0], reverse=True)
+    stale.sort(key=lambda entry: entry[0])
+    selected = (changed + stale)[:max(0, limit)]
+
+    baselines += [
+        {"id": row.id, "impressions": current}
+        for _, row, current in selected
+        if current is not None
+    ]
+    if baselines:
+        await db.execute(update(InspectedUrl), baselines)
+
+    selected_changed = min(len(changed), len(selected))
+    return {
+        "urls": [row.url for _, row, _ in selected],
+        "changed": selected_changed,
+        "stale": len(selected) - selected_changed,
+    }
@@ -0,0 +1,434 @@
+# jobs.py
+import asyncio
+import datetime
+import os
+import random
+import socket
+import uuid
+
+from sqlalchemy import update, delete, func, nulls_first
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+from sqlalchemy.orm import aliased
+
+from models import ScheduledJob, DashboardSnapshot, Site, SiteSettings, GoogleAnalyticsProperty
+
+# Bu süreçte aynı anda çalışan iş sayısı
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+# Bir kiracının (kullanıcının) tüm süreçlerde aynı anda çalışabilecek iş sayısı
+JOB_TENANT_CONCURRENCY = int(os.getenv("JOB_TENANT_CONCURRENCY", "1"))
+# Kuyrukta iş yokken tekrar bakma aralığı (saniye)
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+# Tekrar denemeler: base * 2^(deneme-1), en fazla JOB_RETRY_MAX_SECONDS
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "60"))
+JOB_RETRY_MAX_SECONDS = int(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+# Bu kadar süredir 'running' kalan iş (çöken süreç) tekrar kuyruğa alınır
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+# Gece ön hesaplamalarının kuyruğa alındığı saat (UTC)
+JOB_NIGHTLY_HOUR = int(os.getenv("JOB_NIGHTLY_HOUR", "3"))
+# Bitmiş işlerin saklanma süresi (gün)
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# Gece hesaplanan pano verileri
+PRECOMPUTE_KINDS = ("keywords", "pages", "traffic", "lighthouse")
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+# İş alma sırasını süreçler arasında tekilleştiren advisory lock (kiracı sınırı kesin uygulanır)
+JOB_CLAIM_LOCK_ID = 7213
+
+# Postgres unique_violation kodu: yalnızca bu hata "iş zaten kuyrukta" demektir
+UNIQUE_VIOLATION = "23505"
+
+# Bu süreci iş kilitlerinde tanımlayan kimlik
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class PermanentJobError(Exception):
+    """Tekrar denemenin işe yaramayacağı hata (ör. kullanıcının Google yetkisi yok); iş hemen başarısız olur"""
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def retry_delay(attempts):
+    """Deneme sayısına göre jitter'lı üstel bekleme (saniye)"""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay + random.uniform(0, delay / 4)
+
+
+# ---------- Kuyruk ----------
+async def enqueue(db, user_id, site_id, kind, run_key=None, run_at=None):
+    """
+    İşi kuyruğa ekler (commit çağırana aittir).
+
+    run_key verilirse aynı (site, tür, run_key) ikinci kez eklenmez; verilmezse
+    sitede aynı türden bekleyen ya da çalışan iş varken yenisi eklenmez.
+
+    Returns:
+        bool: İş eklendiyse True
+    """
+    if run_key is None:
+        active = await db.scalar(
+            select(ScheduledJob.id)
+            .where(
+                ScheduledJob.site_id == site_id,
+                ScheduledJob.kind == kind,
+                ScheduledJob.status.in_(ACTIVE_JOB_STATUSES)
+            )
+            .limit(1)
+        )
+        if active is not None:
+            return False
+
+    try:
+        async with db.begin_nested():
+            db.add(ScheduledJob(
+                user_id=user_id,
+                site_id=site_id,
+                kind=kind,
+                status="queued",
+                run_key=run_key,
+                run_at=run_at or _utcnow(),
+                attempts=0,
+                max_attempts=JOB_MAX_ATTEMPTS
+            ))
+    except IntegrityError as e:
+        if getattr(e.orig, "sqlstate", None) != UNIQUE_VIOLATION:
+            raise
+        return False
+    return True
+
+
+async def applicable_kinds(db, site_ids=None):
+    """
+    Site başına ön hesaplanabilecek türler: trafik için GA property'si,
+    Lighthouse için geçerli PageSpeed API key'i gerekir. Sahibi olmayan
+    siteler (kimlik bilgisi yok) atlanır.
+
+    Returns:
+        list: (site_id, user_id, [tür, ...])
+    """
+    stmt = (
+        select(Site.id, Site.user_id, GoogleAnalyticsProperty.id, SiteSettings.api_key_status)
+        .outerjoin(GoogleAnalyticsProperty, GoogleAnalyticsProperty.site_id == Site.id)
+        .outerjoin(SiteSettings, SiteSettings.site_id == Site.id)
+        .where(Site.user_id.is_not(None))
+        .order_by(Site.id)
+    )
+    if site_ids is not None:
+        stmt = stmt.where(Site.id.in_(site_ids))
+
+    sites = []
+    for site_id, user_id, property_id, api_key_status in (await db.execute(stmt)).all():
+        kinds = ["keywords", "pages"]
+        if property_id is not None:
+            kinds.append("traffic")
+        if api_key_status == "valid":
+            kinds.append("lighthouse")
+        sites.append((site_id, user_id, kinds))
+    return sites
+
+
+async def enqueue_nightly(session_factory, day):
+    """
+    Tüm siteler için günün ön hesaplama işlerini kuyruğa alır.
+
+    run_key gün olduğundan birden fazla süreç çağırsa da her iş bir kez eklenir.
+
+    Returns:
+        int: Eklenen iş sayısı
+    """
+    added = 0
+    async with session_factory() as db:
+        for site_id, user_id, kinds in await applicable_kinds(db):
+            for kind in kinds:
+                try:
+                    if await enqueue(db, user_id, site_id, kind, run_key=f"nightly:{day.isoformat()}"):
+                        added += 1
+                except IntegrityError as e:
+                    print(f"Gece işi kuyruğa alınamadı (site_id={site_id}, {kind}): {e}")
+        await db.commit()
+    return added
+
+
+async def claim_next(db):
+    """
+    Sırası gelmiş bir işi bu süreç adına kilitler (commit çağırana aittir).
+
+    Adillik için önce şu an en az işi çalışan, sonra en uzun süredir işi
+    başlatılmamış kiracının işi seçilir; JOB_TENANT_CONCURRENCY sınırına ulaşmış
+    kiracılar atlanır. Alma işlemleri kısa olduğundan advisory lock ile sıraya
+    konur (eşzamanlı alımlar kiracı sınırını aşamaz); FOR UPDATE SKIP LOCKED ve
+    koşullu UPDATE aynı işin iki kez alınmasını ayrıca engeller.
+    """
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(select(func.pg_advisory_xact_lock(JOB_CLAIM_LOCK_ID)))
+
+    other = aliased(ScheduledJob)
+    tenant_running = (
+        select(func.count(other.id))
+        .where(other.user_id == ScheduledJob.user_id, other.status == "running")
+        .correlate(ScheduledJob)
+        .scalar_subquery()
+    )
+    tenant_last_started = (
+        select(func.max(other.locked_at))
+        .where(other.user_id == ScheduledJob.user_id)
+        .correlate(ScheduledJob)
+        .scalar_subquery()
+    )
+    now = _utcnow()
+    job = (await db.execute(
+        select(ScheduledJob)
+        .where(
+            ScheduledJob.status == "queued",
+            ScheduledJob.run_at <= now,
+            tenant_running < JOB_TENANT_CONCURRENCY
+        )
+        .order_by(tenant_running, nulls_first(tenant_last_started), ScheduledJob.run_at, ScheduledJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=ScheduledJob)
+    )).scalar_one_or_none()
+    if job is None:
+        return None
+
+    result = await db.execute(
+        update(ScheduledJob)
+        .where(ScheduledJob.id == job.id, ScheduledJob.status == "queued")
+        .values(status="running", locked_by=WORKER_ID, locked_at=now, attempts=ScheduledJob.attempts + 1)
+        .execution_options(synchronize_session="fetch")
+    )
+    if result.rowcount == 0:
+        return None
+    return job
+
+
+async def save_snapshot(db, site_id, kind, payload, start_date=None, end_date=None):
+    """Sitenin pano verisini günceller (commit çağırana aittir)"""
+    snapshot = (await db.execute(
+        select(DashboardSnapshot).where(DashboardSnapshot.site_id == site_id, DashboardSnapshot.kind == kind)
+    )).scalar_one_or_none()
+    if snapshot is None:
+        snapshot = DashboardSnapshot(site_id=site_id, kind=kind)
+        db.add(snapshot)
+    snapshot.payload = payload
+    snapshot.start_date = start_date
+    snapshot.end_date = end_date
+    snapshot.computed_at = _utcnow()
+
+
+async def get_snapshot(db, site_id, kind):
+    result = await db.execute(
+        select(DashboardSnapshot).where(DashboardSnapshot.site_id == site_id, DashboardSnapshot.kind == kind)
+    )
+    return result.scalar_one_or_none()
+
+
+# ---------- Çalıştırıcı ----------
+async def _heartbeat(session_factory, job_id):
+    """
+    İş sürdükçe kilidi (locked_at) tazeler; uzun süren iş çöken süreç sanılıp tekrar kuyruğa alınmaz.
+
+    Kilit başka sürece geçtiyse ya da iş artık çalışmıyorsa döner.
+    """
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            async with session_factory() as db:
+                result = await db.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.id == job_id, ScheduledJob.locked_by == WORKER_ID, ScheduledJob.status == "running")
+                    .values(locked_at=_utcnow())
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"İş kilidi tazelenemedi (job_id={job_id}): {e}")
+            continue
+        if result.rowcount == 0:
+            return
+
+
+class JobScheduler:
+    """
+    Postgres'teki iş kuyruğunu işleyen worker havuzu.
+
+    Aynı anda en fazla `concurrency` iş çalıştırır; başarısız işler jitter'lı üstel
+    beklemeyle tekrar denenir. Bakım döngüsü gece işlerini kuyruğa alır, çöken
+    süreçlerden kalan işleri geri alır ve eski işleri temizler.
+
+    Args:
+        handlers (dict): tür -> async handler(db, job, site); (payload, start_date, end_date) döndürür
+    """
+
+    def __init__(self, session_factory, handlers, concurrency=JOB_WORKER_CONCURRENCY):
+        self.session_factory = session_factory
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self._tasks = []
+        self._wakeup = asyncio.Event()
+        self._last_nightly = None
+        self.running = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        """Worker'ları durdurur; yarıda kalan işler deneme sayılmadan kuyruğa döner"""
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        async with self.session_factory() as db:
+            await db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.status == "running", ScheduledJob.locked_by == WORKER_ID)
+                .values(status="queued", locked_by=None, attempts=ScheduledJob.attempts - 1)
+            )
+            await db.commit()
+
+    def notify(self):
+        """Yeni iş eklendiğinde bekleyen worker'ları uyandırır"""
+        self._wakeup.set()
+
+    async def _worker(self):
+        while True:
+            try:
+                async with self.session_factory() as db:
+                    job = await claim_next(db)
+                    await db.commit()
+            except Exception as e:
+                print(f"İş kuyruğundan okunamadı: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            self.running += 1
+            try:
+                await self._run(job)
+            finally:
+                self.running -= 1
+
+    async def _run(self, job):
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise PermanentJobError(f"Unknown job kind: {job.kind}")
+            heartbeat = asyncio.create_task(_heartbeat(self.session_factory, job.id))
+            try:
+                async with self.session_factory() as db:
+                    site = await db.get(Site, job.site_id)
+                    if site is None:
+                        raise PermanentJobError("Site not found")
+                    payload, start_date, end_date = await handler(db, job, site)
+                    await save_snapshot(db, job.site_id, job.kind, payload, start_date, end_date)
+                    result = await db.execute(
+                        update(ScheduledJob)
+                        .where(ScheduledJob.id == job.id, ScheduledJob.locked_by == WORKER_ID)
+                        .values(status="succeeded", locked_by=None, error=None, finished_at=_utcnow())
+                    )
+                    if result.rowcount == 0:
+                        # Kilit kaybedildi (iş tekrar kuyruğa alındı): sonuç yeni çalıştırmaya bırakılır
+                        await db.rollback()
+                        print(f"İş kilidi kaybedildi, sonuç yazılmadı (job_id={job.id}, {job.kind})")
+                        return
+                    await db.commit()
+            finally:
+                heartbeat.cancel()
+            self.succeeded += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Arka plan işi başarısız (job_id={job.id}, {job.kind}, deneme {job.attempts}): {type(e).__name__} - {e}")
+            await self._fail(job, e)
+
+    async def _fail(self, job, error):
+        retry = not isinstance(error, PermanentJobError) and job.attempts < job.max_attempts
+        values = {"locked_by": None, "error": str(error)[:2000]}
+        if retry:
+            values.update(status="queued", run_at=_utcnow() + datetime.timedelta(seconds=retry_delay(job.attempts)))
+            self.retried += 1
+        else:
+            values.update(status="failed", finished_at=_utcnow())
+            self.failed += 1
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(ScheduledJob)
+                    .where(ScheduledJob.id == job.id, ScheduledJob.locked_by == WORKER_ID)
+                    .values(**values)
+                )
+                await db.commit()
+        except Exception as e:
+            # İş 'running' kalır; kilit süresi dolunca bakım döngüsü geri alır
+            print(f"İş durumu yazılamadı (job_id={job.id}): {e}")
+
+    async def _maintain(self, interval=60):
+        while True:
+            try:
+                await self._requeue_stale()
+                await self._prune()
+                now = _utcnow()
+                if now.hour >= JOB_NIGHTLY_HOUR and self._last_nightly != now.date():
+                    added = await enqueue_nightly(self.session_factory, now.date())
+                    self._last_nightly = now.date()
+                    if added:
+                        print(f"Gece ön hesaplama işleri kuyruğa alındı: {added}")
+                        self.notify()
+            except Exception as e:
+                print(f"İş kuyruğu bakımı başarısız: {e}")
+            await asyncio.sleep(interval)
+
+    async def _requeue_stale(self):
+        """Kilidi JOB_LEASE_SECONDS'tan eski 'running' işleri (çöken süreç) kuyruğa döndürür"""
+        now = _utcnow()
+        stale = (
+            ScheduledJob.status == "running",
+            ScheduledJob.locked_at < now - datetime.timedelta(seconds=JOB_LEASE_SECONDS)
+        )
+        async with self.session_factory() as db:
+            # Denemesi tükenen iş (her seferinde süreci çökertiyor olabilir) tekrar alınmaz
+            await db.execute(
+                update(ScheduledJob)
+                .where(*stale, ScheduledJob.attempts >= ScheduledJob.max_attempts)
+                .values(status="failed", locked_by=None, error="Worker lease expired", finished_at=now)
+            )
+            await db.execute(
+                update(ScheduledJob)
+                .where(*stale)
+                .values(status="queued", locked_by=None, error="Worker lease expired")
+            )
+            await db.commit()
+
+    async def _prune(self):
+        finished_before = _utcnow() - datetime.timedelta(days=JOB_RETENTION_DAYS)
+        async with self.session_factory() as db:
+            await db.execute(
+                delete(ScheduledJob)
+                .where(ScheduledJob.status.in_(("succeeded", "failed")), ScheduledJob.finished_at < finished_before)
+            )
+            await db.commit()
+
+    def stats(self):
+        return {
+            "workers": self.concurrency if self._tasks else 0,
+            "running": self.running,
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
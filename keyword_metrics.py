@@ -0,0 +1,210 @@
+# keyword_metrics.py
+import numpy as np
+
+# Değerlendirme etiketleri (kova indeksi 0..3)
+RATING_LABELS = np.array(["Geliştirilebilir", "Orta", "İyi", "Mükemmel"], dtype=object)
+
+# Toplam metrikler için eşikler: değer eşikten büyükse bir üst kovaya geçer
+METRIC_THRESHOLDS = {
+    "clicks": np.array([20, 50, 100]),
+    "impressions": np.array([200, 500, 1000]),
+    "ctr": np.array([1, 3, 5]),  # yüzde
+}
+# Pozisyon için eşikler: değer eşikten küçük ya da eşitse bir üst kovaya geçer
+POSITION_THRESHOLDS = np.array([3, 10, 20])
+
+# Anahtar kelime performans puanı -> kova (40, 60, 80 ve üstü)
+PERFORMANCE_SCORE_THRESHOLDS = np.array([40, 60, 80])
+
+# Düşük tıklama önerisini tetikleyen sınır
+LOW_CLICK_THRESHOLD = 5
+
+
+def rate_metric(value, metric):
+    """Toplam bir metriğin değerlendirme etiketini döndürür ('clicks', 'impressions', 'ctr')"""
+    thresholds = METRIC_THRESHOLDS.get(metric)
+    if thresholds is None:
+        return "Belirsiz"
+    return RATING_LABELS[np.searchsorted(thresholds, value, side="left")]
+
+
+def rate_position(position):
+    """Ortalama pozisyonun değerlendirme etiketini döndürür"""
+    return RATING_LABELS[3 - np.searchsorted(POSITION_THRESHOLDS, position, side="left")]
+
+
+def top_indices(values, k):
+    """
+    En büyük k değerin indekslerini büyükten küçüğe döndürür.
+
+    Eşit değerlerde orijinal sıra korunur (sorted(..., reverse=True) ile aynı sonuç);
+    tüm diziyi sıralamak yerine np.partition ile eşik bulunur.
+    """
+    n = len(values)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(-values, kind="stable")
+
+    threshold = np.partition(values, n - k)[n - k]
+    above = np.flatnonzero(values > threshold)
+    ties = np.flatnonzero(values == threshold)[:k - len(above)]
+    indices = np.concatenate([above, ties])
+    return indices[np.argsort(-values[indices], kind="stable")]
+
+
+class KeywordFrame:
+    """
+    Search Analytics satırlarını bir kez sütun dizilerine yükler.
+
+    Toplamlar, ağırlıklı CTR/pozisyon, performans kovaları, top-k seçimleri ve
+    öneri tetikleyicileri satır satır döngü yerine toplu (vektörel) hesaplanır.
+    """
+
+    def __init__(self, keys, clicks, impressions, ctr, position):
+        self.keys = keys
+        self.clicks = clicks
+        self.impressions = impressions
+        self.ctr = ctr  # oran (0-1)
+        self.position = position
+
+    @classmethod
+    def from_rows(cls, rows):
+        """GSC satırlarından ({'keys', 'clicks', 'impressions', 'ctr', 'position'}) frame oluşturur"""
+        n = len(rows)
+        keys = np.empty(n, dtype=object)
+        keys[:] = [(row.get("keys") or [""])[0] for row in rows]
+
+        def column(name):
+            return np.fromiter((row.get(name, 0) or 0 for row in rows), dtype=np.float64, count=n)
+
+        return cls(keys, column("clicks"), column("impressions"), column("ctr"), column("position"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ---- Toplamlar ----
+    @property
+    def total_clicks(self):
+        return int(self.clicks.sum())
+
+    @property
+    def total_impressions(self):
+        return int(self.impressions.sum())
+
+    @property
+    def ctr_percent(self):
+        """Toplam tıklama / toplam gösterim (yüzde)"""
+        total_impressions = self.impressions.sum()
+        return float(self.clicks.sum() / total_impressions * 100) if total_impressions > 0 else 0.0
+
+    @property
+    def mean_position(self):
+        """Anahtar kelimelerin basit pozisyon ortalaması"""
+        return float(self.position.mean()) if len(self) else 0.0
+
+    @property
+    def weighted_position(self):
+        """Gösterim ağırlıklı ortalama pozisyon"""
+        total_impressions = self.impressions.sum()
+        if total_impressions <= 0:
+            return self.mean_position
+        return float(np.dot(self.position, self.impressions) / total_impressions)
+
+    # ---- Satır bazında ----
+    def performance_scores(self):
+        """Her anahtar kelime için 0-100 arası performans puanı"""
+        ctr_percent = self.ctr * 100
+        clicks_score = np.select(
+            [self.clicks > 50, self.clicks > 20, self.clicks > 5], [25, 15, 5], 0
+        )
+        ctr_score = np.select(
+            [ctr_percent > 5, ctr_percent > 3, ctr_percent > 1], [25, 15, 5], 0
+        )
+        position_score = np.select(
+            [self.position <= 3, self.position <= 10, self.position <= 20], [50, 30, 15], 0
+        )
+        return clicks_score + ctr_score + position_score
+
+    def performance_labels(self):
+        """Her anahtar kelimenin performans etiketi"""
+        buckets = np.searchsorted(PERFORMANCE_SCORE_THRESHOLDS, self.performance_scores(), side="right")
+        return RATING_LABELS[buckets]
+
+    def performance_counts(self):
+        """Etiket başına anahtar kelime sayısı"""
+        buckets = np.searchsorted(PERFORMANCE_SCORE_THRESHOLDS, self.performance_scores(), side="right")
+        counts = np.bincount(buckets, minlength=len(RATING_LABELS))
+        return {label: int(count) for label, count in zip(RATING_LABELS[::-1], counts[::-1])}
+
+    def top_by(self, column, k):
+        """Verilen sütuna ('clicks', 'impressions', ...) göre en iyi k satırın indeksleri"""
+        return top_indices(getattr(self, column), k)
+
+    def row(self, index):
+        """Tek satırı API biçiminde döndürür"""
+        return {
+            "keys": [self.keys[index]],
+            "clicks": int(self.clicks[index]),
+            "impressions": int(self.impressions[index]),
+            "ctr": float(self.ctr[index]),
+            "position": float(self.position[index]),
+        }
+
+    # ---- Öneriler ----
+    def recommendations(self, avg_ctr=None, avg_position=None):
+        """Dinamik SEO önerilerini döndürür"""
+        avg_ctr = self.ctr_percent if avg_ctr is None else avg_ctr
+        avg_position = self.weighted_position if avg_position is None else avg_position
+        recommendations = []
+
+        # Ortalama CTR düşükse
+        if avg_ctr < 2:
+            recommendations.append("Meta başlıklarınızı ve açıklamalarınızı optimize ederek tıklama oranını (CTR) artırın.")
+
+        # Ortalama pozisyon düşükse
+        if avg_position > 15:
+            recommendations.append("İçerik kalitenizi artırın ve ilgili anahtar kelimeler için daha optimize edin.")
+
+        if len(self):
+            # En az tıklanan anahtar kelimeler için
+            if (self.clicks < LOW_CLICK_THRESHOLD).any():
+                recommendations.append("Düşük tıklama alan anahtar kelimeler için içeriklerinizi gözden geçirin.")
+
+            # En yüksek gösterimli anahtar kelime için
+            top_keyword = self.keys[self.top_by("impressions", 1)[0]]
+            recommendations.append(f"'{top_keyword}' anahtar kelimesi için daha fazla içerik oluşturun.")
+
+        # Genel öneriler
+        recommendations.append("Düzenli olarak yeni ve kaliteli içerik yayınlayın.")
+        recommendations.append("Teknik SEO aspectlerinizi (site hızı, mobil uyumluluk vb.) düzenli olarak kontrol edin.")
+
+        return recommendations
+
+    def summary(self, top=10):
+        """
+        JSON özet yanıtı.
+
+        Returns:
+            dict: Toplamlar, değerlendirmeler, performans dağılımı, top-k listeleri ve öneriler
+        """
+        ctr_percent = self.ctr_percent
+        weighted_position = self.weighted_position
+        return {
+            "keywordCount": len(self),
+            "totalClicks": self.total_clicks,
+            "totalImpressions": self.total_impressions,
+            "ctr": ctr_percent,
+            "averagePosition": self.mean_position,
+            "weightedPosition": weighted_position,
+            "ratings": {
+                "clicks": rate_metric(self.total_clicks, "clicks"),
+                "impressions": rate_metric(self.total_impressions, "impressions"),
+                "ctr": rate_metric(ctr_percent, "ctr"),
+                "position": rate_position(weighted_position),
+            },
+            "performance": self.performance_counts(),
+            "topByClicks": [self.row(i) for i in self.top_by("clicks", top)],
+            "topByImpressions": [self.row(i) for i in self.top_by("impressions", top)],
+            "recommendations": self.recommendations(ctr_percent, weighted_position),
+        }
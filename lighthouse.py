@@ -0,0 +1,596 @@
+# lighthouse.py
+import asyncio
+import datetime
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+from sqlalchemy import delete, insert, update, or_
+from sqlalchemy.future import select
+
+from http_client import get_http_client
+from models import LighthouseBatch, LighthouseBatchItem
+import site_utils
+from quota import quota_manager
+
+PAGESPEED_API_URL = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
+
+# Varsayılan olarak istenen Lighthouse kategorileri
+DEFAULT_CATEGORIES = ("performance", "seo", "accessibility", "best-practices")
+
+# PageSpeed strategy parametresi verilmezse desktop kullanır
+DEFAULT_STRATEGY = "desktop"
+
+# Lighthouse kategori id'si -> yanıttaki anahtar
+CATEGORY_KEYS = {
+    "performance": "performance",
+    "seo": "seo",
+    "accessibility": "accessibility",
+    "best-practices": "bestPractices",
+}
+
+# Kompakt yanıtta her audit için varsayılan olarak gönderilen alanlar
+COMPACT_AUDIT_FIELDS = (
+    "id", "title", "description", "score", "scoreDisplayMode",
+    "displayValue", "numericValue", "numericUnit",
+)
+
+# Sonuç bu süre boyunca taze kabul edilir (saniye)
+LIGHTHOUSE_CACHE_TTL = int(os.getenv("LIGHTHOUSE_CACHE_TTL", "3600"))
+# TTL dolduktan sonra bu süre boyunca eski sonuç döndürülür ve arka planda yenilenir
+LIGHTHOUSE_STALE_TTL = int(os.getenv("LIGHTHOUSE_STALE_TTL", "86400"))
+LIGHTHOUSE_CACHE_MAX_ENTRIES = int(os.getenv("LIGHTHOUSE_CACHE_MAX_ENTRIES", "1000"))
+
+# Toplu denetimde API key başına aynı anda çalışan PageSpeed çağrısı sayısı
+# (dakika kotası quota.PAGESPEED_REQUESTS_PER_MINUTE ile uygulanır)
+LIGHTHOUSE_BATCH_CONCURRENCY = int(os.getenv("LIGHTHOUSE_BATCH_CONCURRENCY", "4"))
+# Canlılık sinyali bu kadar eskiyen toplu iş başka bir süreç tarafından devralınır
+LIGHTHOUSE_BATCH_LEASE_SECONDS = int(os.getenv("LIGHTHOUSE_BATCH_LEASE_SECONDS", "120"))
+# Bitmiş toplu işlerin saklanma süresi (gün)
+LIGHTHOUSE_BATCH_RETENTION_DAYS = int(os.getenv("LIGHTHOUSE_BATCH_RETENTION_DAYS", "7"))
+
+ACTIVE_BATCH_STATUSES = ("pending", "running")
+
+# Bu süreci iş sahipliğinde tanımlayan kimlik
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LighthouseError(Exception):
+    """PageSpeed API'sinden geçerli sonuç alınamadığında fırlatılır"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def normalize_url(url):
+    """Aynı sayfanın farklı yazımlarını tek anahtara indirger (şema/host küçük harf, fragment yok)"""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    netloc = parts.netloc.lower()
+    path = parts.path or "/"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
+
+
+def cache_key(url, strategy=None, categories=DEFAULT_CATEGORIES):
+    return (normalize_url(url), strategy or DEFAULT_STRATEGY, tuple(sorted(categories)))
+
+
+async def fetch_lighthouse_result(url, api_key, strategy=None, categories=DEFAULT_CATEGORIES):
+    """
+    PageSpeed Insights API'sini API key kotası dahilinde çağırır; 429/5xx
+    yanıtları kota yöneticisinde beklemeyle tekrar denenir.
+
+    Returns:
+        dict: Yanıttaki lighthouseResult nesnesi
+    """
+    params = [("url", url), ("key", api_key)]
+    params.extend(("category", category) for category in categories)
+    if strategy:
+        params.append(("strategy", strategy))
+
+    client = get_http_client()
+
+    async def request():
+        response = await client.get(PAGESPEED_API_URL, params=params)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        return response
+
+    try:
+        response = await quota_manager.run("pagespeed", request, api_key=api_key)
+    except httpx.HTTPStatusError as e:
+        response = e.response
+    print(f"Lighthouse API yanıt durumu: {response.status_code}")
+
+    if response.status_code != 200:
+        print(f"Lighthouse API hatası: {response.status_code} - {response.text}")
+        raise LighthouseError(response.status_code, f"Lighthouse API error: {response.text}")
+
+    data = response.json()
+
+    if "lighthouseResult" not in data:
+        print("Hata: Yanıtta lighthouseResult anahtarı bulunamadı")
+        raise LighthouseError(500, "Invalid Lighthouse API response format")
+
+    lighthouse_result = data["lighthouseResult"]
+
+    if "categories" not in lighthouse_result:
+        print("Hata: Yanıtta categories anahtarı bulunamadı")
+        raise LighthouseError(500, "Invalid Lighthouse API response format")
+
+    return lighthouse_result
+
+
+def build_full_response(lighthouse_result):
+    """Eski yanıt biçimi: her kategori tüm audits sözlüğünü içerir"""
+    categories = lighthouse_result["categories"]
+    audits = lighthouse_result["audits"]
+    return {
+        key: {
+            "score": categories[category_id]["score"],
+            "audits": audits
+        }
+        for category_id, key in CATEGORY_KEYS.items()
+    }
+
+
+def build_compact_response(lighthouse_result, fields=()):
+    """
+    Her audit'i tek kez gönderen kompakt yanıt.
+
+    Kategoriler yalnızca categories[*].auditRefs'teki referansları listeler;
+    büyük 'details' gibi alanlar yalnızca fields ile istenirse eklenir.
+
+    Args:
+        lighthouse_result (dict): PageSpeed yanıtındaki lighthouseResult
+        fields (iterable): Varsayılanlara ek olarak gönderilecek audit alanları
+
+    Returns:
+        dict: Kategoriler ve tekilleştirilmiş audits
+    """
+    categories = lighthouse_result["categories"]
+    audits = lighthouse_result["audits"]
+    audit_fields = COMPACT_AUDIT_FIELDS + tuple(f for f in fields if f not in COMPACT_AUDIT_FIELDS)
+
+    response = {}
+    # Sıralı ve tekil audit id'leri
+    referenced = {}
+    for category_id, key in CATEGORY_KEYS.items():
+        category = categories[category_id]
+        audit_refs = [
+            {"id": ref["id"], "weight": ref.get("weight", 0), "group": ref.get("group")}
+            for ref in category.get("auditRefs", [])
+        ]
+        referenced.update((ref["id"], None) for ref in audit_refs)
+        response[key] = {
+            "score": category["score"],
+            "auditRefs": audit_refs
+        }
+
+    response["audits"] = {
+        audit_id: {field: audits[audit_id][field] for field in audit_fields if field in audits[audit_id]}
+        for audit_id in referenced
+        if audit_id in audits
+    }
+    return response
+
+
+class LighthouseCache:
+    """
+    Lighthouse sonuçları için TTL'li, stale-while-revalidate önbellek.
+
+    Anahtar (normalize URL, strategy, kategori kümesi) üçlüsüdür. Aynı anahtar
+    için eşzamanlı istekler tek bir PageSpeed çağrısını paylaşır.
+    """
+
+    def __init__(self, ttl=LIGHTHOUSE_CACHE_TTL, stale_ttl=LIGHTHOUSE_STALE_TTL,
+                 max_entries=LIGHTHOUSE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        # anahtar -> (sonuç, alınma zamanı)
+        self._entries = OrderedDict()
+        # anahtar -> devam eden PageSpeed görevi
+        self._pending = {}
+
+    async def get(self, url, api_key, strategy=None, categories=DEFAULT_CATEGORIES):
+        """
+        Önbellekteki sonucu döndürür, gerekirse PageSpeed'i çağırır.
+
+        Returns:
+            tuple: (lighthouseResult, durum) - durum 'HIT', 'STALE' veya 'MISS'
+        """
+        key = cache_key(url, strategy, categories)
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            result, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                return result, "HIT"
+            if age < self.ttl + self.stale_ttl:
+                # Eski sonucu hemen döndür, arka planda yenile
+                self._start_fetch(key, url, api_key, strategy, categories)
+                return result, "STALE"
+
+        task = self._start_fetch(key, url, api_key, strategy, categories)
+        return await asyncio.shield(task), "MISS"
+
+    def peek(self, url, strategy=None, categories=DEFAULT_CATEGORIES):
+        """Taze bir sonuç varsa PageSpeed'i çağırmadan döndürür, yoksa None"""
+        entry = self._entries.get(cache_key(url, strategy, categories))
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def put(self, url, result, strategy=None, categories=DEFAULT_CATEGORIES):
+        self._store(cache_key(url, strategy, categories), result)
+
+    def _store(self, key, result):
+        self._entries[key] = (result, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _start_fetch(self, key, url, api_key, strategy, categories):
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, url, api_key, strategy, categories))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._on_fetch_done(key, t))
+        return task
+
+    def _on_fetch_done(self, key, task):
+        self._pending.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Lighthouse yenileme hatası ({key[0]}): {task.exception()}")
+
+    async def _fetch(self, key, url, api_key, strategy, categories):
+        result = await fetch_lighthouse_result(url, api_key, strategy, categories)
+        self._store(key, result)
+        return result
+
+
+lighthouse_cache = LighthouseCache()
+
+
+class _ApiKeyLimiter:
+    """Bir PageSpeed API key'i için toplu denetim eşzamanlılık sınırı"""
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(LIGHTHOUSE_BATCH_CONCURRENCY)
+
+
+# API key -> sınırlayıcı (aynı key'i kullanan tüm işler kotayı paylaşır)
+_api_key_limiters = {}
+
+
+def _get_api_key_limiter(api_key):
+    limiter = _api_key_limiters.get(api_key)
+    if limiter is None:
+        limiter = _ApiKeyLimiter()
+        _api_key_limiters[api_key] = limiter
+    return limiter
+
+
+def summarize_result(lighthouse_result):
+    """Toplu denetim için kategori skorlarını çıkarır"""
+    categories = lighthouse_result.get("categories", {})
+    return {
+        key: categories[category_id]["score"]
+        for category_id, key in CATEGORY_KEYS.items()
+        if category_id in categories
+    }
+
+
+# ---------- Toplu denetim işleri ----------
+async def create_batch_job(db, user_id, site, urls, strategy=None):
+    """İşi ve sayfa satırlarını oluşturur; iş bu süreç adına sahiplenilmiş olarak döner"""
+    job = LighthouseBatch(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        site=site,
+        strategy=strategy,
+        status="pending",
+        total=len(urls),
+        completed=0,
+        claimed_by=WORKER_ID,
+        heartbeat_at=_utcnow()
+    )
+    db.add(job)
+    await db.flush()
+    if urls:
+        await db.execute(
+            insert(LighthouseBatchItem),
+            [{"job_id": job.id, "url": url, "status": "pending"} for url in urls]
+        )
+    await db.commit()
+    return job
+
+
+async def get_batch_job(db, job_id, user_id, site):
+    """Kullanıcının işi; site, işin sitesiyle aynı host'u göstermiyorsa None"""
+    result = await db.execute(
+        select(LighthouseBatch).where(
+            LighthouseBatch.id == job_id,
+            LighthouseBatch.user_id == user_id
+        )
+    )
+    job = result.scalar_one_or_none()
+    if job is None or site_utils.site_host(job.site) != site_utils.site_host(site):
+        return None
+    return job
+
+
+async def batch_job_to_dict(db, job, offset=0):
+    """İş durumunu ve bitiş sırası `offset`ten sonraki sonuçları döndürür"""
+    items = (await db.execute(
+        select(LighthouseBatchItem)
+        .where(LighthouseBatchItem.job_id == job.id, LighthouseBatchItem.seq > offset)
+        .order_by(LighthouseBatchItem.seq)
+    )).scalars()
+    results = []
+    for item in items:
+        if item.status == "ok":
+            results.append({"url": item.url, "status": "ok", "cache": item.cache, "scores": item.scores})
+        else:
+            results.append({"url": item.url, "status": "error", "error": item.error})
+    return {
+        "jobId": job.id,
+        "site": job.site,
+        "status": job.status,
+        "total": job.total,
+        "completed": job.completed,
+        "error": job.error,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+        "offset": offset,
+        "results": results
+    }
+
+
+async def _audit(url, api_key, strategy=None):
+    """
+    Tek sayfayı API key'in eşzamanlılık sınırı içinde denetler.
+
+    Returns:
+        dict: {'url', 'status': 'ok', 'cache', 'scores'} ya da {'url', 'status': 'error', 'error'}
+    """
+    limiter = _get_api_key_limiter(api_key)
+    async with limiter.semaphore:
+        try:
+            # Önbellekte taze sonuç varsa kota harcanmaz
+            lighthouse_result = lighthouse_cache.peek(url, strategy)
+            cache_status = "HIT"
+            if lighthouse_result is None:
+                lighthouse_result, cache_status = await lighthouse_cache.get(url, api_key, strategy)
+            return {
+                "url": url,
+                "status": "ok",
+                "cache": cache_status,
+                "scores": summarize_result(lighthouse_result)
+            }
+        except LighthouseError as e:
+            return {"url": url, "status": "error", "error": e.detail}
+        except Exception as e:
+            print(f"Toplu Lighthouse denetim hatası ({url}): {type(e).__name__} - {e}")
+            return {"url": url, "status": "error", "error": str(e)}
+
+
+async def _record(session_factory, job_id, item_id, result):
+    """Sonucu yazar; seq iş sayacıyla birlikte artar (okuyucular seq'e göre ilerler)"""
+    async with session_factory() as db:
+        seq = (await db.execute(
+            update(LighthouseBatch)
+            .where(LighthouseBatch.id == job_id)
+            .values(completed=LighthouseBatch.completed + 1, heartbeat_at=_utcnow())
+            .returning(LighthouseBatch.completed)
+        )).scalar_one()
+        await db.execute(
+            update(LighthouseBatchItem)
+            .where(LighthouseBatchItem.id == item_id)
+            .values(
+                status=result["status"],
+                seq=seq,
+                cache=result.get("cache"),
+                scores=result.get("scores"),
+                error=result.get("error")
+            )
+        )
+        await db.commit()
+
+
+async def _set_status(session_factory, job_id, status, **values):
+    async with session_factory() as db:
+        await db.execute(
+            update(LighthouseBatch)
+            .where(
+                LighthouseBatch.id == job_id,
+                LighthouseBatch.claimed_by == WORKER_ID,
+                LighthouseBatch.status.in_(ACTIVE_BATCH_STATUSES)
+            )
+            .values(status=status, **values)
+        )
+        await db.commit()
+
+
+async def _heartbeat(session_factory, job_id):
+    """İş sürdükçe sahipliği tazeler; sahiplik başka sürece geçtiyse döner"""
+    while True:
+        await asyncio.sleep(LIGHTHOUSE_BATCH_LEASE_SECONDS / 3)
+        async with session_factory() as db:
+            result = await db.execute(
+                update(LighthouseBatch)
+                .where(
+                    LighthouseBatch.id == job_id,
+                    LighthouseBatch.claimed_by == WORKER_ID,
+                    LighthouseBatch.status.in_(ACTIVE_BATCH_STATUSES)
+                )
+                .values(heartbeat_at=_utcnow())
+            )
+            await db.commit()
+        if result.rowcount == 0:
+            return
+
+
+async def run_batch_job(session_factory, api_key_loader, job_id):
+    """
+    İşin bekleyen sayfalarını denetler.
+
+    Yarıda kalan iş (yeniden başlatma, çökme) yalnızca 'pending' sayfalarla devam eder.
+
+    Args:
+        api_key_loader: (db, site, user_id) -> API key; key her çalıştırmada işin sahibinin site ayarlarından okunur
+    """
+    async with session_factory() as db:
+        job = await db.get(LighthouseBatch, job_id)
+        if job is None or job.status not in ACTIVE_BATCH_STATUSES:
+            return
+        try:
+            api_key = await api_key_loader(db, job.site, job.user_id)
+        except Exception as e:
+            # Key silinmiş ya da geçersiz: iş devam ettirilemez
+            job.status = "failed"
+            job.error = getattr(e, "detail", None) or str(e)
+            job.finished_at = _utcnow()
+            await db.commit()
+            return
+        job.status = "running"
+        await db.commit()
+        pending = (await db.execute(
+            select(LighthouseBatchItem.id, LighthouseBatchItem.url)
+            .where(LighthouseBatchItem.job_id == job_id, LighthouseBatchItem.status == "pending")
+            .order_by(LighthouseBatchItem.id)
+        )).all()
+
+    async def audit(item_id, url):
+        await _record(session_factory, job_id, item_id, await _audit(url, api_key, job.strategy))
+
+    heartbeat = asyncio.create_task(_heartbeat(session_factory, job_id))
+    audits = asyncio.ensure_future(asyncio.gather(*(audit(row.id, row.url) for row in pending)))
+    try:
+        done, _ = await asyncio.wait({audits, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        if audits not in done:
+            # Sahiplik başka sürece geçti: iş onda devam eder
+            audits.cancel()
+            return
+        audits.result()
+    except BaseException as e:
+        audits.cancel()
+        if isinstance(e, (asyncio.CancelledError, KeyboardInterrupt)):
+            # Kapanış: durum değiştirilmez, iş yeniden başlatmada ya da başka süreçte devam eder
+            raise
+        print(f"Toplu Lighthouse işi başarısız: {e}")
+        await _set_status(session_factory, job_id, "failed", error=str(e), finished_at=_utcnow())
+        return
+    finally:
+        heartbeat.cancel()
+
+    await _set_status(session_factory, job_id, "completed", finished_at=_utcnow())
+
+
+# iş ID'si -> bu süreçte çalışan görev
+_running = {}
+
+
+def start_batch_job(session_factory, api_key_loader, job_id):
+    """İşi arka planda başlatır; zaten çalışıyorsa mevcut görevi döndürür"""
+    task = _running.get(job_id)
+    if task is None:
+        task = asyncio.create_task(run_batch_job(session_factory, api_key_loader, job_id))
+        _running[job_id] = task
+        task.add_done_callback(lambda t: _running.pop(job_id, None))
+    return task
+
+
+async def claim_orphaned_batch_jobs(session_factory):
+    """
+    Sahipsiz ya da canlılık sinyali eskimiş aktif işleri bu süreç adına sahiplenir.
+
+    Returns:
+        list: Sahiplenilen iş ID'leri
+    """
+    stale_before = _utcnow() - datetime.timedelta(seconds=LIGHTHOUSE_BATCH_LEASE_SECONDS)
+    async with session_factory() as db:
+        result = await db.execute(
+            update(LighthouseBatch)
+            .where(
+                LighthouseBatch.status.in_(ACTIVE_BATCH_STATUSES),
+                or_(LighthouseBatch.claimed_by.is_(None), LighthouseBatch.heartbeat_at < stale_before)
+            )
+            .values(claimed_by=WORKER_ID, heartbeat_at=_utcnow())
+            .returning(LighthouseBatch.id)
+        )
+        job_ids = list(result.scalars())
+        await db.commit()
+    return job_ids
+
+
+async def prune_batch_jobs(session_factory):
+    """Saklama süresi dolan bitmiş işleri siler (çalışan işlere dokunulmaz)"""
+    finished_before = _utcnow() - datetime.timedelta(days=LIGHTHOUSE_BATCH_RETENTION_DAYS)
+    async with session_factory() as db:
+        await db.execute(
+            delete(LighthouseBatch).where(
+                LighthouseBatch.status.notin_(ACTIVE_BATCH_STATUSES),
+                LighthouseBatch.finished_at < finished_before
+            )
+        )
+        await db.commit()
+
+
+async def run_batch_recovery_loop(session_factory, api_key_loader, interval=60):
+    """Yarıda kalmış işleri devralıp devam ettirir, eski işleri temizler"""
+    while True:
+        try:
+            for job_id in await claim_orphaned_batch_jobs(session_factory):
+                print(f"Toplu Lighthouse işi devam ettiriliyor: {job_id}")
+                start_batch_job(session_factory, api_key_loader, job_id)
+            await prune_batch_jobs(session_factory)
+        except Exception as e:
+            print(f"Toplu Lighthouse işleri devralınamadı: {e}")
+        await asyncio.sleep(interval)
+
+
+# Devralma döngüsünün görevi
+_background = []
+
+
+def start_background_tasks(session_factory, api_key_loader):
+    if not _background:
+        _background.append(asyncio.create_task(run_batch_recovery_loop(session_factory, api_key_loader)))
+
+
+async def release_batch_jobs(session_factory):
+    """Kapanışta bu sürecin işlerini bırakır; başka süreç beklemeden devralabilir"""
+    while _background:
+        _background.pop().cancel()
+    for task in list(_running.values()):
+        task.cancel()
+    async with session_factory() as db:
+        await db.execute(
+            update(LighthouseBatch)
+            .where(LighthouseBatch.claimed_by == WORKER_ID, LighthouseBatch.status.in_(ACTIVE_BATCH_STATUSES))
+            .values(claimed_by=None)
+        )
+        await db.commit()
+
+
+async def run_audits(urls, api_key, strategy=None):
+    """
+    Sayfaları toplu denetimle aynı kota sınırları içinde denetler ve sonuçları döndürür.
+
+    Arka plan ön hesaplaması için; iş kaydı oluşturulmaz.
+    """
+    return list(await asyncio.gather(*(_audit(url, api_key, strategy) for url in urls)))
@@ -1,21 +1,22 @@
 import os
+import json
 import datetime
 from datetime import date, timedelta
 from dotenv import load_dotenv
 
+# Proje modülleri ayarlarını import sırasında okur; .env onlardan önce yüklenmeli
+load_dotenv()
+
 from fastapi import FastAPI, Depends, HTTPException, Response, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as GoogleRequest
 import httpx
 from httpx import TimeoutException, HTTPStatusError, RequestError
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, func, BigInteger, CheckConstraint, Numeric
 from sqlalchemy.orm import relationship, backref
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.exc import IntegrityError
@@ -35,10 +36,73 @@ from reportlab.lib.pagesizes import letter
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from io import BytesIO
-from pdf_builder import create_seo_pdf, create_page_analysis_pdf
-from models import Base, User, TokenStorage, SiteSettings, GoogleAnalyticsProperty, Site
+from pdf_pool import (
+    render as render_pdf,
+    start as start_pdf_pool,
+    shutdown as shutdown_pdf_pool,
+    PdfRenderTimeout,
+    iter_file as iter_pdf_file,
+)
+from google_services import (
+    get_service,
+    execute as execute_google_request,
+    get_stats as get_google_api_stats,
+    warm_up as warm_up_google_services,
+    shutdown as shutdown_google_services,
+)
+from models import User, TokenStorage, SiteSettings, GoogleAnalyticsProperty, Site
+from site_utils import normalize_site_url, site_host
+from ga_reports import fetch_traffic_analysis
+from http_client import get_http_client, close_http_client
+from lighthouse import (
+    lighthouse_cache,
+    LighthouseError,
+    build_full_response,
+    build_compact_response,
+    create_batch_job as create_lighthouse_batch_job,
+    get_batch_job as get_lighthouse_batch_job,
+    batch_job_to_dict as lighthouse_batch_job_to_dict,
+    start_batch_job as start_lighthouse_batch_job,
+    start_background_tasks as start_lighthouse_background_tasks,
+    release_batch_jobs as release_lighthouse_batch_jobs,
+    run_audits as run_lighthouse_audits,
+)
+from search_console import fetch_top_pages, iter_search_analytics, fetch_search_analytics
+from gsc_sync import (
+    covers as gsc_local_covers,
+    iter_local as iter_local_search_analytics,
+    start_sync as start_gsc_sync,
+    is_running as gsc_sync_running,
+    get_sync_state as get_gsc_sync_state,
+    state_to_dict as gsc_sync_state_to_dict,
+)
+from report_cache import report_cache, report_key, etag_for, etag_matches
+from keyword_metrics import KeywordFrame
+from rollups import (
+    RollupError,
+    parse_dimensions as parse_rollup_dimensions,
+    parse_percentiles as parse_rollup_percentiles,
+    validate as validate_rollup,
+    query_rollup,
+    summarize_rows as summarize_search_rows,
+)
+import url_inspection
+from url_inspection import InspectionError
+from inspection_history import record_inspection, get_history as get_inspection_history
+from jobs import (
+    JobScheduler,
+    PermanentJobError,
+    enqueue as enqueue_job,
+    applicable_kinds as precompute_kinds,
+    get_snapshot as get_dashboard_snapshot,
+    PRECOMPUTE_KINDS,
+)
+from quota import quota_manager, set_quota_user
+from credential_store import CredentialStore, CredentialNotFoundError, CredentialRefreshError
+from site_permissions import SitePermissionStore
+from database import create_engine, get_pool_stats, check_schema_version
+from auth import create_jwt, verify_token, authenticate, require_metrics_token, UserContext, JWT_TTL_SECONDS, token_cache
 
-load_dotenv()
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 # ---------- FastAPI ----------
@@ -55,25 +119,173 @@ app.add_middleware(
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL is None:
     raise ValueError("DATABASE_URL environment variable is not set")
-engine = create_async_engine(DATABASE_URL, echo=False)
+engine = create_engine(DATABASE_URL)
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-# ---------- JWT ----------
-SECRET = os.getenv("JWT_SECRET", "change-me")
-
-def create_jwt(user_id: int):
-    return jwt.encode({"sub": str(user_id)}, SECRET, algorithm="HS256")
-
 # ---------- DB HELPERS ----------
 async def get_db():
+    """İstek başına session; bağlantı havuzdan ancak ilk sorguda alınır"""
     async with async_session() as session:
         yield session
 
+# ---------- GOOGLE CREDENTIALS ----------
+credential_store = CredentialStore(async_session)
+# Kullanıcı başına doğrulanmış Search Console mülkleri (sites.list önbelleği)
+site_permissions = SitePermissionStore()
+
+async def get_user_credentials(user_id: int, db: AsyncSession):
+    """Kullanıcının Google kimlik bilgilerini önbellekten (yoksa DB'den) döndürür"""
+    try:
+        return await credential_store.get(user_id, db)
+    except CredentialNotFoundError:
+        print("Hata: Google token bulunamadı")
+        raise HTTPException(status_code=401, detail="No Google token found")
+    except CredentialRefreshError as e:
+        print(f"Token yenileme hatası: {e}")
+        raise HTTPException(status_code=401, detail="Token refresh failed")
+
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Oturumdaki kullanıcıyı döndüren dependency.
+
+    JWT doğrulaması önbellekli yapılır; Google kimlik bilgileri ilk ihtiyaçta yüklenir.
+    """
+    user_id = authenticate(request)
+    # Bu istekteki Google çağrıları kullanıcının kotasından düşülür
+    set_quota_user(user_id)
+    return UserContext(user_id, db, get_user_credentials)
+
+# Toplu Lighthouse denetiminde tek işte en fazla denetlenecek sayfa sayısı
+LIGHTHOUSE_BATCH_MAX_PAGES = int(os.getenv("LIGHTHOUSE_BATCH_MAX_PAGES", "500"))
+# SEO PDF raporunun tablosuna girebilecek en fazla anahtar kelime
+PDF_MAX_KEYWORD_ROWS = int(os.getenv("PDF_MAX_KEYWORD_ROWS", "5000"))
+# Arka plan işlerini (gece ön hesaplamaları) bu süreçte çalıştır; ayrı worker (worker.py) varsa false
+JOB_WORKER_ENABLED = os.getenv("JOB_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Gece Lighthouse ile denetlenen en çok tıklanan sayfa sayısı
+PRECOMPUTE_LIGHTHOUSE_PAGES = int(os.getenv("PRECOMPUTE_LIGHTHOUSE_PAGES", "10"))
+# Pano endpoint'lerinin varsayılanları; ön hesaplanan veri bu parametrelerle üretilir
+DASHBOARD_KEYWORD_LIMIT = 50
+DASHBOARD_KEYWORD_TOP = 10
+DASHBOARD_PAGE_LIMIT = 20
+DASHBOARD_TRAFFIC_DAYS = 30
+
+# ---------- SEARCH CONSOLE VERİSİ ----------
+def resolve_date_range(start_date=None, end_date=None, days=30):
+    """Verilmeyen tarihleri varsayılan aralıkla (bitiş: bugün, başlangıç: `days` gün önce) doldurur"""
+    end = end_date or date.today()
+    start = start_date or end - timedelta(days=days)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    return start, end
+
+async def resolve_site(db, site, user_id=None, columns=None):
+    """
+    Site kaydını normalize edilmiş host üzerinden (benzersiz indeks) bulur.
+
+    Args:
+        site (str): İstekteki site ('https://Example.com/' gibi)
+        user_id (int, optional): Verilirse yalnızca bu kullanıcının sitesi döner
+        columns (list, optional): Tüm kayıt yerine seçilecek sütunlar (ör. [Site.id])
+    """
+    stmt = select(*(columns or [Site])).where(Site.site_host == site_host(site))
+    if user_id is not None:
+        stmt = stmt.where(Site.user_id == user_id)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+async def get_local_search_site(db, site, user_id, start, end):
+    """
+    Kullanıcının sitesi için yerel GSC verisi istenen aralığı kapsıyorsa site_id döndürür.
+
+    Yerel veri yalnızca sitenin sahibine sunulur; diğer durumlarda None (canlı API kullanılır).
+    """
+    site_id = await resolve_site(db, site, user_id, columns=[Site.id])
+    if site_id is not None and await gsc_local_covers(db, site_id, start, end):
+        return site_id
+    return None
+
+async def open_search_rows(db, user_id, site, start, end, dimensions, filters=None, limit=None):
+    """
+    Search Analytics satırlarını async iterator olarak döndürür.
+
+    Senkronize edilmiş yerel veri aralığı kapsıyorsa veritabanından okur,
+    kapsamıyorsa Search Console API'sini sayfalayarak çağırır.
+
+    Args:
+        dimensions (list): "query", "page", "country", "device", "date"
+        filters (dict, optional): {boyut: değer} eşitlik filtreleri
+        limit (int, optional): En fazla satır; None ise tümü
+    """
+    site_id = await get_local_search_site(db, site, user_id, start, end)
+    if site_id is not None:
+        print(f"Search Console verisi yerelden okunuyor: {site} ({start} - {end})")
+        return iter_local_search_analytics(async_session, site_id, start, end, dimensions, filters, limit)
+
+    creds = await get_user_credentials(user_id, db)
+    service = get_service('searchconsole', 'v1', creds)
+    body = {
+        "startDate": str(start),
+        "endDate": str(end),
+        "dimensions": dimensions,
+        "dataState": "all"  # Tüm verileri dahil et
+    }
+    if filters:
+        body["dimensionFilterGroups"] = [{
+            "filters": [
+                {"dimension": name, "operator": "equals", "expression": value}
+                for name, value in filters.items()
+            ]
+        }]
+    # Google API tam URL formatı bekler: https://domain.com/
+    return iter_search_analytics(service, f"https://{site}/", body, limit=limit)
+
+async def fetch_search_rows(db, user_id, site, start, end, dimensions, filters=None, limit=None):
+    """open_search_rows satırlarını liste olarak döndürür"""
+    rows = await open_search_rows(db, user_id, site, start, end, dimensions, filters, limit)
+    return [row async for row in rows]
+
+def pages_from_rows(rows):
+    """Search Analytics page satırlarını sayfa listesine çevirir"""
+    pages = []
+    for row in rows:
+        page_url = row["keys"][0]
+        # URL'den başlık oluştur
+        page_title = page_url.split("/")[-1] or "Ana Sayfa"
+        pages.append({
+            "url": page_url,
+            "title": page_title
+        })
+    return pages
+
+# ---------- ÖN HESAPLANMIŞ PANO VERİSİ ----------
+async def fresh_snapshot_payload(db, site_id, kind):
+    """
+    Gece hesaplanmış pano verisini döndürür.
+
+    Tarih aralıklı veriler yalnızca bugün biten varsayılan aralık için hesaplandıysa
+    kullanılır; böylece istek anında hesaplanacak sonuçla aynıdır.
+    """
+    snapshot = await get_dashboard_snapshot(db, site_id, kind)
+    if snapshot is None or snapshot.end_date != date.today():
+        return None
+    print(f"Ön hesaplanmış veri kullanılıyor: site_id={site_id}, {kind} ({snapshot.computed_at})")
+    return snapshot.payload
+
+async def get_fresh_snapshot(db, user_id, site, kind):
+    site_id = await resolve_site(db, site, user_id, columns=[Site.id])
+    if site_id is None:
+        return None
+    return await fresh_snapshot_payload(db, site_id, kind)
+
 # ---------- MODELS ----------
 class LoginPayload(BaseModel):
     username: str
     password: str
 
+class UrlInspectionBatchPayload(BaseModel):
+    urls: list[str] = []
+    sitemap: str | None = None
+
 # ---------- AUTH ----------
 GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/auth"
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
@@ -108,7 +320,7 @@ async def login(payload: LoginPayload, response: Response, db: AsyncSession = De
     if not user or not bcrypt.verify(payload.password, user.hashed_password):
         return RedirectResponse(url="/auth/google", status_code=302)
     token = create_jwt(user.id)
-    response.set_cookie(key="token", value=token, httponly=True)
+    response.set_cookie(key="token", value=token, httponly=True, max_age=JWT_TTL_SECONDS)
     return {"ok": True}
 
 @app.get("/login")
@@ -124,8 +336,8 @@ async def google_callback(request: Request, db: AsyncSession = Depends(get_db)):
     try:
         flow.fetch_token(authorization_response=str(request.url))
         creds = flow.credentials
-        service = build("oauth2", "v2", credentials=creds)
-        user_info = service.userinfo().get().execute()
+        service = get_service("oauth2", "v2", creds)
+        user_info = await execute_google_request(service.userinfo().get(), "userinfo")
         google_id = user_info["id"]
 
         res = await db.execute(select(User).where(User.google_id == google_id))
@@ -158,6 +370,13 @@ async def google_callback(request: Request, db: AsyncSession = Depends(get_db)):
             token_storage.expiry = creds.expiry
         
         await db.commit()
+        credential_store.put(user.id, creds)
+        
+        # Yeni yetkilerle site indeksini yenile (başarısız olursa ilk istekte yeniden denenir)
+        try:
+            await site_permissions.refresh(user.id, creds)
+        except Exception as e:
+            print(f"Site indeksi yenilenemedi: {e}")
         
         # JWT token oluştur
         token = create_jwt(user.id)
@@ -174,7 +393,7 @@ async def google_callback(request: Request, db: AsyncSession = Depends(get_db)):
             httponly=True,
             samesite="lax",  
             secure=False,   
-            max_age=86400,   
+            max_age=JWT_TTL_SECONDS,
             path="/",     
             domain=None      
         )
@@ -184,12 +403,7 @@ async def google_callback(request: Request, db: AsyncSession = Depends(get_db)):
     except Exception as e:
         print(f"Callback işlemi sırasında bir hata oluştu: {e}")
         raise HTTPException(status_code=500, detail="Kimlik doğrulama işlemi sırasında bir hata oluştu.")
-        
-def create_jwt (user_id: int):
-    """
-    Kullanıcı ID'sine göre JWT oluşturur.
-    """
-    return jwt.encode({"sub": str(user_id)}, SECRET, algorithm="HS256")
+
 
 @app.get("/auth/status")
 async def auth_status(request: Request):
@@ -208,16 +422,12 @@ async def auth_status(request: Request):
         raise HTTPException(status_code=401, detail="Yetkilendirme token'ı bulunamadı.")
     
     try:
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload.get("sub"))  # String'den integer'a çevir
+        user_id = verify_token(jwt_token)
         print(f"Token geçerli, user_id: {user_id}")
         return {"isAuthenticated": True, "userId": user_id}
     except jwt.InvalidTokenError as e:
         print(f"Token geçersiz: {e}")
         raise HTTPException(status_code=401, detail="Geçersiz token.")
-    except (ValueError, TypeError) as e:
-        print(f"User ID parse hatası: {e}")
-        raise HTTPException(status_code=401, detail="Geçersiz token formatı.")
 
 
 # Ek olarak logout endpoint'i ekle
@@ -264,55 +474,13 @@ async def check_test_cookie(request: Request):
 
 # ---------- GSC ROUTES ----------
 @app.get("/gsc_sites")
-async def get_gsc_sites(request: Request, db: AsyncSession = Depends(get_db)):
+async def get_gsc_sites(request: Request, refresh: bool = False, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Kullanıcının tüm Search Console mülkleri (önbellekten; refresh=true ile yeniden listelenir)"""
     print("Frontend'den /gsc_sites rotasına istek geldi.")
     try:
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Çerezlerde yetkilendirme token'ı bulunamadı.")
-            raise HTTPException(status_code=401, detail="Yetkilendirme token'ı bulunamadı.")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload.get("sub"))
-            if not user_id:
-                raise HTTPException(status_code=401, detail="Geçersiz token.")
-        except jwt.InvalidTokenError:
-            raise HTTPException(status_code=401, detail="Geçersiz token.")
-
-        res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-        token_storage = res.scalar_one_or_none()
-        if not token_storage:
-            raise HTTPException(status_code=401, detail="Kullanıcı için Google token'ı bulunamadı.")
-        
-        creds = Credentials(
-            token=token_storage.access_token,
-            refresh_token=token_storage.refresh_token,
-            token_uri=token_storage.token_uri,
-            client_id=token_storage.client_id,
-            client_secret=token_storage.client_secret,
-            scopes=token_storage.scopes.split(","),
-            expiry=token_storage.expiry
-        )
-        
-        if not creds.valid:
-            if creds.expired and creds.refresh_token:
-                creds.refresh(GoogleRequest())
-                token_storage.access_token = creds.token
-                token_storage.expiry = creds.expiry
-                await db.commit()
-            else:
-                raise HTTPException(status_code=401, detail="Token süresi doldu ve yenilenemedi.")
-
-        service = build('searchconsole', 'v1', credentials=creds)
-        site_list = service.sites().list().execute()
-        
-        print(f"Google API'den gelen ham yanıt: {site_list}")
-        
-        if 'siteEntry' in site_list:
-            return site_list['siteEntry']
-        else:
-            return JSONResponse(content=[], status_code=200)
+        creds = await user.credentials()
+        index = await site_permissions.get(user.user_id, creds, refresh=refresh)
+        return index.entries
 
     except HTTPException as e:
         print(f"HTTP İstisnası yakalandı: {e.detail}")
@@ -326,216 +494,75 @@ async def get_gsc_sites(request: Request, db: AsyncSession = Depends(get_db)):
 
 
 @app.get("/sites")
-async def get_sites(request: Request, db: AsyncSession = Depends(get_db)):
-    # 1. Kimlik doğrulama kontrolü
-    jwt_token = request.cookies.get("token")
-    if not jwt_token:
-        print("Hata: Token bulunamadı")
-        raise HTTPException(status_code=401, detail="Not logged in")
-    
-    try:
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-        print(f"Token doğrulandı, user_id: {user_id}")
-    except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-        print(f"Token doğrulama hatası: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    # 2. Kullanıcının Google token'ını veritabanından al
-    res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-    token_storage = res.scalar_one_or_none()
-    if not token_storage:
-        print("Hata: Google token bulunamadı")
-        raise HTTPException(status_code=401, detail="No Google token found")
-    
-    # 3. Google Credentials oluştur
-    creds = Credentials(
-        token=token_storage.access_token,
-        refresh_token=token_storage.refresh_token,
-        token_uri=token_storage.token_uri,
-        client_id=token_storage.client_id,
-        client_secret=token_storage.client_secret,
-        scopes=token_storage.scopes.split(","),
-        expiry=token_storage.expiry
-    )
-    
-    # 4. Token yenileme kontrolü
-    if not creds.valid and creds.expired and creds.refresh_token:
-        try:
-            print("Token yenileniyor...")
-            creds.refresh(GoogleRequest())
-            # Veritabanını güncelle
-            token_storage.access_token = creds.token
-            token_storage.expiry = creds.expiry
-            await db.commit()
-            print("Token başarıyla yenilendi")
-        except Exception as e:
-            print(f"Token yenileme hatası: {e}")
-            raise HTTPException(status_code=401, detail="Token refresh failed")
-    
-    # 5. Google Search Console servisini oluştur
-    try:
-        print("Google Search Console servisi oluşturuluyor...")
-        service = build('searchconsole', 'v1', credentials=creds)
-        print("Google Search Console servisi başarıyla oluşturuldu")
-    except Exception as e:
-        print(f"Google API servisi oluşturulamadı: {e}")
-        raise HTTPException(status_code=500, detail="Failed to create Google API service")
+async def get_sites(request: Request, refresh: bool = False, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Sahip ya da tam yetkili olunan Search Console mülkleri (önbellekten; refresh=true ile yeniden listelenir)"""
+    # 1. Kullanıcının Google kimlik bilgilerini al (önbellekte yoksa DB'den)
+    creds = await user.credentials()
     
-    # 6. Site listesini al - EK HATA YAKALAMA EKLEDİK
+    # 2. Site indeksini al (TTL dolmadıysa Google'a gidilmez)
     try:
-        print("Site listesi alınıyor...")
-        site_list = service.sites().list().execute()
-        print(f"Google API'den gelen ham yanıt: {site_list}")
-        
-        # Yanıtın yapısını kontrol et
-        if not site_list:
-            print("Hata: Google API boş yanıt döndürdü")
-            return {"sites": []}
-            
-        if 'siteEntry' not in site_list:
-            print("Hata: Yanıtta 'siteEntry' anahtarı bulunamadı")
-            print(f"Yanıt anahtarları: {list(site_list.keys())}")
-            return {"sites": []}
-        
-        # Her site için permissionLevel bilgisini ekle
-        sites = []
-        for site in site_list['siteEntry']:
-            site_url = site.get('siteUrl', '')
-            permission_level = site.get('permissionLevel', '')
-            
-            print(f"Site bulundu: {site_url}, Yetki: {permission_level}")
-            
-            # Sadece tam yetkili veya sahip olduğumuz siteleri ekle
-            if permission_level in ['siteOwner', 'siteFullUser']:
-                sites.append({
-                    'siteUrl': site_url,
-                    'permissionLevel': permission_level
-                })
-            else:
-                print(f"Site atlandı: {site_url}, Yetki: {permission_level}")
-        
-        print(f"Döndürülecek siteler: {sites}")
-        return {"sites": sites}
-
+        index = await site_permissions.get(user.user_id, creds, refresh=refresh)
     except Exception as e:
         print(f"Site listesi alınırken hata: {type(e).__name__} - {e}")
+        
+        # Kota hataları (QuotaExceededError) 429 + Retry-After olarak aynen iletilir
+        if isinstance(e, HTTPException):
+            raise
+        elif hasattr(e, 'code') and e.code == 403:
+            print("Hata: Google API erişim reddedildi")
+            raise HTTPException(status_code=403, detail="Google API access denied")
+        elif hasattr(e, 'code') and e.code == 401:
+            print("Hata: Google token geçersiz")
+            raise HTTPException(status_code=401, detail="Google token invalid")
+        else:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch sites: {str(e)}")
     
-    # Google API hatalarını daha yakalayalım
-    if hasattr(e, 'reason') and e.reason in ['quotaExceeded', 'dailyLimitExceeded']:
-        print("Hata: Google API kotası aşıldı")
-        raise HTTPException(status_code=429, detail="Google API quota exceeded")
-    elif hasattr(e, 'code') and e.code == 403:
-        print("Hata: Google API erişim reddedildi")
-        raise HTTPException(status_code=403, detail="Google API access denied")
-    elif hasattr(e, 'code') and e.code == 401:
-        print("Hata: Google token geçersiz")
-        raise HTTPException(status_code=401, detail="Google token invalid")
-    else:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch sites: {str(e)}")
+    # 3. Sadece tam yetkili veya sahip olduğumuz siteler
+    return {"sites": index.verified_sites()}
 
 
 @app.get("/sites/{site}/pages")
-async def get_pages(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_pages(
+    site: str,
+    request: Request,
+    limit: int = 20,
+    start_date: date = None,
+    end_date: date = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     print(f"=== Sayfalar endpoint'ine istek geldi: {site} ===")
     
     try:
-        # 1. Kimlik doğrulama kontrolü
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Token bulunamadı")
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-            print(f"Token doğrulandı, user_id: {user_id}")
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            print(f"Token doğrulama hatası: {e}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        # 2. Kullanıcının Google token'ını veritabanından al
-        res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-        token_storage = res.scalar_one_or_none()
-        if not token_storage:
-            print("Hata: Google token bulunamadı")
-            raise HTTPException(status_code=401, detail="No Google token found")
-        
-        # 3. Google Credentials oluştur
-        creds = Credentials(
-            token=token_storage.access_token,
-            refresh_token=token_storage.refresh_token,
-            token_uri=token_storage.token_uri,
-            client_id=token_storage.client_id,
-            client_secret=token_storage.client_secret,
-            scopes=token_storage.scopes.split(","),
-            expiry=token_storage.expiry
-        )
+        user_id = user.user_id
         
-        # 4. Token yenileme kontrolü
-        if not creds.valid and creds.expired and creds.refresh_token:
-            try:
-                print("Token yenileniyor...")
-                creds.refresh(GoogleRequest())
-                # Veritabanını güncelle
-                token_storage.access_token = creds.token
-                token_storage.expiry = creds.expiry
-                await db.commit()
-                print("Token başarıyla yenilendi")
-            except Exception as e:
-                print(f"Token yenileme hatası: {e}")
-                raise HTTPException(status_code=401, detail="Token refresh failed")
+        # 2. Tarih aralığını belirle (varsayılan: son 30 gün)
+        start, end = resolve_date_range(start_date, end_date)
         
-        # 5. Google Search Console servisini oluştur
-        try:
-            print("Google Search Console servisi oluşturuluyor...")
-            service = build('searchconsole', 'v1', credentials=creds)
-            print("Google Search Console servisi başarıyla oluşturuldu")
-        except Exception as e:
-            print(f"Google API servisi oluşturulamadı: {e}")
-            raise HTTPException(status_code=500, detail="Failed to create Google API service")
+        # Varsayılan parametrelerle gece hesaplanmış liste varsa onu döndür
+        if limit == DASHBOARD_PAGE_LIMIT and start_date is None and end_date is None:
+            snapshot = await get_fresh_snapshot(db, user_id, site, "pages")
+            if snapshot is not None:
+                return snapshot
         
-        # 6. Sayfaları al
+        # 3. Sayfaları al
         try:
             print("Sayfalar alınıyor...")
             
-            # Son 30 günün verilerini al
-            end_date = date.today()
-            start_date = end_date - timedelta(days= date_range)
-            
-            request_body = {
-                "startDate": start_date.strftime("%Y-%m-%d"),
-                "endDate": end_date.strftime("%Y-%m-%d"),
-                "dimensions": ["page"],
-                "rowLimit": 20
-            }
-            
-            # Google API tam URL formatı bekler: https://domain.com/
-            site_url = f"https://{site}/"
-            print(f"Site URL: {site_url}")
-            
-            response = service.searchanalytics().query(
-                siteUrl=site_url,
-                body=request_body
-            ).execute()
-            
-            print(f"Google API yanıtı: {response}")
+            # En çok tıklanan sayfalar (yerel veri varsa oradan; limit<=0 ise tümü)
+            rows = await fetch_search_rows(
+                db, user_id, site, start, end, ["page"],
+                limit=limit if limit > 0 else None
+            )
+            print(f"Alınan sayfa sayısı: {len(rows)}")
             
-            pages = []
-            if "rows" in response:
-                for row in response["rows"]:
-                    page_url = row["keys"][0]
-                    # URL'den başlık oluştur
-                    page_title = page_url.split("/")[-1] or "Ana Sayfa"
-                    
-                    pages.append({
-                        "url": page_url,
-                        "title": page_title
-                    })
+            pages = pages_from_rows(rows)
             
             print(f"Döndürülen sayfalar: {pages}")
             return {"pages": pages}
         
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Sayfaları getirme hatası: {type(e).__name__} - {e}")
             raise HTTPException(status_code=500, detail=f"Failed to fetch pages: {str(e)}")
@@ -548,7 +575,16 @@ async def get_pages(site: str, request: Request, db: AsyncSession = Depends(get_
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @app.get("/sites/{site}/lighthouse")
-async def get_lighthouse_data(site: str, url: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_lighthouse_data(
+    site: str,
+    url: str,
+    request: Request,
+    strategy: str = None,
+    view: str = "full",
+    fields: str = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     # URL'yi decode et
     from urllib.parse import unquote
     decoded_url = unquote(url)
@@ -556,111 +592,31 @@ async def get_lighthouse_data(site: str, url: str, request: Request, db: AsyncSe
     try:
         print(f"Lighthouse endpoint'i çağrıldı: site={site}, url={decoded_url}")
         
-        # 1. Kimlik doğrulama kontrolü
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Token bulunamadı")
-            raise HTTPException(status_code=401, detail="Not logged in")
+        # 2. Kullanıcının Google kimlik bilgilerini al (önbellekte yoksa DB'den)
+        creds = await user.credentials()
         
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-            print(f"Token doğrulandı, user_id: {user_id}")
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            print(f"Token doğrulama hatası: {e}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        # 2. Kullanıcının Google token'ını veritabanından al
-        res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-        token_storage = res.scalar_one_or_none()
-        if not token_storage:
-            print("Hata: Google token bulunamadı")
-            raise HTTPException(status_code=401, detail="No Google token found")
-        
-        # 3. Google Credentials oluştur
-        creds = Credentials(
-            token=token_storage.access_token,
-            refresh_token=token_storage.refresh_token,
-            token_uri=token_storage.token_uri,
-            client_id=token_storage.client_id,
-            client_secret=token_storage.client_secret,
-            scopes=token_storage.scopes.split(","),
-            expiry=token_storage.expiry
-        )
-        
-        # 4. Token yenileme kontrolü
-        if not creds.valid and creds.expired and creds.refresh_token:
-            try:
-                print("Token yenileniyor...")
-                creds.refresh(GoogleRequest())
-                # Veritabanını güncelle
-                token_storage.access_token = creds.token
-                token_storage.expiry = creds.expiry
-                await db.commit()
-                print("Token başarıyla yenilendi")
-            except Exception as e:
-                print(f"Token yenileme hatası: {e}")
-                raise HTTPException(status_code=401, detail="Token refresh failed")
-        
-        # 5. Site ayarlarından API Key'i al
-        settings_res = await db.execute(select(SiteSettings).where(SiteSettings.site == site))
-        site_settings = settings_res.scalar_one_or_none()
-        
-        if not site_settings or not site_settings.api_key or site_settings.api_key_status != 'valid':
-            print("Hata: Geçerli API Key bulunamadı")
-            raise HTTPException(status_code=400, detail="No valid API key found for this site")
-        
-        api_key = site_settings.api_key  # Veritabanından API key'i al
+        # 3. Site ayarlarından API Key'i al
+        api_key = await get_site_api_key(db, site, user.user_id)
         print(f"Kullanılan API Key: {api_key[:10]}...")
         
-        # 6. PageSpeed Insights API'sini kullanarak Lighthouse verilerini al
-        ps_api_url = f"https://www.googleapis.com/pagespeedonline/v5/runPagespeed?url={decoded_url}&key={api_key}&category=performance&category=seo&category=accessibility&category=best-practices"
+        # 4. Lighthouse sonucunu önbellekten al (yoksa PageSpeed Insights API'sini çağır)
+        lighthouse_result, cache_status = await lighthouse_cache.get(decoded_url, api_key, strategy)
+        print(f"Lighthouse sonucu alındı (önbellek: {cache_status})")
         
-        print(f"Lighthouse API URL: {ps_api_url}")
+        # 5. Yanıtı hazırla (view=compact her audit'i bir kez gönderir)
+        if view == "compact":
+            fields = [f.strip() for f in (fields or "").split(",") if f.strip()]
+            content = build_compact_response(lighthouse_result, fields)
+        else:
+            content = build_full_response(lighthouse_result)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:  # Zaman aşımını 30 saniyeye ayarla
-            response = await client.get(ps_api_url)
-            print(f"Lighthouse API yanıt durumu: {response.status_code}")
-            
-            if response.status_code != 200:
-                print(f"Lighthouse API hatası: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=f"Lighthouse API error: {response.text}")
-            
-            data = response.json()
-            print("Lighthouse API yanıtı başarıyla alındı")
-            
-            # Lighthouse sonuçlarını işle
-            if "lighthouseResult" not in data:
-                print("Hata: Yanıtta lighthouseResult anahtarı bulunamadı")
-                raise HTTPException(status_code=500, detail="Invalid Lighthouse API response format")
-            
-            lighthouse_result = data["lighthouseResult"]
-            
-            if "categories" not in lighthouse_result:
-                print("Hata: Yanıtta categories anahtarı bulunamadı")
-                raise HTTPException(status_code=500, detail="Invalid Lighthouse API response format")
-            
-            categories = lighthouse_result["categories"]
-            
-            return {
-                "performance": {
-                    "score": categories["performance"]["score"],
-                    "audits": lighthouse_result["audits"]
-                },
-                "seo": {
-                    "score": categories["seo"]["score"],
-                    "audits": lighthouse_result["audits"]
-                },
-                "accessibility": {
-                    "score": categories["accessibility"]["score"],
-                    "audits": lighthouse_result["audits"]
-                },
-                "bestPractices": {
-                    "score": categories["best-practices"]["score"],
-                    "audits": lighthouse_result["audits"]
-                }
-            }
+        # Veri zaten JSON uyumlu; jsonable_encoder'dan geçirmeden döndür
+        return JSONResponse(content=content, headers={"X-Cache": cache_status})
     
+    except HTTPException:
+        raise
+    except LighthouseError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except httpx.TimeoutException:
         print("Hata: Lighthouse API zaman aşımına uğradı")
         raise HTTPException(status_code=504, detail="Lighthouse API request timed out")
@@ -677,6 +633,53 @@ async def get_lighthouse_data(site: str, url: str, request: Request, db: AsyncSe
         print(f"Lighthouse verisi alma hatası: {type(e).__name__} - {e}")
         raise HTTPException(status_code=500, detail=f"Lighthouse analizi yapılamadı: {str(e)}")
 
+#--- Toplu Lighthouse Denetimi ---
+@app.post("/sites/{site}/lighthouse/batch")
+async def start_lighthouse_batch(
+    site: str,
+    request: Request,
+    limit: int = 20,
+    strategy: str = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Sitenin Search Console'daki en çok tıklanan `limit` sayfası için
+    arka planda toplu Lighthouse denetimi başlatır.
+    """
+    user_id = user.user_id
+    
+    if limit < 1 or limit > LIGHTHOUSE_BATCH_MAX_PAGES:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {LIGHTHOUSE_BATCH_MAX_PAGES}")
+    
+    creds = await user.credentials()
+    api_key = await get_site_api_key(db, site, user.user_id)
+    
+    try:
+        service = get_service('searchconsole', 'v1', creds)
+        rows = await fetch_top_pages(service, site, limit=limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Sayfaları getirme hatası: {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch pages: {str(e)}")
+    
+    urls = [row["keys"][0] for row in rows]
+    job = await create_lighthouse_batch_job(db, user_id, site, urls, strategy)
+    start_lighthouse_batch_job(async_session, get_site_api_key, job.id)
+    print(f"Toplu Lighthouse işi başlatıldı: {job.id} ({len(urls)} sayfa)")
+    
+    return await lighthouse_batch_job_to_dict(db, job)
+
+@app.get("/sites/{site}/lighthouse/batch/{job_id}")
+async def get_lighthouse_batch(site: str, job_id: str, request: Request, offset: int = 0, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Toplu denetimin durumunu ve `offset`ten sonra biten sonuçları döndürür"""
+    job = await get_lighthouse_batch_job(db, job_id, user.user_id, site)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    
+    return await lighthouse_batch_job_to_dict(db, job, offset)
+
 @app.get("/sites/{site}/page-analysis")
 async def analyze_page(site: str, url: str, request: Request, db: AsyncSession = Depends(get_db)):
     # Kimlik doğrulama ve Google API entegrasyonu kodları...
@@ -739,23 +742,12 @@ async def analyze_page(site: str, url: str, request: Request, db: AsyncSession =
     }
 
 @app.get("/sites/{site}/settings")
-async def get_site_settings(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_site_settings(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     print(f"=== Site ayarları endpoint'ine istek geldi: {site} ===")
 
-    jwt_token = request.cookies.get("token")
-    if not jwt_token:
-        raise HTTPException(status_code=401, detail="Not logged in")
-
-    try:
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-    except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
     try:
-        # Önce sites tablosunda kayıt var mı?
-        site_result = await db.execute(select(Site).where(Site.site_url == site))
-        site_record = site_result.scalar_one_or_none()
+        # Önce sites tablosunda kullanıcının kaydı var mı?
+        site_record = await resolve_site(db, site, user.user_id)
 
         if not site_record:
             return {
@@ -764,12 +756,9 @@ async def get_site_settings(site: str, request: Request, db: AsyncSession = Depe
                 "lastTested": None
             }
 
-        # Şimdi SiteSettings var mı?
         # Şimdi SiteSettings var mı?
         settings_result = await db.execute(
-            select(SiteSettings)
-            .join(Site)
-            .where(Site.site_url == site)
+            select(SiteSettings).where(SiteSettings.site_id == site_record.id)
         )
         settings = settings_result.scalar_one_or_none()
 
@@ -791,26 +780,27 @@ async def get_site_settings(site: str, request: Request, db: AsyncSession = Depe
         print(f"Site ayarları hatası: {e}")
         raise HTTPException(status_code=500, detail=f"Ayarlar alınamadı: {str(e)}")
 
+async def get_site_api_key(db: AsyncSession, site: str, user_id: int):
+    """Kullanıcının sitesi için kayıtlı ve geçerli PageSpeed API key'ini döndürür"""
+    settings_res = await db.execute(
+        select(SiteSettings)
+        .join(Site)
+        .where(Site.site_host == site_host(site), Site.user_id == user_id)
+    )
+    site_settings = settings_res.scalar_one_or_none()
+    
+    if not site_settings or not site_settings.api_key or site_settings.api_key_status != 'valid':
+        print("Hata: Geçerli API Key bulunamadı")
+        raise HTTPException(status_code=400, detail="No valid API key found for this site")
+    
+    return site_settings.api_key
+
 #---API Key'i Kaydeden Endpoint---
 @app.post("/sites/{site}/settings/api-key")
-async def save_api_key(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def save_api_key(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     print(f"=== API Key kaydetme endpoint'ine istek geldi: {site} ===")
     
     try:
-        # Kimlik doğrulama kodları
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Token bulunamadı")
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-            print(f"Token doğrulandı, user_id: {user_id}")
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            print(f"Token doğrulama hatası: {e}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # İstek gövdesini al
         try:
             data = await request.json()
@@ -820,9 +810,13 @@ async def save_api_key(site: str, request: Request, db: AsyncSession = Depends(g
             print(f"İstek gövdesi okuma hatası: {e}")
             raise HTTPException(status_code=400, detail="Invalid request body")
         
+        site_record = await resolve_site(db, site, user.user_id)
+        if not site_record:
+            raise HTTPException(status_code=404, detail="Site not found")
+        
         # Veritabanında site ayarlarını güncelle veya oluştur
         try:
-            res = await db.execute(select(SiteSettings).where(SiteSettings.site == site))
+            res = await db.execute(select(SiteSettings).where(SiteSettings.site_id == site_record.id))
             settings = res.scalar_one_or_none()
             
             if settings:
@@ -833,7 +827,7 @@ async def save_api_key(site: str, request: Request, db: AsyncSession = Depends(g
             else:
                 print("Yeni ayarlar oluşturuluyor")
                 settings = SiteSettings(
-                    site=site,
+                    site_id=site_record.id,
                     api_key=api_key,
                     api_key_status="valid" if api_key else "not_set",
                     created_at=datetime.datetime.now(),
@@ -863,24 +857,10 @@ async def save_api_key(site: str, request: Request, db: AsyncSession = Depends(g
 
 #---API Key'i Test Eden Endpoint---
 @app.post("/sites/{site}/settings/test-api-key")
-async def test_api_key(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def test_api_key(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     print(f"=== API Key test endpoint'ine istek geldi: {site} ===")
     
     try:
-        # Kimlik doğrulama kodları
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Token bulunamadı")
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-            print(f"Token doğrulandı, user_id: {user_id}")
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            print(f"Token doğrulama hatası: {e}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # İstek gövdesini al
         try:
             data = await request.json()
@@ -899,15 +879,15 @@ async def test_api_key(site: str, request: Request, db: AsyncSession = Depends(g
             test_url = "https://example.com"
             ps_api_url = f"https://www.googleapis.com/pagespeedonline/v5/runPagespeed?url={test_url}&key={api_key}"
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(ps_api_url)
-                
-                if response.status_code == 200:
-                    print("API Key testi başarılı")
-                    return {"success": True, "message": "API key geçerli ve çalışıyor"}
-                else:
-                    print(f"API Key testi başarısız: {response.status_code}")
-                    return {"success": False, "message": f"API key geçersiz: {response.status_code}"}
+            client = get_http_client()
+            response = await client.get(ps_api_url)
+            
+            if response.status_code == 200:
+                print("API Key testi başarılı")
+                return {"success": True, "message": "API key geçerli ve çalışıyor"}
+            else:
+                print(f"API Key testi başarısız: {response.status_code}")
+                return {"success": False, "message": f"API key geçersiz: {response.status_code}"}
         except Exception as e:
             print(f"API Key test sırasında hata: {e}")
             return {"success": False, "message": f"Test sırasında hata: {str(e)}"}
@@ -919,28 +899,19 @@ async def test_api_key(site: str, request: Request, db: AsyncSession = Depends(g
         print(f"Beklenmedik hata: {type(e).__name__} - {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
+#---API Key'i Kaldıran Endpoint---
 @app.delete("/sites/{site}/settings/api-key")
-async def remove_api_key(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def remove_api_key(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     print(f"=== API Key kaldırma endpoint'ine istek geldi: {site} ===")
     
     try:
-        # Kimlik doğrulama kodları
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Token bulunamadı")
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-            print(f"Token doğrulandı, user_id: {user_id}")
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            print(f"Token doğrulama hatası: {e}")
-            raise HTTPException(status_code=401, detail="Invalid token")
+        site_record = await resolve_site(db, site, user.user_id)
+        if not site_record:
+            raise HTTPException(status_code=404, detail="Site not found")
         
         # Veritabanında site ayarlarını güncelle
         try:
-            res = await db.execute(select(SiteSettings).where(SiteSettings.site == site))
+            res = await db.execute(select(SiteSettings).where(SiteSettings.site_id == site_record.id))
             settings = res.scalar_one_or_none()
             
             if settings:
@@ -966,263 +937,223 @@ async def remove_api_key(site: str, request: Request, db: AsyncSession = Depends
         print(f"Beklenmedik hata: {type(e).__name__} - {e}")
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
-#---API Key'i Kaldıran Endpoint---
-@app.delete("/sites/{site}/settings/api-key")
-async def remove_api_key(site: str, request: Request, db: AsyncSession = Depends(get_db)):
-    # Kimlik doğrulama kodları...
-    
-    try:
-        res = await db.execute(select(SiteSettings).where(SiteSettings.site == site))
-        settings = res.scalar_one_or_none()
-        
-        if settings:
-            settings.api_key = ""
-            settings.api_key_status = "not_set"
-            await db.commit()
-        
-        return {"message": "API key başarıyla kaldırıldı"}
-    except Exception as e:
-        print(f"API key kaldırma hatası: {e}")
-        raise HTTPException(status_code=500, detail=f"API key kaldırılamadı: {str(e)}")
-
 #--- Google Search Console'dan Sayfa Verilerini Getiren Endpoint ---
 @app.get("/sites/{site}/search-console")
-async def get_search_console_data(site: str, url: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_search_console_data(
+    site: str,
+    url: str,
+    request: Request,
+    start_date: date = None,
+    end_date: date = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
     # URL'yi decode et
     from urllib.parse import unquote
     decoded_url = unquote(url)
     
     try:
-        # 1. Kimlik doğrulama kontrolü
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            print("Hata: Token bulunamadı")
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-            print(f"Token doğrulandı, user_id: {user_id}")
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            print(f"Token doğrulama hatası: {e}")
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        # 2. Kullanıcının Google token'ını veritabanından al
-        res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-        token_storage = res.scalar_one_or_none()
-        if not token_storage:
-            print("Hata: Google token bulunamadı")
-            raise HTTPException(status_code=401, detail="No Google token found")
-        
-        # 3. Google Credentials oluştur
-        creds = Credentials(
-            token=token_storage.access_token,
-            refresh_token=token_storage.refresh_token,
-            token_uri=token_storage.token_uri,
-            client_id=token_storage.client_id,
-            client_secret=token_storage.client_secret,
-            scopes=token_storage.scopes.split(","),
-            expiry=token_storage.expiry
+        user_id = user.user_id
+        
+        # 2. Sayfanın verilerini al (varsayılan: son 30 gün, yerel veri varsa oradan)
+        start, end = resolve_date_range(start_date, end_date)
+        rows = await fetch_search_rows(
+            db, user_id, site, start, end, ["page"],
+            filters={"page": decoded_url},
+            limit=10
         )
         
-        # 4. Token yenileme kontrolü
-        if not creds.valid and creds.expired and creds.refresh_token:
-            try:
-                print("Token yenileniyor...")
-                creds.refresh(GoogleRequest())
-                # Veritabanını güncelle
-                token_storage.access_token = creds.token
-                token_storage.expiry = creds.expiry
-                await db.commit()
-                print("Token başarıyla yenilendi")
-            except Exception as e:
-                print(f"Token yenileme hatası: {e}")
-                raise HTTPException(status_code=401, detail="Token refresh failed")
-        
-        # 5. Google Search Console API'sini kullanarak sayfa verilerini al
-        service = build('searchconsole', 'v1', credentials=creds)
-        
-        # Son 30 günün verilerini al
-        end_date = date.today()
-        start_date = end_date - datetime.timedelta(days=30)
-        
-        request_body = {
-            "startDate": start_date.strftime("%Y-%m-%d"),
-            "endDate": end_date.strftime("%Y-%m-%d"),
-            "dimensions": ["page"],
-            "dimensionFilterGroups": [{
-                "filters": [{
-                    "dimension": "page",
-                    "operator": "equals",
-                    "expression": decoded_url
-                }]
-            }],
-            "rowLimit": 10
-        }
-        
-        response = service.searchanalytics().query(
-            siteUrl=f"https://{site}/",
-            body=request_body
-        ).execute()
-        
         pageDetails = []
-        if "rows" in response:
-            for row in response["rows"]:
-                pageDetails.append({
-                    "path": row["keys"][0],
-                    "clicks": row["clicks"],
-                    "impressions": row["impressions"],
-                    "ctr": row["ctr"],
-                    "position": row["position"]
-                })
+        for row in rows:
+            pageDetails.append({
+                "path": row["keys"][0],
+                "clicks": row["clicks"],
+                "impressions": row["impressions"],
+                "ctr": row["ctr"],
+                "position": row["position"]
+            })
         
         return {"pageDetails": pageDetails}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Search Console verisi alma hatası: {e}")
         raise HTTPException(status_code=500, detail=f"Search Console verileri alınamadı: {str(e)}")
 
+#--- Search Console Senkronizasyonu ---
+async def get_owned_site(db, site, user_id):
+    """Kullanıcıya ait Site kaydını döndürür, yoksa 404"""
+    site_record = await resolve_site(db, site, user_id)
+    if not site_record:
+        raise HTTPException(status_code=404, detail="Site not found")
+    return site_record
+
+@app.post("/sites/{site}/search-console/sync")
+async def sync_search_console(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """
+    Sitenin Search Console verisini yerel veritabanına arka planda senkronize eder.
+
+    Yalnızca son checkpoint'ten bu yana olan günler (ve Google'ın hâlâ güncellediği
+    son birkaç gün) çekilir.
+    """
+    user_id = user.user_id
+    
+    site_record = await get_owned_site(db, site, user_id)
+    creds = await user.credentials()
+    service = get_service('searchconsole', 'v1', creds)
+    
+    start_gsc_sync(async_session, service, site_record.id, site_record.site_url)
+    state = await get_gsc_sync_state(db, site_record.id)
+    return JSONResponse(gsc_sync_state_to_dict(state, running=True), status_code=202)
+
+@app.get("/sites/{site}/search-console/sync")
+async def get_search_console_sync(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Yerel Search Console verisinin kapsadığı aralığı ve senkronizasyon durumunu döndürür"""
+    user_id = user.user_id
+    
+    site_record = await get_owned_site(db, site, user_id)
+    state = await get_gsc_sync_state(db, site_record.id)
+    return gsc_sync_state_to_dict(state, running=gsc_sync_running(site_record.id))
+
+@app.get("/sites/{site}/search-console/rollup")
+async def get_search_console_rollup(
+    site: str,
+    request: Request,
+    dimensions: str = "query",
+    start_date: date = None,
+    end_date: date = None,
+    top: int = 100,
+    order_by: str = "clicks",
+    percentiles: str = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Search Analytics verisini verilen boyutlara (query, page, country, device, date) göre toplar.
+    
+    Tıklama, gösterim, CTR ve gösterim ağırlıklı pozisyonu; tüm grupların toplamlarını,
+    yüzdeliklerini ve `order_by`a göre ilk `top` grubu döndürür. Yerel veri varsa
+    tek boyutlu sorgular günlük rollup tablosundan okunur.
+    """
+    user_id = user.user_id
+    
+    start, end = resolve_date_range(start_date, end_date)
+    try:
+        dimension_list = parse_rollup_dimensions(dimensions)
+        percentile_list = parse_rollup_percentiles(percentiles)
+        validate_rollup(top, order_by)
+    except RollupError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        site_id = await get_local_search_site(db, site, user_id, start, end)
+        if site_id is not None:
+            result = await query_rollup(db, site_id, start, end, dimension_list, top, order_by, percentile_list)
+        else:
+            rows = await fetch_search_rows(db, user_id, site, start, end, dimension_list)
+            result = summarize_search_rows(rows, dimension_list, top, order_by, percentile_list)
+        return {"startDate": str(start), "endDate": str(end), **result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Search Console rollup hatası: {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to build rollup: {str(e)}")
+
 @app.get("/keyword-analysis")
-async def keyword_analysis(request: Request, db: AsyncSession = Depends(get_db)):
-    jwt_token = request.cookies.get("token")
-    if not jwt_token:
-        raise HTTPException(status_code=401, detail="Not logged in")
-
-    payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-    user_id = int(payload["sub"])
-
-    # fetch Google token
-    res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-    token_storage = res.scalar_one_or_none()
-    if not token_storage:
-        raise HTTPException(status_code=401, detail="No Google token")
-
-    creds = Credentials(
-        token=token_storage.access_token,
-        refresh_token=token_storage.refresh_token,
-        token_uri=token_storage.token_uri,
-        client_id=token_storage.client_id,
-        client_secret=token_storage.client_secret,
-        scopes=token_storage.scopes.split(","),
-        expiry=token_storage.expiry
-    )
+async def keyword_analysis(request: Request, limit: int = 50, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # fetch Google credentials
+    creds = await user.credentials()
 
-    service = build('searchconsole', 'v1', credentials=creds)
+    service = get_service('searchconsole', 'v1', creds)
     end = date.today()
     start = end - datetime.timedelta(days=30)
-    rows = service.searchanalytics().query(
-        siteUrl="https://ilknurdmn.com.tr",
-        body={
+    rows = await fetch_search_analytics(
+        service,
+        "https://ilknurdmn.com.tr",
+        {
             "startDate": str(start),
             "endDate": str(end),
-            "dimensions": ["query"],
-            "rowLimit": 50
-        }
-    ).execute().get("rows", [])
+            "dimensions": ["query"]
+        },
+        limit=limit if limit > 0 else None
+    )
 
     return {"keywords": rows}
 
-@app.get("/sites/{domain}/pdf")
-async def generate_pdf(domain: str, request: Request, db: AsyncSession = Depends(get_db)):
-    # 1. Kimlik doğrulama kontrolü
-    jwt_token = request.cookies.get("token")
-    if not jwt_token:
-        print("Hata: Çerezlerde token bulunamadı")
-        raise HTTPException(status_code=401, detail="Not logged in")
-    
-    try:
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-        print(f"Token doğrulandı, user_id: {user_id}")
-    except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-        print(f"Token doğrulama hatası: {e}")
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    # 2. Kullanıcının Google token'ını veritabanından al
-    res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-    token_storage = res.scalar_one_or_none()
-    if not token_storage:
-        print("Hata: Kullanıcı için Google token'ı bulunamadı")
-        raise HTTPException(status_code=401, detail="No Google token found")
-    
-    # 3. Google Credentials oluştur
-    creds = Credentials(
-        token=token_storage.access_token,
-        refresh_token=token_storage.refresh_token,
-        token_uri=token_storage.token_uri,
-        client_id=token_storage.client_id,
-        client_secret=token_storage.client_secret,
-        scopes=token_storage.scopes.split(","),
-        expiry=token_storage.expiry
+def pdf_file_response(file, size, filename, headers=None):
+    """
+    PDF dosyasını parça parça gönderir.
+
+    PDF belleğe alınmaz; Content-Length ile indirme ilerlemesi gösterilebilir.
+    """
+    return StreamingResponse(
+        iter_pdf_file(file),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size),
+            **(headers or {})
+        }
     )
-    
-    # 4. Token yenileme kontrolü
-    if not creds.valid:
-        if creds.expired and creds.refresh_token:
-            try:
-                print("Token yenileniyor...")
-                creds.refresh(GoogleRequest())
-                # Veritabanını güncelle
-                token_storage.access_token = creds.token
-                token_storage.expiry = creds.expiry
-                await db.commit()
-                print("Token başarıyla yenilendi")
-            except Exception as e:
-                print(f"Token yenileme hatası: {e}")
-                raise HTTPException(status_code=401, detail="Token refresh failed")
-        else:
-            print("Hata: Token geçersiz ve yenilenemez")
-            raise HTTPException(status_code=401, detail="Invalid token and cannot refresh")
 
-    # 5. Google Search Console servisini oluştur
-    try:
-        service = build('searchconsole', 'v1', credentials=creds)
-        print("Google Search Console servisi oluşturuldu")
-    except Exception as e:
-        print(f"Google API servisi oluşturulamadı: {e}")
-        raise HTTPException(status_code=500, detail="Failed to create Google API service")
+async def cached_pdf_response(request, kind, domain, args, filename):
+    """
+    Raporu girdilerinin hash'iyle önbellekten sunar, yoksa oluşturup önbelleğe alır.
+
+    İstemci aynı raporu If-None-Match ile isterse 304 döner.
+    """
+    key = report_key(kind, domain, list(args))
+    etag = etag_for(key)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    cache_status, file, size = await report_cache.get_or_render(
+        key, lambda: render_pdf(kind, domain, *args)
+    )
+    return pdf_file_response(
+        file, size, filename,
+        headers={**cache_headers, "X-Cache": cache_status}
+    )
+
+@app.get("/sites/{domain}/pdf")
+async def generate_pdf(
+    domain: str,
+    request: Request,
+    limit: int = 50,
+    start_date: date = None,
+    end_date: date = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = user.user_id
     
-    # 6. Tarih aralığını belirle (son 30 gün)
-    end = date.today()
-    start = end - datetime.timedelta(days=30)
+    # 2. Tarih aralığını belirle (varsayılan: son 30 gün)
+    start, end = resolve_date_range(start_date, end_date)
     print(f"Tarih aralığı: {start} - {end}")
     
-    # 7. Domain'i tam URL'ye dönüştür
-    # Google API tam URL formatı bekler: https://domain.com/
-    site_url = f"https://{domain}/"
-    print(f"Site URL: {site_url}")
-    
     try:
-        # 8. Anahtar kelime verilerini al
+        # 3. Anahtar kelime verilerini al (yerel veri varsa oradan)
         print("Anahtar kelime verileri çekiliyor...")
-        request_body = {
-            "startDate": str(start),
-            "endDate": str(end),
-            "dimensions": ["query"],
-            "rowLimit": 50,
-            "dataState": "all"  # Tüm verileri dahil et
-        }
-        
-        response = service.searchanalytics().query(
-            siteUrl=site_url,
-            body=request_body
-        ).execute()
-        
-        rows = response.get("rows", [])
+        # PDF tablosu tüm satırları içerdiğinden üst sınır uygulanır
+        row_limit = min(limit, PDF_MAX_KEYWORD_ROWS) if limit > 0 else PDF_MAX_KEYWORD_ROWS
+        rows = await fetch_search_rows(db, user_id, domain, start, end, ["query"], limit=row_limit)
         print(f"Alınan anahtar kelime sayısı: {len(rows)}")
         
-        # 9. PDF oluştur
+        # 4. PDF oluştur
         print("PDF oluşturuluyor...")
-        from pdf_builder import create_seo_pdf
-        pdf_buffer = create_seo_pdf(domain, rows)
-        print("PDF başarıyla oluşturuldu")
-        
-        # 10. PDF dosyasını döndür
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={domain}_seo_raporu.pdf"}
-        )
+        response = await cached_pdf_response(request, "seo", domain, (rows,), f"{domain}_seo_raporu.pdf")
+        print("PDF hazır")
+        
+        # 5. PDF dosyasını döndür
+        return response
     
+    except HTTPException:
+        raise
+    except PdfRenderTimeout as e:
+        print(f"PDF oluşturma zaman aşımı: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"PDF oluşturulurken hata: {type(e).__name__} - {e}")
         raise HTTPException(
@@ -1231,94 +1162,63 @@ async def generate_pdf(domain: str, request: Request, db: AsyncSession = Depends
         )
 
 @app.get("/inspect-url")
-async def inspect_url(url: str, request: Request, db: AsyncSession = Depends(get_db)):
-    # 1. Kimlik doğrulama kontrolü
-    jwt_token = request.cookies.get("token")
-    if not jwt_token:
-        raise HTTPException(status_code=401, detail="Not logged in")
+async def inspect_url(url: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # 1. Kullanıcının Google kimlik bilgilerini al (önbellekte yoksa DB'den)
+    creds = await user.credentials()
     
+    # 2. Google Search Console servisini oluştur
     try:
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-    except (jwt.InvalidTokenError, ValueError, TypeError):
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    # 2. Kullanıcının Google token'ını veritabanından al
-    res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-    token_storage = res.scalar_one_or_none()
-    if not token_storage:
-        raise HTTPException(status_code=401, detail="No Google token found")
-    
-    # 3. Google Credentials oluştur
-    creds = Credentials(
-        token=token_storage.access_token,
-        refresh_token=token_storage.refresh_token,
-        token_uri=token_storage.token_uri,
-        client_id=token_storage.client_id,
-        client_secret=token_storage.client_secret,
-        scopes=token_storage.scopes.split(","),
-        expiry=token_storage.expiry
-    )
-    
-    # 4. Token yenileme kontrolü
-    if not creds.valid and creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(GoogleRequest())
-            # Veritabanını güncelle
-            token_storage.access_token = creds.token
-            token_storage.expiry = creds.expiry
-            await db.commit()
-        except Exception as e:
-            print(f"Token yenileme hatası: {e}")
-            raise HTTPException(status_code=401, detail="Token refresh failed")
-    
-    # 5. Google Search Console servisini oluştur
-    try:
-        service = build('searchconsole', 'v1', credentials=creds)
+        service = get_service('searchconsole', 'v1', creds)
         print("Google Search Console servisi oluşturuldu")
     except Exception as e:
         print(f"Google API servisi oluşturulamadı: {e}")
         raise HTTPException(status_code=500, detail="Failed to create Google API service")
     
-    # 6. URL'yi tam URL'ye dönüştür (eğer http/https yoksa)
+    # 3. URL'yi tam URL'ye dönüştür (eğer http/https yoksa)
     if not url.startswith(('http://', 'https://')):
         url = f"https://{url}"
     
     try:
-        # 7. URL'nin ait olduğu siteyi bul
-        from urllib.parse import urlparse
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc
-        
-        # 8. Kullanıcının sitelerini al
-        sites_response = service.sites().list().execute()
-        user_sites = []
-        
-        if 'siteEntry' in sites_response:
-            for site in sites_response['siteEntry']:
-                if site.get('permissionLevel') in ['siteOwner', 'siteFullUser']:
-                    # Site URL'ini temizle
-                    site_url = site['siteUrl'].replace('https://', '').replace('http://', '').replace('/', '')
-                    user_sites.append(site_url)
-        
-        print(f"Kullanıcının siteleri: {user_sites}")
-        print(f"İncelenen domain: {domain}")
-        
-        # 9. Domain'in kullanıcının sitelerinde olup olmadığını kontrol et
-        if domain not in user_sites:
+        # 4. URL'nin ait olduğu siteyi bul
+        domain = urlparse(url).netloc
+        
+        # 5. URL'yi kapsayan (en özel) doğrulanmış mülkü önbellekteki site indeksinden bul
+        index = await site_permissions.get(user.user_id, creds)
+        property_entry = index.find(url)
+        
+        if property_entry is None:
+            user_sites = [site["siteUrl"] for site in index.verified_sites()]
             raise HTTPException(
                 status_code=403, 
                 detail=f"You do not have permission to inspect URLs for {domain}. Please use one of your verified sites: {', '.join(user_sites)}"
             )
         
-        # 10. URL inceleme isteği
+        # 6. Mülkün günlük inceleme kotasından (toplu işlerle ortak) bir hak ayır
+        await url_inspection.reserve_inspection(async_session, property_entry["siteUrl"])
+        
+        # 7. URL inceleme isteği
         print(f"URL incelemesi yapılıyor: {url}")
-        inspection_result = service.urlInspection().index().inspect(
-            body={
-                "inspectionUrl": url,
-                "siteUrl": f"https://{domain}/"
-            }
-        ).execute()
+        inspection_result = await execute_google_request(
+            service.urlInspection().index().inspect(
+                body={
+                    "inspectionUrl": url,
+                    "siteUrl": property_entry["siteUrl"]
+                }
+            ),
+            "urlInspection.inspect",
+            property_key=property_entry["siteUrl"]
+        )
+        
+        # 8. Sonucu inceleme geçmişine işle (durum değiştiyse snapshot eklenir)
+        try:
+            await record_inspection(
+                db, user.user_id, property_entry["siteUrl"], url,
+                url_inspection.summarize_inspection(inspection_result)
+            )
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            print(f"İnceleme geçmişi kaydedilemedi: {e}")
         
         return inspection_result
     except HTTPException:
@@ -1327,90 +1227,202 @@ async def inspect_url(url: str, request: Request, db: AsyncSession = Depends(get
         print(f"URL incelemesi sırasında hata: {type(e).__name__} - {e}")
         raise HTTPException(status_code=500, detail=f"URL inspection failed: {str(e)}")
 
+#--- Toplu URL İnceleme ---
+async def resolve_inspection_property(user: UserContext, site: str):
+    """Sitenin kullanıcının doğrulanmış Search Console mülkü (siteUrl); yetki yoksa 403"""
+    creds = await user.credentials()
+    index = await site_permissions.get(user.user_id, creds)
+    property_entry = index.find(site)
+    if property_entry is None:
+        raise HTTPException(status_code=403, detail=f"You do not have permission to inspect URLs for {site}")
+    return property_entry["siteUrl"]
+
+@app.post("/sites/{site}/url-inspection/batch", status_code=202)
+async def start_url_inspection_batch(
+    site: str,
+    payload: UrlInspectionBatchPayload,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Doğrulanmış mülk için URL listesinin ya da sitemap'in toplu incelemesini başlatır.
+
+    İlerleme DB'de tutulur; yeniden başlatmada iş kaldığı yerden devam eder.
+    """
+    if not payload.urls and not payload.sitemap:
+        raise HTTPException(status_code=400, detail="Either urls or sitemap is required")
+
+    try:
+        property_url = await resolve_inspection_property(user, site)
+
+        urls = list(payload.urls)
+        if payload.sitemap:
+            urls += await url_inspection.fetch_sitemap_urls(property_url, payload.sitemap)
+        urls, rejected = url_inspection.prepare_urls(property_url, urls)
+        if not urls:
+            raise HTTPException(status_code=400, detail="No URLs belong to the inspected property")
+
+        job = await url_inspection.create_job(db, user.user_id, property_url, urls)
+        url_inspection.start_job(async_session, credential_store.get, job.id)
+        print(f"Toplu URL inceleme işi başlatıldı: {job.id} ({len(urls)} URL, {rejected} kapsam dışı)")
+
+        return {**url_inspection.job_to_dict(job), "rejected": rejected}
+    except HTTPException:
+        raise
+    except InspectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Toplu URL inceleme başlatılamadı: {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"URL inspection batch failed: {str(e)}")
+
+@app.get("/sites/{site}/url-inspection/batch/{job_id}")
+async def get_url_inspection_batch(
+    site: str,
+    job_id: int,
+    offset: int = 0,
+    stream: bool = False,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    İşin durumunu ve bitiş sırası `offset`ten sonra gelen sonuçları döndürür.
+
+    stream=true ise sonuçlar iş bitene kadar geldikçe NDJSON olarak gönderilir.
+    """
+    property_url = await resolve_inspection_property(user, site)
+    job = await url_inspection.get_job(db, job_id, user.user_id)
+    if job is None or job.property_url != property_url:
+        raise HTTPException(status_code=404, detail="Inspection job not found")
+
+    if stream:
+        return StreamingResponse(
+            ndjson_rows(url_inspection.job_to_dict(job), url_inspection.iter_results(async_session, job_id, offset)),
+            media_type="application/x-ndjson"
+        )
+
+    results = await url_inspection.list_results(db, job_id, offset)
+    return {**url_inspection.job_to_dict(job), "results": results}
+
+@app.delete("/sites/{site}/url-inspection/batch/{job_id}")
+async def cancel_url_inspection_batch(
+    site: str,
+    job_id: int,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Devam eden incelemeyi iptal eder; bitmiş sonuçlar saklanır"""
+    property_url = await resolve_inspection_property(user, site)
+    job = await url_inspection.get_job(db, job_id, user.user_id)
+    if job is None or job.property_url != property_url:
+        raise HTTPException(status_code=404, detail="Inspection job not found")
+
+    await url_inspection.cancel_job(async_session, job_id)
+    await db.refresh(job)
+    return url_inspection.job_to_dict(job)
+
+@app.get("/sites/{site}/url-inspection/history")
+async def get_url_inspection_history(
+    site: str,
+    url: str,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """URL'nin son inceleme durumu ve kapsam/canonical/tarama zamanı değişiklikleri"""
+    property_url = await resolve_inspection_property(user, site)
+
+    history = await get_inspection_history(db, property_url, url)
+    if history is None:
+        raise HTTPException(status_code=404, detail="URL has not been inspected")
+    return history
+
+@app.post("/sites/{site}/url-inspection/reinspect")
+async def reinspect_urls(
+    site: str,
+    limit: int = None,
+    dry_run: bool = False,
+    user: UserContext = Depends(get_current_user)
+):
+    """
+    Sonucu eskiyen ya da gösterimleri belirgin değişen URL'leri yeniden inceler.
+
+    dry_run=true ise iş açılmaz, seçilecek URL'ler döner.
+    """
+    try:
+        property_url = await resolve_inspection_property(user, site)
+
+        return await url_inspection.schedule_reinspection(
+            async_session, credential_store.get, user.user_id, property_url,
+            limit=limit, dry_run=dry_run
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Yeniden inceleme başlatılamadı: {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Re-inspection failed: {str(e)}")
+
+async def ndjson_rows(first_row, rows):
+    """Async generator satırlarını NDJSON satırlarına çevirir"""
+    if first_row is None:
+        return
+    yield json.dumps(first_row, ensure_ascii=False) + "\n"
+    async for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
 @app.get("/sites/{domain}/keywords")
 async def get_keywords(
     domain: str, 
     request: Request, 
+    limit: int = 50,
+    stream: bool = False,
+    start_date: date = None,
+    end_date: date = None,
+    user: UserContext = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # 1. Kimlik doğrulama kontrolü
-    jwt_token = request.cookies.get("token")
-    if not jwt_token:
-        raise HTTPException(status_code=401, detail="Not logged in")
-    
-    try:
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-    except (jwt.InvalidTokenError, ValueError, TypeError):
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    # 2. Kullanıcının Google token'ını veritabanından al
-    res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-    token_storage = res.scalar_one_or_none()
-    if not token_storage:
-        raise HTTPException(status_code=401, detail="No Google token found")
-    
-    # 3. Google Credentials oluştur
-    creds = Credentials(
-        token=token_storage.access_token,
-        refresh_token=token_storage.refresh_token,
-        token_uri=token_storage.token_uri,
-        client_id=token_storage.client_id,
-        client_secret=token_storage.client_secret,
-        scopes=token_storage.scopes.split(","),
-        expiry=token_storage.expiry
-    )
-    
-    # 4. Token yenileme kontrolü
-    if not creds.valid and creds.expired and creds.refresh_token:
-        try:
-            creds.refresh(GoogleRequest())
-            # Veritabanını güncelle
-            token_storage.access_token = creds.token
-            token_storage.expiry = creds.expiry
-            await db.commit()
-        except Exception as e:
-            print(f"Token yenileme hatası: {e}")
-            raise HTTPException(status_code=401, detail="Token refresh failed")
-    
-    # 5. Google Search Console servisini oluştur
-    try:
-        service = build('searchconsole', 'v1', credentials=creds)
-    except Exception as e:
-        print(f"Google API servisi oluşturulamadı: {e}")
-        raise HTTPException(status_code=500, detail="Failed to create Google API service")
+    """
+    Anahtar kelimeleri döndürür (varsayılan: son 30 gün).
     
-    # 6. Tarih aralığını belirle (son 30 gün)
-    end = date.today()
-    start = end - datetime.timedelta(days=30)
+    Senkronize edilmiş yerel veri aralığı kapsıyorsa veritabanından okunur.
+    limit<=0 ise tüm satırlar çekilir. stream=true ise satırlar geldikçe NDJSON
+    (satır başına bir JSON) olarak gönderilir; bellek kullanımı sabit kalır.
+    """
+    user_id = user.user_id
     
-    # 7. Domain'i tam URL'ye dönüştür
-    # Google API tam URL formatı bekler: https://domain.com/
-    site_url = f"https://{domain}/"
+    # 2. Tarih aralığını belirle
+    start, end = resolve_date_range(start_date, end_date)
     
-    # 8. Anahtar kelime verilerini al
+    # 3. Anahtar kelime verilerini al
     try:
-        print(f"Anahtar kelimeler alınıyor: {site_url}")
-        request_body = {
-            "startDate": str(start),
-            "endDate": str(end),
-            "dimensions": ["query"],
-            "rowLimit": 50,
-            "dataState": "all"  # Tüm verileri dahil et
-        }
+        # Varsayılan parametrelerle gece hesaplanmış liste varsa onu döndür
+        if not stream and limit == DASHBOARD_KEYWORD_LIMIT and start_date is None and end_date is None:
+            snapshot = await get_fresh_snapshot(db, user_id, domain, "keywords")
+            if snapshot is not None:
+                return {"keywords": snapshot["keywords"]}
+        
+        print(f"Anahtar kelimeler alınıyor: {domain}")
+        rows = await open_search_rows(
+            db, user_id, domain, start, end, ["query"],
+            limit=limit if limit > 0 else None
+        )
         
-        response = service.searchanalytics().query(
-            siteUrl=site_url,
-            body=request_body
-        ).execute()
+        # 4. Satırları akış halinde gönder
+        if stream:
+            # İlk sayfayı yanıt başlamadan çek; API hataları HTTP durum koduyla dönebilsin
+            first_row = await anext(rows, None)
+            return StreamingResponse(
+                ndjson_rows(first_row, rows),
+                media_type="application/x-ndjson"
+            )
         
-        # 9. Yanıtı işle
-        rows = response.get("rows", [])
+        # 5. Yanıtı işle
+        rows = [row async for row in rows]
         print(f"Alınan anahtar kelime sayısı: {len(rows)}")
         
-        # 10. Verileri döndür
+        # 6. Verileri döndür
         return {"keywords": rows}
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Anahtar kelime verileri alınırken hata: {type(e).__name__} - {e}")
         raise HTTPException(
@@ -1418,8 +1430,51 @@ async def get_keywords(
             detail=f"Failed to fetch keyword data: {str(e)}"
         )
 
+@app.get("/sites/{domain}/keywords/summary")
+async def get_keywords_summary(
+    domain: str,
+    request: Request,
+    top: int = 10,
+    limit: int = 0,
+    start_date: date = None,
+    end_date: date = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Anahtar kelimelerin toplamlarını, performans dağılımını, en iyi `top` listelerini
+    ve önerileri döndürür (PDF raporuyla aynı hesaplamalar).
+    
+    limit<=0 ise tüm anahtar kelimeler hesaba katılır.
+    """
+    user_id = user.user_id
+    
+    start, end = resolve_date_range(start_date, end_date)
+    
+    try:
+        if top == DASHBOARD_KEYWORD_TOP and limit <= 0 and start_date is None and end_date is None:
+            snapshot = await get_fresh_snapshot(db, user_id, domain, "keywords")
+            if snapshot is not None:
+                return snapshot["summary"]
+        
+        rows = await fetch_search_rows(
+            db, user_id, domain, start, end, ["query"],
+            limit=limit if limit > 0 else None
+        )
+        frame = KeywordFrame.from_rows(rows)
+        return {
+            "startDate": str(start),
+            "endDate": str(end),
+            **frame.summary(top=max(top, 0))
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Anahtar kelime özeti alınırken hata: {type(e).__name__} - {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to summarize keywords: {str(e)}")
+
 @app.post("/sites/{site}/generate-keyword-pdf")
-async def generate_keyword_pdf(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def generate_keyword_pdf(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Anahtar kelime analizi PDF raporu oluşturur.
     
@@ -1432,38 +1487,27 @@ async def generate_keyword_pdf(site: str, request: Request, db: AsyncSession = D
         Response: PDF dosyası
     """
     try:
-        # Kimlik doğrulama kontrolü
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # İstek gövdesini al
         data = await request.json()
         keywords_data = data.get("keywordsData", [])
         
         # PDF oluştur
-        from pdf_builder import create_seo_pdf
-        pdf_buffer = create_seo_pdf(site, keywords_data)
-        
-        # PDF'i yanıt olarak döndür
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={site}_anahtar_kelime_raporu.pdf"}
+        # PDF'i yanıt olarak döndür (aynı girdiler için önbellekten)
+        return await cached_pdf_response(
+            request, "seo", site, (keywords_data,), f"{site}_anahtar_kelime_raporu.pdf"
         )
     
+    except HTTPException:
+        raise
+    except PdfRenderTimeout as e:
+        print(f"PDF oluşturma zaman aşımı: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"PDF oluşturma hatası: {e}")
         raise HTTPException(status_code=500, detail=f"PDF oluşturulamadı: {str(e)}")
 
 @app.post("/sites/{site}/generate-page-analysis-pdf")
-async def generate_page_analysis_pdf(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def generate_page_analysis_pdf(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Sayfa analizi PDF raporu oluşturur.
     
@@ -1476,33 +1520,22 @@ async def generate_page_analysis_pdf(site: str, request: Request, db: AsyncSessi
         Response: PDF dosyası
     """
     try:
-        # Kimlik doğrulama kontrolü
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
         # İstek gövdesini al
         data = await request.json()
         selected_page = data.get("selectedPage", "")
         page_data = data.get("pageData", {})
         
         # PDF oluştur
-        from pdf_builder import create_page_analysis_pdf
-        pdf_buffer = create_page_analysis_pdf(site, page_data, selected_page)
-        
-        # PDF'i yanıt olarak döndür
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={site}_sayfa_analizi_raporu.pdf"}
+        # PDF'i yanıt olarak döndür (aynı girdiler için önbellekten)
+        return await cached_pdf_response(
+            request, "page_analysis", site, (page_data, selected_page), f"{site}_sayfa_analizi_raporu.pdf"
         )
     
+    except HTTPException:
+        raise
+    except PdfRenderTimeout as e:
+        print(f"PDF oluşturma zaman aşımı: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         print(f"PDF oluşturma hatası: {e}")
         raise HTTPException(status_code=500, detail=f"PDF oluşturulamadı: {str(e)}")
@@ -1519,10 +1552,7 @@ async def add_site(site_data: dict, db: AsyncSession = Depends(get_db)):
         clean_site = site_url.replace("https://", "").replace("http://", "").rstrip("/")
         
         # Site var mı
-        site_result = await db.execute(
-            select(Site).where(Site.site_url == clean_site)
-        )
-        site_record = site_result.scalar_one_or_none()
+        site_record = await resolve_site(db, clean_site)
         
         if not site_record:
             site_record = Site(site_url=clean_site)
@@ -1537,21 +1567,10 @@ async def add_site(site_data: dict, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 #--- Google Analytics Property ID'sini Kaydeden Endpoint ---
-def normalize_site_url(url):
-    """Site URL'sini standart hale getirir (protokolü ve sonundaki slaşı kaldırır)"""
-    url = url.replace("https://", "").replace("http://", "").rstrip("/")
-    return url
-
 @app.post("/sites/{site}/save-analytics-property")
-async def save_analytics_property(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def save_analytics_property(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     try:
-        # Kimlik doğrulama
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
+        user_id = user.user_id
         
         data = await request.json()
         property_id = data.get("propertyId", "")
@@ -1563,26 +1582,16 @@ async def save_analytics_property(site: str, request: Request, db: AsyncSession
         # Site URL'sini standart hale getir
         normalized_site = normalize_site_url(site)
         
-        # Site var mı kontrol et, yoksa oluştur
-        site_result = await db.execute(
-            select(Site).where(Site.site_url == normalized_site)
-        )
-        site_record = site_result.scalar_one_or_none()
+        # Site var mı kontrol et (farklı formatta kaydedilmiş olsa da aynı host), yoksa oluştur
+        site_record = await resolve_site(db, normalized_site)
         
+        if site_record and site_record.user_id != user_id:
+            raise HTTPException(status_code=403, detail="Site belongs to another user")
         if not site_record:
-            # Önce bu site için bir kayıt var mı diye kontrol et (farklı formatta olabilir)
-            existing_site = await db.execute(
-                select(Site).where(Site.site_url.ilike(f"%{normalized_site}%"))
-            )
-            existing_site = existing_site.scalar_one_or_none()
-            
-            if existing_site:
-                site_record = existing_site
-            else:
-                site_record = Site(site_url=normalized_site, user_id=user_id)
-                db.add(site_record)
-                await db.commit()
-                await db.refresh(site_record)
+            site_record = Site(site_url=normalized_site, user_id=user_id)
+            db.add(site_record)
+            await db.commit()
+            await db.refresh(site_record)
         
         # Analytics property kaydet
         analytics_record = await db.execute(
@@ -1626,35 +1635,14 @@ async def save_analytics_property(site: str, request: Request, db: AsyncSession
 
 #--- Google Analytics Property ID'sini Getiren Endpoint ---
 @app.get("/sites/{site}/analytics-property")
-async def get_analytics_property(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_analytics_property(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Belirtilen site için analytics property bilgilerini döndürür"""
     try:
-        # Kimlik doğrulama
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-        
-        # Site URL'sini standart hale getir
-        normalized_site = normalize_site_url(site)
-        
-        # Siteyi veritabanından al
-        site_result = await db.execute(
-            select(Site).where(Site.site_url == normalized_site)
-        )
-        site_record = site_result.scalar_one_or_none()
+        # Kullanıcının sitesini veritabanından al (farklı formatta kayıtlı olsa da aynı host)
+        site_record = await resolve_site(db, site, user.user_id)
         
         if not site_record:
-            # Farklı formatta kayıtlı olabilir
-            site_result = await db.execute(
-                select(Site).where(Site.site_url.ilike(f"%{normalized_site}%"))
-            )
-            site_record = site_result.scalar_one_or_none()
-            
-            if not site_record:
-                return {"success": False, "message": "Site not found"}
+            return {"success": False, "message": "Site not found"}
         
         # Analytics property bilgilerini getir
         analytics_result = await db.execute(
@@ -1680,42 +1668,83 @@ async def get_analytics_property(site: str, request: Request, db: AsyncSession =
         print(f"Analytics property getirme hatası: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Kullanıcı site listesinde istenebilecek alanlar
+USER_SITE_FIELDS = ("site_url", "created_at", "analytics_property")
+DEFAULT_USER_SITE_FIELDS = ("site_url", "analytics_property")
+
 @app.get("/user/sites")
-async def get_user_sites(request: Request, db: AsyncSession = Depends(get_db)):
-    """Kullanıcının tüm sitelerini ve analytics property bilgilerini döndürür"""
+async def get_user_sites(
+    request: Request,
+    response: Response,
+    limit: int = 0,
+    offset: int = 0,
+    fields: str = None,
+    user: UserContext = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Kullanıcının sitelerini ve analytics property bilgilerini döndürür.
+
+    Siteler ve property'ler tek bir LEFT JOIN sorgusuyla okunur; site sayısından
+    bağımsız olarak tek veritabanı turu yapılır.
+
+    Args:
+        limit (int): Döndürülecek en fazla site sayısı (0 = tümü)
+        offset (int): Atlanacak site sayısı
+        fields (str, optional): Virgülle ayrılmış alanlar (site_url, created_at, analytics_property)
+    """
     try:
-        # Kimlik doğrulama
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-        user_id = int(payload["sub"])
-        
-        # Kullanıcının sitelerini getir
-        sites = await db.execute(
-            select(Site).where(Site.user_id == user_id)
-        )
-        sites = sites.scalars().all()
-        
+        user_id = user.user_id
+
+        if limit < 0 or offset < 0:
+            raise HTTPException(status_code=400, detail="limit and offset must be non-negative")
+
+        selected = DEFAULT_USER_SITE_FIELDS
+        if fields:
+            selected = [name.strip() for name in fields.split(",") if name.strip()]
+            invalid = [name for name in selected if name not in USER_SITE_FIELDS]
+            if invalid:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(invalid)}")
+
+        # Sadece istenen sütunlar seçilir; property gerekmiyorsa JOIN yapılmaz
+        columns = [Site.site_url, Site.created_at]
+        with_property = "analytics_property" in selected
+        if with_property:
+            columns += [
+                GoogleAnalyticsProperty.id.label("property_pk"),
+                GoogleAnalyticsProperty.property_id,
+                GoogleAnalyticsProperty.measurement_id,
+                GoogleAnalyticsProperty.is_active
+            ]
+        stmt = select(*columns).where(Site.user_id == user_id).order_by(Site.id)
+        if with_property:
+            stmt = stmt.outerjoin(Site.analytics_property)
+        if limit:
+            stmt = stmt.limit(limit)
+        if offset:
+            stmt = stmt.offset(offset)
+
+        rows = (await db.execute(stmt)).all()
+
+        # Sayfalama istendiğinde toplam site sayısı başlıkta döner
+        if limit or offset:
+            total = await db.scalar(select(func.count(Site.id)).where(Site.user_id == user_id))
+            response.headers["X-Total-Count"] = str(total)
+
         result = []
-        for site in sites:
-            # Her site için analytics property bilgilerini getir
-            analytics = await db.execute(
-                select(GoogleAnalyticsProperty).where(
-                    GoogleAnalyticsProperty.site_id == site.id
-                )
-            )
-            analytics = analytics.scalar_one_or_none()
-            
-            result.append({
-                "site_url": site.site_url,
-                "analytics_property": {
-                    "property_id": analytics.property_id if analytics else None,
-                    "measurement_id": analytics.measurement_id if analytics else None,
-                    "is_active": analytics.is_active if analytics else False
-                } if analytics else None
-            })
+        for row in rows:
+            item = {}
+            if "site_url" in selected:
+                item["site_url"] = row.site_url
+            if "created_at" in selected:
+                item["created_at"] = row.created_at.isoformat() if row.created_at else None
+            if with_property:
+                item["analytics_property"] = {
+                    "property_id": row.property_id,
+                    "measurement_id": row.measurement_id,
+                    "is_active": row.is_active
+                } if row.property_pk is not None else None
+            result.append(item)
         
         return result
         
@@ -1725,10 +1754,31 @@ async def get_user_sites(request: Request, db: AsyncSession = Depends(get_db)):
         print(f"Kullanıcı siteleri getirme hatası: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-
 #--- Trafik Analizi Endpoint'i ---
+async def compute_traffic_analysis(creds, property_id, days):
+    """Son `days` günün GA4 trafik analizini önceki dönemle karşılaştırmalı döndürür"""
+    # Google Analytics 4 API'sini kullan
+    service = get_service('analyticsdata', 'v1beta', creds)
+    
+    end_date = date.today()
+    start_date = end_date - datetime.timedelta(days=days)
+    
+    # Önceki dönem, karşılaştırma için aynı rapora ikinci dateRange olarak eklenir
+    prev_start_date = start_date - datetime.timedelta(days=days)
+    prev_end_date = start_date
+    
+    # Tüm metrikler tek bir batchRunReports çağrısıyla alınır
+    return await fetch_traffic_analysis(
+        service,
+        f"properties/{property_id}",
+        start_date,
+        end_date,
+        prev_start_date,
+        prev_end_date
+    )
+
 @app.get("/sites/{site}/traffic-analysis")
-async def get_traffic_analysis(site: str, request: Request, db: AsyncSession = Depends(get_db)):
+async def get_traffic_analysis(site: str, request: Request, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Belirtilen site için trafik analizi verilerini döndürür.
     
@@ -1741,51 +1791,8 @@ async def get_traffic_analysis(site: str, request: Request, db: AsyncSession = D
         dict: Trafik analizi verileri
     """
     try:
-        # 1. Kimlik doğrulama kontrolü
-        jwt_token = request.cookies.get("token")
-        if not jwt_token:
-            raise HTTPException(status_code=401, detail="Not logged in")
-        
-        try:
-            payload = jwt.decode(jwt_token, SECRET, algorithms=["HS256"])
-            user_id = int(payload["sub"])
-        except (jwt.InvalidTokenError, ValueError, TypeError) as e:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        # 2. Kullanıcının Google token'ını veritabanından al
-        res = await db.execute(select(TokenStorage).where(TokenStorage.user_id == user_id))
-        token_storage = res.scalar_one_or_none()
-        if not token_storage:
-            raise HTTPException(status_code=401, detail="No Google token found")
-        
-        # 3. Google Credentials oluştur
-        creds = Credentials(
-            token=token_storage.access_token,
-            refresh_token=token_storage.refresh_token,
-            token_uri=token_storage.token_uri,
-            client_id=token_storage.client_id,
-            client_secret=token_storage.client_secret,
-            scopes=token_storage.scopes.split(","),
-            expiry=token_storage.expiry
-        )
-        
-        # 4. Token yenileme kontrolü
-        if not creds.valid and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(GoogleRequest())
-                # Veritabanını güncelle
-                token_storage.access_token = creds.token
-                token_storage.expiry = creds.expiry
-                await db.commit()
-            except Exception as e:
-                print(f"Token yenileme hatası: {e}")
-                raise HTTPException(status_code=401, detail="Token refresh failed")
-        
-        # 5. Siteyi ve Google Analytics Property'yi veritabanından al
-        site_result = await db.execute(
-            select(Site).where(Site.site_url.ilike(f"%{site}%"))
-        )
-        site_record = site_result.scalar_one_or_none()
+        # 2. Siteyi ve Google Analytics Property'yi veritabanından al
+        site_record = await resolve_site(db, site, user.user_id)
         
         if not site_record:
             raise HTTPException(status_code=404, detail="Site not found")
@@ -1800,205 +1807,24 @@ async def get_traffic_analysis(site: str, request: Request, db: AsyncSession = D
         if not analytics_record:
             raise HTTPException(status_code=404, detail="Google Analytics property not found")
         
-        # 6. Google Analytics API'sini kullanarak trafik verilerini al
+        # Tarih aralığını al
+        date_range = int(request.query_params.get("days", str(DASHBOARD_TRAFFIC_DAYS)))
+        
+        # Varsayılan aralık için gece hesaplanmış rapor varsa onu döndür
+        if date_range == DASHBOARD_TRAFFIC_DAYS:
+            snapshot = await fresh_snapshot_payload(db, site_record.id, "traffic")
+            if snapshot is not None:
+                return snapshot
+        
+        # 3. Kullanıcının Google kimlik bilgilerini al (önbellekte yoksa DB'den)
+        creds = await user.credentials()
+        
+        # 4. Google Analytics API'sini kullanarak trafik verilerini al
         try:
-            # Google Analytics 4 API'sini kullan
-            service = build('analyticsdata', 'v1beta', credentials=creds)
-            
-            # Tarih aralığını al
-            date_range = int(request.query_params.get("days", "30"))
-            end_date = date.today()
-            start_date = end_date - datetime.timedelta(days=date_range)
-            
-            # Google Analytics property ID'sini kullan
-            property_id = analytics_record.property_id
-            property_path = f"properties/{property_id}"
-            
-            # Toplam kullanıcı sayısını al
-            request_body = {
-                'dateRanges': [{
-                    'startDate': start_date.strftime("%Y-%m-%d"), 
-                    'endDate': end_date.strftime("%Y-%m-%d")
-                }],
-                'metrics': [{'name': 'activeUsers'}]
-            }
-            total_users_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-                        
-            total_users = 0
-            if 'rows' in total_users_request and total_users_request['rows']:
-                total_users = sum(int(row['metricValues'][0]['value']) for row in total_users_request['rows'])
-            
-            # Sayfa görüntüleme sayısını al
-            request_body = {
-                'dateRanges': [{
-                    'startDate': start_date.strftime("%Y-%m-%d"), 
-                    'endDate': end_date.strftime("%Y-%m-%d")
-                }],
-                'metrics': [{'name': 'screenPageViews'}]
-            }
-            pageviews_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-            
-            total_pageviews = 0
-            if 'rows' in pageviews_request and pageviews_request['rows']:
-                total_pageviews = sum(int(row['metricValues'][0]['value']) for row in pageviews_request['rows'])
-            
-            # Oturum süresini al
-            request_body = {
-                'dateRanges': [{
-                    'startDate': start_date.strftime("%Y-%m-%d"), 
-                    'endDate': end_date.strftime("%Y-%m-%d")
-                }],
-                'metrics': [{'name': 'averageSessionDuration'}]
-            }
-            session_duration_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-            
-            avg_session_duration = "00:00"
-            if 'rows' in session_duration_request and session_duration_request['rows']:
-                total_duration = sum(float(row['metricValues'][0]['value']) for row in session_duration_request['rows'])
-                avg_seconds = total_duration / len(session_duration_request['rows'])
-                minutes = int(avg_seconds // 60)
-                seconds = int(avg_seconds % 60)
-                avg_session_duration = f"{minutes:02d}:{seconds:02d}"
-            
-            # Çıkış oranını al
-            request_body = {
-                'dateRanges': [{
-                    'startDate': start_date.strftime("%Y-%m-%d"), 
-                    'endDate': end_date.strftime("%Y-%m-%d")
-                }],
-                'metrics': [{'name': 'bounceRate'}]
-            }
-            bounce_rate_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-            
-            bounce_rate = 0
-            if 'rows' in bounce_rate_request and bounce_rate_request['rows']:
-                total_bounce_rate = sum(float(row['metricValues'][0]['value']) for row in bounce_rate_request['rows'])
-                bounce_rate = (total_bounce_rate / len(bounce_rate_request['rows'])) * 100
-            
-            # En popüler sayfaları al
-            request_body = {
-                'dateRanges': [{
-                    'startDate': start_date.strftime("%Y-%m-%d"), 
-                    'endDate': end_date.strftime("%Y-%m-%d")
-                }],
-                'dimensions': [{'name': 'pagePath'}],
-                'metrics': [{'name': 'screenPageViews'}]
-            }
-            top_pages_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-            
-            top_pages = []
-            if 'rows' in top_pages_request and top_pages_request['rows']:
-                # Sayfa görüntüleme sayısına göre sırala
-                sorted_pages = sorted(
-                    top_pages_request['rows'], 
-                    key=lambda x: int(x['metricValues'][0]['value']), 
-                    reverse=True
-                )
-                
-                total_pageviews_in_top = sum(int(row['metricValues'][0]['value']) for row in sorted_pages)
-                
-                for page in sorted_pages[:5]:  # İlk 5 sayfa
-                    page_path = page['dimensionValues'][0]['value']
-                    page_views = int(page['metricValues'][0]['value'])
-                    percentage = (page_views / total_pageviews_in_top) * 100 if total_pageviews_in_top > 0 else 0
-                    
-                    top_pages.append({
-                        "page": page_path,
-                        "visits": page_views,
-                        "percentage": percentage
-                    })
-            
-            # Trafik kaynaklarını al
-            request_body = {
-                'dateRanges': [{
-                    'startDate': start_date.strftime("%Y-%m-%d"), 
-                    'endDate': end_date.strftime("%Y-%m-%d")
-                }],
-                'dimensions': [{'name': 'sessionDefaultChannelGroup'}],
-                'metrics': [{'name': 'activeUsers'}]
-            }
-            traffic_sources_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-            
-            traffic_sources = []
-            if 'rows' in traffic_sources_request and traffic_sources_request['rows']:
-                total_users_in_sources = sum(int(row['metricValues'][0]['value']) for row in traffic_sources_request['rows'])
-                
-                for source in traffic_sources_request['rows']:
-                    channel = source['dimensionValues'][0]['value']
-                    users = int(source['metricValues'][0]['value'])
-                    percentage = (users / total_users_in_sources) * 100 if total_users_in_sources > 0 else 0
-                    
-                    # Kanal adını Türkçeleştir
-                    channel_name = {
-                        'Organic Search': 'Organik Arama',
-                        'Direct': 'Direkt',
-                        'Social': 'Sosyal Medya',
-                        'Referral': 'Referans',
-                        'Paid Search': 'Ücretli Arama',
-                        'Display': 'Görüntülü Reklam',
-                        'Email': 'E-posta'
-                    }.get(channel, channel)
-                    
-                    traffic_sources.append({
-                        "source": channel_name,
-                        "visits": users,
-                        "percentage": percentage
-                    })
-            
-            # Önceki ayla karşılaştırma için bir önceki ayın verilerini al
-            prev_start_date = start_date - datetime.timedelta(days=date_range)
-            prev_end_date = start_date
-            
-            request_body = {
-                'dateRanges': [{
-                    'startDate': prev_start_date.strftime("%Y-%m-%d"), 
-                    'endDate': prev_end_date.strftime("%Y-%m-%d")
-                }],
-                'metrics': [{'name': 'activeUsers'}]
-            }
-            prev_users_request = service.properties().runReport(
-                property=property_path,
-                body=request_body
-            ).execute()
-            
-            prev_users = 0
-            if 'rows' in prev_users_request and prev_users_request['rows']:
-                prev_users = sum(int(row['metricValues'][0]['value']) for row in prev_users_request['rows'])
-            
-            # Büyüme oranını hesapla
-            monthly_growth = 0
-            if prev_users > 0:
-                monthly_growth = ((total_users - prev_users) / prev_users) * 100
-            
-            return {
-                "totalVisits": total_users,
-                "organicTraffic": int(total_users * 0.7),  # Yaklaşık değer
-                "bounceRate": bounce_rate,
-                "avgSessionDuration": avg_session_duration,
-                "pageViews": total_pageviews,
-                "monthlyGrowth": monthly_growth,
-                "topPages": top_pages,
-                "trafficSources": traffic_sources
-            }
+            return await compute_traffic_analysis(creds, analytics_record.property_id, date_range)
             
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Google Analytics API hatası: {e}")
             raise HTTPException(status_code=500, detail=f"Google Analytics API error: {str(e)}")
@@ -2009,12 +1835,152 @@ async def get_traffic_analysis(site: str, request: Request, db: AsyncSession = D
         print(f"Trafik analizi hatası: {type(e).__name__} - {e}")
         raise HTTPException(status_code=500, detail=f"Traffic analysis failed: {str(e)}")
 
+# ---------- ARKA PLAN ÖN HESAPLAMA ----------
+def precompute_handler(func):
+    """Handler'ın HTTPException'larını iş hatalarına çevirir: 429 dışındaki 4xx'ler tekrar denenmez"""
+    async def run(db, job, site):
+        set_quota_user(job.user_id)
+        try:
+            return await func(db, job, site)
+        except HTTPException as e:
+            if 400 <= e.status_code < 500 and e.status_code != 429:
+                raise PermanentJobError(e.detail)
+            raise RuntimeError(e.detail)
+    return run
+
+@precompute_handler
+async def precompute_keywords(db, job, site):
+    """Varsayılan aralığın anahtar kelime listesi ve özeti"""
+    start, end = resolve_date_range()
+    rows = await fetch_search_rows(db, job.user_id, site.site_host, start, end, ["query"])
+    frame = KeywordFrame.from_rows(rows)
+    payload = {
+        "keywords": rows[:DASHBOARD_KEYWORD_LIMIT],
+        "summary": {
+            "startDate": str(start),
+            "endDate": str(end),
+            **frame.summary(top=DASHBOARD_KEYWORD_TOP)
+        }
+    }
+    return payload, start, end
+
+@precompute_handler
+async def precompute_pages(db, job, site):
+    """Varsayılan aralığın en çok tıklanan sayfaları"""
+    start, end = resolve_date_range()
+    rows = await fetch_search_rows(db, job.user_id, site.site_host, start, end, ["page"], limit=DASHBOARD_PAGE_LIMIT)
+    return {"pages": pages_from_rows(rows)}, start, end
+
+@precompute_handler
+async def precompute_traffic(db, job, site):
+    """Son DASHBOARD_TRAFFIC_DAYS günün GA4 trafik analizi"""
+    analytics_record = (await db.execute(
+        select(GoogleAnalyticsProperty).where(GoogleAnalyticsProperty.site_id == site.id)
+    )).scalar_one_or_none()
+    if analytics_record is None:
+        raise PermanentJobError("Google Analytics property not found")
+    creds = await get_user_credentials(job.user_id, db)
+    payload = await compute_traffic_analysis(creds, analytics_record.property_id, DASHBOARD_TRAFFIC_DAYS)
+    end = date.today()
+    return payload, end - timedelta(days=DASHBOARD_TRAFFIC_DAYS), end
+
+@precompute_handler
+async def precompute_lighthouse(db, job, site):
+    """En çok tıklanan sayfaların Lighthouse skorları (bu süreçteki Lighthouse önbelleğini de ısıtır)"""
+    api_key = await get_site_api_key(db, site.site_host, job.user_id)
+    start, end = resolve_date_range()
+    rows = await fetch_search_rows(db, job.user_id, site.site_host, start, end, ["page"], limit=PRECOMPUTE_LIGHTHOUSE_PAGES)
+    results = await run_lighthouse_audits([row["keys"][0] for row in rows], api_key)
+    if rows and not any(result["status"] == "ok" for result in results):
+        raise RuntimeError(results[0].get("error") or "Lighthouse audits failed")
+    return {"results": results}, None, None
+
+job_scheduler = JobScheduler(async_session, {
+    "keywords": precompute_keywords,
+    "pages": precompute_pages,
+    "traffic": precompute_traffic,
+    "lighthouse": precompute_lighthouse,
+})
+
+@app.get("/sites/{site}/dashboard")
+async def get_dashboard(site: str, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Sitenin gece hesaplanmış pano verileri (tür başına son sonuç ve hesaplanma zamanı)"""
+    site_id = await resolve_site(db, site, user.user_id, columns=[Site.id])
+    if site_id is None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    
+    snapshots = {}
+    for kind in PRECOMPUTE_KINDS:
+        snapshot = await get_dashboard_snapshot(db, site_id, kind)
+        if snapshot is not None:
+            snapshots[kind] = {
+                "computedAt": snapshot.computed_at.isoformat(),
+                "startDate": str(snapshot.start_date) if snapshot.start_date else None,
+                "endDate": str(snapshot.end_date) if snapshot.end_date else None,
+                "data": snapshot.payload
+            }
+    return snapshots
+
+@app.post("/sites/{site}/precompute", status_code=202)
+async def precompute_site(site: str, user: UserContext = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Sitenin pano verilerinin hemen yeniden hesaplanmasını kuyruğa alır"""
+    site_id = await resolve_site(db, site, user.user_id, columns=[Site.id])
+    if site_id is None:
+        raise HTTPException(status_code=404, detail="Site not found")
+    
+    queued = []
+    for _, _, kinds in await precompute_kinds(db, [site_id]):
+        for kind in kinds:
+            if await enqueue_job(db, user.user_id, site_id, kind):
+                queued.append(kind)
+    await db.commit()
+    job_scheduler.notify()
+    return {"queued": queued}
+
+# ---------- METRICS ----------
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Google API thread havuzu, kuyruk, DB havuzu, rapor, oturum, site yetki önbelleği, URL inceleme, Google kota ve arka plan iş metriklerini döndürür (METRICS_TOKEN gerekir)"""
+    require_metrics_token(request)
+    return {
+        "googleApi": get_google_api_stats(),
+        "dbPool": get_pool_stats(engine),
+        "reportCache": report_cache.stats(),
+        "authCache": token_cache.stats(),
+        "sitePermissions": site_permissions.stats(),
+        "urlInspection": url_inspection.stats(),
+        "quota": quota_manager.stats(),
+        "jobs": job_scheduler.stats()
+    }
+
 # ---------- STARTUP ----------
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
+    # Şema migration'larla (python create_tables.py) yönetilir; burada sadece sürüm kontrol edilir
+    await check_schema_version(engine)
+    # Google API servis iskeletlerini bir kez hazırla
+    warm_up_google_services()
+    # Paylaşılan HTTP istemcisini oluştur
+    get_http_client()
+    # PDF worker süreçlerini font ve stiller yüklü halde başlat
+    start_pdf_pool()
+    # Yarıda kalmış toplu URL incelemelerini devral, eskiyen sonuçları periyodik olarak yeniden incele
+    url_inspection.start_background_tasks(async_session, credential_store.get)
+    # Yarıda kalan toplu Lighthouse işlerini devral
+    start_lighthouse_background_tasks(async_session, get_site_api_key)
+    # Gece ön hesaplamalarını ve kuyruğa alınan işleri çalıştır (ayrı worker yoksa)
+    if JOB_WORKER_ENABLED:
+        job_scheduler.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await job_scheduler.stop()
+    await url_inspection.release_jobs(async_session)
+    await release_lighthouse_batch_jobs(async_session)
+    shutdown_google_services()
+    await close_http_client()
+    shutdown_pdf_pool()
+    await engine.dispose()
 
 # ---------- RUN ----------
 if __name__ == "__main__":
@@ -1,11 +1,13 @@
 # models.py
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, func, BigInteger, CheckConstraint, Numeric
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, func, BigInteger, CheckConstraint, Numeric, Date, Float, Index
+from sqlalchemy.orm import relationship, backref, validates
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.dialects.postgresql import UUID, JSONB, INET
 import datetime
 
+import site_utils
+
 Base = declarative_base()
 
 class User(Base):
@@ -53,7 +55,9 @@ class Site(Base):
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     site_url = Column(String(255), unique=True, index=True, nullable=False)
-    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Aramalar için normalize edilmiş host (site_url'den otomatik üretilir)
+    site_host = Column(String(255), unique=True, index=True, nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     created_at = Column(DateTime, default=func.now(), nullable=False)
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
     
@@ -68,6 +72,11 @@ class Site(Base):
     # İlişkiler
     user = relationship("User", back_populates="sites")
     
+    @validates("site_url")
+    def _set_site_host(self, key, value):
+        self.site_host = site_utils.site_host(value)
+        return value
+    
     def __repr__(self):
         return f"<Site(id={self.id}, site_url='{self.site_url}')>"
 
@@ -92,7 +101,7 @@ class GoogleAnalyticsProperty(Base):
     __tablename__ = "google_analytics_properties"
     
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, index=True)
     property_id = Column(String(255), unique=True, nullable=False)  # Örn: "properties/123456789"
     measurement_id = Column(String(50), nullable=True)  # Örn: "G-XXXXXXXXXX"
     is_active = Column(Boolean, default=True, index=True)
@@ -105,6 +114,263 @@ class GoogleAnalyticsProperty(Base):
     def __repr__(self):
         return f"<GoogleAnalyticsProperty(id={self.id}, property_id='{self.property_id}')>"
 
+class SearchAnalyticsRow(Base):
+    """Search Console verisinin günlük (query, page, country, device) satırı"""
+    __tablename__ = "search_analytics_rows"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    query = Column(Text, nullable=False)
+    page = Column(Text, nullable=False)
+    country = Column(String(3), nullable=False)
+    device = Column(String(10), nullable=False)
+    clicks = Column(Integer, nullable=False, default=0)
+    impressions = Column(Integer, nullable=False, default=0)
+    position = Column(Float, nullable=False)  # Gösterim ağırlıklı ortalama için ham değer
+    
+    __table_args__ = (
+        # Tüm okumalar site + tarih aralığıyla başlar
+        Index("ix_search_analytics_rows_site_date", "site_id", "date"),
+    )
+    
+    def __repr__(self):
+        return f"<SearchAnalyticsRow(site_id={self.site_id}, date={self.date}, query='{self.query}')>"
+
+class SearchAnalyticsRollup(Base):
+    """Günlük tek boyutlu toplamlar (dimension='total' ise günün site toplamı, value boş)"""
+    __tablename__ = "search_analytics_rollups"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    dimension = Column(String(10), nullable=False)  # query, page, country, device, total
+    value = Column(Text, nullable=False)
+    clicks = Column(BigInteger, nullable=False, default=0)
+    impressions = Column(BigInteger, nullable=False, default=0)
+    position_sum = Column(Float, nullable=False, default=0)  # sum(position * impressions)
+    
+    __table_args__ = (
+        Index("ix_search_analytics_rollups_site_dimension_date", "site_id", "dimension", "date"),
+    )
+    
+    def __repr__(self):
+        return f"<SearchAnalyticsRollup(site_id={self.site_id}, date={self.date}, dimension='{self.dimension}')>"
+
+class SearchAnalyticsSync(Base):
+    """Site başına Search Console senkronizasyon durumu (checkpoint)"""
+    __tablename__ = "search_analytics_syncs"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False, unique=True)
+    first_date = Column(Date, nullable=True)  # Yerelde bulunan en eski gün
+    last_date = Column(Date, nullable=True)  # Yerelde bulunan en yeni gün
+    status = Column(String(20), default="idle")  # idle, running, failed
+    error = Column(Text, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<SearchAnalyticsSync(site_id={self.site_id}, last_date={self.last_date}, status='{self.status}')>"
+
+class UrlInspectionJob(Base):
+    """Toplu URL inceleme işi (bir Search Console mülkü için)"""
+    __tablename__ = "url_inspection_jobs"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    property_url = Column(String(255), nullable=False)  # Örn: "https://example.com/" ya da "sc-domain:example.com"
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, throttled, completed, failed, cancelled
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    # İşi yürüten süreç ve son canlılık sinyali; sinyal eskiyse başka süreç işi devralır
+    claimed_by = Column(String(64), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<UrlInspectionJob(id={self.id}, property_url='{self.property_url}', status='{self.status}')>"
+
+class UrlInspectionItem(Base):
+    """Toplu inceleme işindeki tek URL; seq bitiş sırasıdır (sonuçlar bu sırayla okunur)"""
+    __tablename__ = "url_inspection_items"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    job_id = Column(BigInteger, ForeignKey("url_inspection_jobs.id", ondelete="CASCADE"), nullable=False)
+    url = Column(Text, nullable=False)
+    status = Column(String(10), nullable=False, default="pending")  # pending, ok, error
+    seq = Column(Integer, nullable=True)
+    result = Column(JSONB, nullable=True)  # Özetlenmiş inspectionResult
+    error = Column(Text, nullable=True)
+    inspected_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Devam ettirme: işin bekleyen URL'leri
+        Index("ix_url_inspection_items_job_status", "job_id", "status"),
+        # Sonuç akışı: işin seq'ten sonraki sonuçları
+        Index("ix_url_inspection_items_job_seq", "job_id", "seq"),
+    )
+    
+    def __repr__(self):
+        return f"<UrlInspectionItem(job_id={self.job_id}, url='{self.url}', status='{self.status}')>"
+
+class UrlInspectionQuotaUsage(Base):
+    """Mülkün kota günündeki inceleme sayısı; tüm süreçler bu sayacı atomik olarak artırır"""
+    __tablename__ = "url_inspection_quota_usage"
+    
+    property_url = Column(String(255), primary_key=True)
+    day_start = Column(DateTime, primary_key=True)  # Kota gününün başlangıcı (naive UTC)
+    used = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<UrlInspectionQuotaUsage(property_url='{self.property_url}', day_start={self.day_start}, used={self.used})>"
+
+class InspectedUrl(Base):
+    """Mülkteki URL'nin son bilinen inceleme durumu (yeniden inceleme seçimi bu tablodan yapılır)"""
+    __tablename__ = "inspected_urls"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    property_url = Column(String(255), nullable=False)
+    url = Column(Text, nullable=False)
+    # Son inceleyen kullanıcı; yeniden incelemeler onun kimlik bilgisiyle yapılır
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    verdict = Column(String(20), nullable=True)
+    coverage_state = Column(String(255), nullable=True)
+    google_canonical = Column(Text, nullable=True)
+    user_canonical = Column(Text, nullable=True)
+    last_crawl_time = Column(DateTime, nullable=True)
+    # Son yeniden inceleme kararındaki sayfa gösterimleri (değişim bu değere göre ölçülür)
+    impressions = Column(BigInteger, nullable=True)
+    checked_at = Column(DateTime, nullable=False)  # Son inceleme
+    changed_at = Column(DateTime, nullable=False)  # Durumun son değiştiği inceleme
+    
+    snapshots = relationship("UrlInspectionSnapshot", backref="inspected_url", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        Index("ix_inspected_urls_property_url", "property_url", "url", unique=True),
+        Index("ix_inspected_urls_property_checked", "property_url", "checked_at"),
+    )
+    
+    def __repr__(self):
+        return f"<InspectedUrl(property_url='{self.property_url}', url='{self.url}', coverage_state='{self.coverage_state}')>"
+
+class UrlInspectionSnapshot(Base):
+    """URL'nin izlenen inceleme alanlarından biri değiştiğinde yazılan durum kaydı"""
+    __tablename__ = "url_inspection_snapshots"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    url_id = Column(BigInteger, ForeignKey("inspected_urls.id", ondelete="CASCADE"), nullable=False)
+    verdict = Column(String(20), nullable=True)
+    coverage_state = Column(String(255), nullable=True)
+    google_canonical = Column(Text, nullable=True)
+    user_canonical = Column(Text, nullable=True)
+    last_crawl_time = Column(DateTime, nullable=True)
+    inspected_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_url_inspection_snapshots_url_inspected", "url_id", "inspected_at"),
+    )
+    
+    def __repr__(self):
+        return f"<UrlInspectionSnapshot(url_id={self.url_id}, coverage_state='{self.coverage_state}', inspected_at={self.inspected_at})>"
+
+class ScheduledJob(Base):
+    """Arka plan iş kuyruğundaki iş (gece ön hesaplamaları vb.); user_id adil sıralamada kiracıdır"""
+    __tablename__ = "scheduled_jobs"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(20), nullable=False)  # keywords, pages, traffic, lighthouse
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    # Aynı planlamanın tekrar kuyruğa girmesini engeller (ör. gece işleri için tarih)
+    run_key = Column(String(40), nullable=True)
+    run_at = Column(DateTime, nullable=False)  # Bu zamandan önce alınmaz (tekrar denemede ileri atılır)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    locked_by = Column(String(64), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Kuyruktan alma: sırası gelmiş işler
+        Index("ix_scheduled_jobs_status_run_at", "status", "run_at"),
+        Index("ix_scheduled_jobs_site_kind_run_key", "site_id", "kind", "run_key", unique=True),
+        # Adil sıralama: kiracının en son başlatılan işi
+        Index("ix_scheduled_jobs_user_locked", "user_id", "locked_at"),
+    )
+    
+    def __repr__(self):
+        return f"<ScheduledJob(id={self.id}, kind='{self.kind}', site_id={self.site_id}, status='{self.status}')>"
+
+class DashboardSnapshot(Base):
+    """Sitenin önceden hesaplanmış pano verisi (tür başına son sonuç)"""
+    __tablename__ = "dashboard_snapshots"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    site_id = Column(BigInteger, ForeignKey("sites.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(20), nullable=False)  # keywords, pages, traffic, lighthouse
+    payload = Column(JSONB, nullable=False)
+    start_date = Column(Date, nullable=True)
+    end_date = Column(Date, nullable=True)
+    computed_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_dashboard_snapshots_site_kind", "site_id", "kind", unique=True),
+    )
+    
+    def __repr__(self):
+        return f"<DashboardSnapshot(site_id={self.site_id}, kind='{self.kind}', computed_at={self.computed_at})>"
+
+class LighthouseBatch(Base):
+    """Toplu Lighthouse denetim işi (bir sitenin en çok tıklanan sayfaları için)"""
+    __tablename__ = "lighthouse_batches"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex; URL'de kullanılır
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    site = Column(String(255), nullable=False)  # İstekteki site (API key bu site üzerinden bulunur)
+    strategy = Column(String(20), nullable=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending, running, completed, failed
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    # İşi yürüten süreç ve son canlılık sinyali; sinyal eskiyse başka süreç işi devralır
+    claimed_by = Column(String(64), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<LighthouseBatch(id='{self.id}', site='{self.site}', status='{self.status}')>"
+
+class LighthouseBatchItem(Base):
+    """Toplu denetimdeki tek sayfa; seq bitiş sırasıdır (sonuçlar bu sırayla okunur)"""
+    __tablename__ = "lighthouse_batch_items"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    job_id = Column(String(32), ForeignKey("lighthouse_batches.id", ondelete="CASCADE"), nullable=False)
+    url = Column(Text, nullable=False)
+    status = Column(String(10), nullable=False, default="pending")  # pending, ok, error
+    seq = Column(Integer, nullable=True)
+    cache = Column(String(10), nullable=True)  # HIT, MISS, STALE
+    scores = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_lighthouse_batch_items_job_status", "job_id", "status"),
+        Index("ix_lighthouse_batch_items_job_seq", "job_id", "seq"),
+    )
+    
+    def __repr__(self):
+        return f"<LighthouseBatchItem(job_id='{self.job_id}', url='{self.url}', status='{self.status}')>"
+
 # PostgreSQL için tablo oluşturma fonksiyonu
 def create_tables(engine):
     """Veritabanı tablolarını oluşturur"""
@@ -13,6 +13,8 @@ from datetime import datetime
 import math
 import os
 
+from keyword_metrics import KeywordFrame, rate_metric, rate_position
+
 # Türkçe karakterleri destekleyen fontu kaydet
 def register_turkish_font():
     try:
@@ -67,31 +69,18 @@ def register_turkish_font():
 # Türkçe fontu kaydet
 turkish_font_name = register_turkish_font()
 
-def create_seo_pdf(domain, keywords_data):
+# Başlık boyutuna göre önceden oluşturulmuş stil setleri
+_report_styles = {}
+
+def get_report_styles(heading_font_size=16):
     """
-    Gelişmiş SEO raporu PDF'i oluşturur.
+    Raporlarda kullanılan Türkçe fontlu stilleri döndürür.
     
-    Args:
-        domain (str): Raporun oluşturulacağı domain
-        keywords_data (list): Anahtar kelime verileri listesi
-        
-    Returns:
-        BytesIO: PDF içeren buffer
+    Stiller her süreçte bir kez oluşturulur ve sonraki raporlarda yeniden kullanılır.
     """
-    buffer = BytesIO()
-    
-    # PDF dokümanı oluştur
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=18,
-        encoding='utf-8'  # <-- ENCODING AYARI
-    )
+    if heading_font_size in _report_styles:
+        return _report_styles[heading_font_size]
     
-    # Stilleri al
     styles = getSampleStyleSheet()
     
     # Türkçe fontlu özel stiller oluştur
@@ -102,19 +91,19 @@ def create_seo_pdf(domain, keywords_data):
         spaceAfter=30,
         textColor=HexColor('#2c3e50'),
         alignment=TA_CENTER,
-        fontName=turkish_font_name  # <-- TÜRKÇE FONT
+        fontName=turkish_font_name
     ))
     
     styles.add(ParagraphStyle(
         name='CustomHeading',
         parent=styles['Heading2'],
-        fontSize=16,
+        fontSize=heading_font_size,
         spaceAfter=12,
         textColor=HexColor('#34495e'),
         borderWidth=1,
         borderColor=HexColor('#3498db'),
         borderPadding=5,
-        fontName=turkish_font_name  # <-- TÜRKÇE FONT
+        fontName=turkish_font_name
     ))
     
     styles.add(ParagraphStyle(
@@ -123,7 +112,7 @@ def create_seo_pdf(domain, keywords_data):
         fontSize=14,
         spaceAfter=10,
         textColor=HexColor('#34495e'),
-        fontName=turkish_font_name  # <-- TÜRKÇE FONT
+        fontName=turkish_font_name
     ))
     
     styles.add(ParagraphStyle(
@@ -132,9 +121,54 @@ def create_seo_pdf(domain, keywords_data):
         fontSize=10,
         spaceAfter=6,
         textColor=HexColor('#2c3e50'),
-        fontName=turkish_font_name  # <-- TÜRKÇE FONT
+        fontName=turkish_font_name
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CustomSmall',
+        parent=styles['Normal'],
+        fontSize=9,
+        spaceAfter=4,
+        textColor=HexColor('#7f8c8d'),
+        fontName=turkish_font_name
     ))
     
+    _report_styles[heading_font_size] = styles
+    return styles
+
+def warm_up():
+    """Font kaydını ve stil setlerini önceden hazırlar (PDF worker süreçleri için)"""
+    get_report_styles(heading_font_size=16)
+    get_report_styles(heading_font_size=18)
+
+def create_seo_pdf(domain, keywords_data, output=None):
+    """
+    Gelişmiş SEO raporu PDF'i oluşturur.
+    
+    Args:
+        domain (str): Raporun oluşturulacağı domain
+        keywords_data (list): Anahtar kelime verileri listesi
+        output (file, optional): PDF'in yazılacağı dosya nesnesi; verilmezse BytesIO kullanılır
+        
+    Returns:
+        BytesIO veya file: PDF içeren buffer (output verildiyse kendisi)
+    """
+    buffer = output if output is not None else BytesIO()
+    
+    # PDF dokümanı oluştur
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=18,
+        encoding='utf-8'  # <-- ENCODING AYARI
+    )
+    
+    # Stilleri al (süreç başına bir kez oluşturulur)
+    styles = get_report_styles(heading_font_size=16)
+    
     # İçerik elemanları listesi
     elements = []
     
@@ -150,11 +184,12 @@ def create_seo_pdf(domain, keywords_data):
     elements.append(Paragraph(f"<b>Rapor Tarihi:</b> {report_date}", styles['CustomSubheading']))
     elements.append(Spacer(1, 20))
     
-    # Hesaplamalar
-    total_clicks = sum(kw.get('clicks', 0) for kw in keywords_data)
-    total_impressions = sum(kw.get('impressions', 0) for kw in keywords_data)
-    avg_ctr = (total_clicks / total_impressions * 100) if total_impressions > 0 else 0
-    avg_position = sum(kw.get('position', 0) for kw in keywords_data) / len(keywords_data) if keywords_data else 0
+    # Hesaplamalar (satırlar bir kez sütun dizilerine yüklenir)
+    frame = KeywordFrame.from_rows(keywords_data)
+    total_clicks = frame.total_clicks
+    total_impressions = frame.total_impressions
+    avg_ctr = frame.ctr_percent
+    avg_position = frame.weighted_position  # Gösterim ağırlıklı
     
     # Özet bölümü
     elements.append(Paragraph("<b>Performans Özeti</b>", styles['CustomHeading']))
@@ -163,10 +198,10 @@ def create_seo_pdf(domain, keywords_data):
     # Özet tablosu
     summary_data = [
         ['Metrik', 'Değer', 'Performans Değerlendirmesi'],
-        ['Toplam Tıklama', str(total_clicks), get_performance_rating(total_clicks, 'clicks')],
-        ['Toplam Gösterim', str(total_impressions), get_performance_rating(total_impressions, 'impressions')],
-        ['Ortalama CTR', f"{avg_ctr:.2f}%", get_performance_rating(avg_ctr, 'ctr')],
-        ['Ortalama Pozisyon', f"{avg_position:.2f}", get_position_rating(avg_position)]
+        ['Toplam Tıklama', str(total_clicks), rate_metric(total_clicks, 'clicks')],
+        ['Toplam Gösterim', str(total_impressions), rate_metric(total_impressions, 'impressions')],
+        ['Ortalama CTR', f"{avg_ctr:.2f}%", rate_metric(avg_ctr, 'ctr')],
+        ['Ortalama Pozisyon', f"{avg_position:.2f}", rate_position(avg_position)]
     ]
     
     summary_table = Table(summary_data, colWidths=[2*inch, 1.5*inch, 2.5*inch])
@@ -191,9 +226,9 @@ def create_seo_pdf(domain, keywords_data):
     elements.append(Spacer(1, 12))
     
     # Anahtar kelime verilerini hazırla
-    if keywords_data:
+    if len(frame):
         # En iyi performanslı 5 anahtar kelimeyi belirle
-        top_keywords = sorted(keywords_data, key=lambda x: x.get('clicks', 0), reverse=True)[:5]
+        top_keywords = [keywords_data[i] for i in frame.top_by('clicks', 5)]
         
         # En iyi performanslı anahtar kelimeler
         elements.append(Paragraph("<b>En İyi Performanslı Anahtar Kelimeler</b>", styles['CustomSubheading']))
@@ -220,16 +255,16 @@ def create_seo_pdf(domain, keywords_data):
         # Tablo verilerini hazırla
         table_data = [['Anahtar Kelime', 'Tıklama', 'Gösterim', 'CTR', 'Pozisyon', 'Performans']]
         
-        for kw in keywords_data:
+        # Performans değerlendirmesi tüm satırlar için tek seferde
+        performance_labels = frame.performance_labels()
+        
+        for kw, performance in zip(keywords_data, performance_labels):
             keys = kw.get('keys', [''])[0]
             clicks = kw.get('clicks', 0)
             impressions = kw.get('impressions', 0)
             ctr = kw.get('ctr', 0) * 100
             position = kw.get('position', 0)
             
-            # Performans değerlendirmesi
-            performance = get_keyword_performance(clicks, impressions, ctr, position)
-            
             table_data.append([
                 keys[:25] if len(keys) > 25 else keys,
                 str(clicks),
@@ -266,7 +301,7 @@ def create_seo_pdf(domain, keywords_data):
     elements.append(Spacer(1, 12))
     
     # Dinamik öneriler oluştur
-    recommendations = generate_recommendations(keywords_data, avg_ctr, avg_position)
+    recommendations = frame.recommendations(avg_ctr, avg_position)
     
     for rec in recommendations:
         elements.append(Paragraph(f"• {rec}", styles['CustomBody']))
@@ -284,121 +319,7 @@ def create_seo_pdf(domain, keywords_data):
     buffer.seek(0)
     return buffer
 
-def get_performance_rating(value, metric_type):
-    """Performans değerlendirmesi için metin döndürür"""
-    if metric_type == 'clicks':
-        if value > 100:
-            return "Mükemmel"
-        elif value > 50:
-            return "İyi"
-        elif value > 20:
-            return "Orta"
-        else:
-            return "Geliştirilebilir"
-    elif metric_type == 'impressions':
-        if value > 1000:
-            return "Mükemmel"
-        elif value > 500:
-            return "İyi"
-        elif value > 200:
-            return "Orta"
-        else:
-            return "Geliştirilebilir"
-    elif metric_type == 'ctr':
-        if value > 5:
-            return "Mükemmel"
-        elif value > 3:
-            return "İyi"
-        elif value > 1:
-            return "Orta"
-        else:
-            return "Geliştirilebilir"
-    return "Belirsiz"
-
-def get_position_rating(position):
-    """Pozisyon değerlendirmesi için metin döndürür"""
-    if position <= 3:
-        return "Mükemmel"
-    elif position <= 10:
-        return "İyi"
-    elif position <= 20:
-        return "Orta"
-    else:
-        return "Geliştirilebilir"
-
-def get_keyword_performance(clicks, impressions, ctr, position):
-    """Anahtar kelime performansını değerlendirir"""
-    # Basit bir puanlama sistemi
-    score = 0
-    
-    # Tıklama puanı
-    if clicks > 50:
-        score += 25
-    elif clicks > 20:
-        score += 15
-    elif clicks > 5:
-        score += 5
-    
-    # CTR puanı
-    if ctr > 5:
-        score += 25
-    elif ctr > 3:
-        score += 15
-    elif ctr > 1:
-        score += 5
-    
-    # Pozisyon puanı
-    if position <= 3:
-        score += 50
-    elif position <= 10:
-        score += 30
-    elif position <= 20:
-        score += 15
-    
-    # Sonucu döndür
-    if score >= 80:
-        return "Mükemmel"
-    elif score >= 60:
-        return "İyi"
-    elif score >= 40:
-        return "Orta"
-    else:
-        return "Geliştirilebilir"
-
-def generate_recommendations(keywords_data, avg_ctr, avg_position):
-    """Dinamik SEO önerileri oluşturur"""
-    recommendations = []
-    
-    # Ortalama CTR düşükse
-    if avg_ctr < 2:
-        recommendations.append("Meta başlıklarınızı ve açıklamalarınızı optimize ederek tıklama oranını (CTR) artırın.")
-    
-    # Ortalama pozisyon düşükse
-    if avg_position > 15:
-        recommendations.append("İçerik kalitenizi artırın ve ilgili anahtar kelimeler için daha optimize edin.")
-    
-    # En az tıklanan anahtar kelimeler için
-    if keywords_data:
-        low_click_keywords = [kw for kw in keywords_data if kw.get('clicks', 0) < 5]
-        if low_click_keywords:
-            recommendations.append("Düşük tıklama alan anahtar kelimeler için içeriklerinizi gözden geçirin.")
-    
-    # En yüksek gösterimli anahtar kelimeler için
-    if keywords_data:
-        high_imp_keywords = sorted(keywords_data, key=lambda x: x.get('impressions', 0), reverse=True)[:3]
-        if high_imp_keywords:
-            top_keyword = high_imp_keywords[0].get('keys', [''])[0]
-            recommendations.append(f"'{top_keyword}' anahtar kelimesi için daha fazla içerik oluşturun.")
-    
-    # Genel öneriler
-    recommendations.append("Düzenli olarak yeni ve kaliteli içerik yayınlayın.")
-    recommendations.append("Teknik SEO aspectlerinizi (site hızı, mobil uyumluluk vb.) düzenli olarak kontrol edin.")
-    
-    return recommendations # Bu satır doğru.
-
-# --- Hata veren kod parçası aşağıdan başlıyor ---
-# Bu blok, generate_recommendations fonksiyonunun dışına taşındı
-def create_page_analysis_pdf(domain, pageData, selectedPage):
+def create_page_analysis_pdf(domain, pageData, selectedPage, output=None):
     """
     Sayfa analizi raporu PDF'i oluşturur.
     
@@ -406,11 +327,12 @@ def create_page_analysis_pdf(domain, pageData, selectedPage):
         domain (str): Raporun oluşturulacağı domain
         pageData (dict): Sayfa analizi verileri
         selectedPage (str): Analiz edilen sayfa
+        output (file, optional): PDF'in yazılacağı dosya nesnesi; verilmezse BytesIO kullanılır
         
     Returns:
-        BytesIO: PDF içeren buffer
+        BytesIO veya file: PDF içeren buffer (output verildiyse kendisi)
     """
-    buffer = BytesIO()
+    buffer = output if output is not None else BytesIO()
     
     # PDF dokümanı oluştur
     doc = SimpleDocTemplate(
@@ -423,58 +345,8 @@ def create_page_analysis_pdf(domain, pageData, selectedPage):
         encoding='utf-8'
     )
     
-    # Stilleri al
-    styles = getSampleStyleSheet()
-    
-    # Türkçe fontlu özel stiller oluştur
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=30,
-        textColor=HexColor('#2c3e50'),
-        alignment=TA_CENTER,
-        fontName=turkish_font_name
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=18,
-        spaceAfter=12,
-        textColor=HexColor('#34495e'),
-        borderWidth=1,
-        borderColor=HexColor('#3498db'),
-        borderPadding=5,
-        fontName=turkish_font_name
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomSubheading',
-        parent=styles['Heading3'],
-        fontSize=14,
-        spaceAfter=10,
-        textColor=HexColor('#34495e'),
-        fontName=turkish_font_name
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomBody',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6,
-        textColor=HexColor('#2c3e50'),
-        fontName=turkish_font_name
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomSmall',
-        parent=styles['Normal'],
-        fontSize=9,
-        spaceAfter=4,
-        textColor=HexColor('#7f8c8d'),
-        fontName=turkish_font_name
-    ))
+    # Stilleri al (süreç başına bir kez oluşturulur)
+    styles = get_report_styles(heading_font_size=18)
     
     # İçerik elemanları listesi
     elements = []
@@ -0,0 +1,149 @@
+# pdf_pool.py
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker süreç sayısı ve aynı anda işlenebilecek PDF sayısı
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_MAX_CONCURRENT = int(os.getenv("PDF_MAX_CONCURRENT", str(PDF_WORKERS * 2)))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "60"))
+
+# Oluşturulan PDF'lerin geçici olarak yazıldığı dizin (varsayılan: sistem temp dizini)
+PDF_TMP_DIR = os.getenv("PDF_TMP_DIR") or None
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+_executor = None
+_semaphore = asyncio.Semaphore(PDF_MAX_CONCURRENT)
+
+
+class PdfRenderTimeout(Exception):
+    """PDF oluşturma PDF_RENDER_TIMEOUT süresini aştığında fırlatılır"""
+
+
+def _init_worker():
+    """Worker süreç açılırken Türkçe fontu ve stilleri hazırlar"""
+    import pdf_builder
+    pdf_builder.warm_up()
+
+
+def _render(kind, args):
+    """
+    Worker süreçte çalışır; PDF'i geçici dosyaya yazar.
+
+    PDF byte'ları süreçler arasında taşınmaz, yalnızca dosya yolu döner.
+
+    Returns:
+        tuple: (dosya yolu, byte cinsinden boyut)
+    """
+    import pdf_builder
+
+    builders = {
+        "seo": pdf_builder.create_seo_pdf,
+        "page_analysis": pdf_builder.create_page_analysis_pdf,
+    }
+    fd, path = tempfile.mkstemp(prefix="report_", suffix=".pdf", dir=PDF_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as output:
+            builders[kind](*args, output=output)
+        return path, os.path.getsize(path)
+    except BaseException:
+        discard(path)
+        raise
+
+
+def _ping():
+    return os.getpid()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Uygulama süreci thread ve event loop içerdiğinden fork yerine spawn kullanılır
+        _executor = ProcessPoolExecutor(
+            max_workers=PDF_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+    return _executor
+
+
+def start():
+    """Havuzu açar ve worker süreçleri önceden başlatır (ilk istek soğuk başlamasın)"""
+    executor = _get_executor()
+    for _ in range(PDF_WORKERS):
+        executor.submit(_ping)
+
+
+async def render(kind, *args):
+    """
+    PDF'i process pool'da oluşturur; event loop bloklanmaz.
+
+    Args:
+        kind (str): "seo" veya "page_analysis"
+        *args: pdf_builder fonksiyonunun argümanları
+
+    Returns:
+        tuple: (geçici PDF dosyasının yolu, boyutu). Dosyayı çağıran siler.
+    """
+    await _semaphore.acquire()
+    loop = asyncio.get_running_loop()
+    try:
+        future = _get_executor().submit(_render, kind, args)
+    except BaseException:
+        _semaphore.release()
+        raise
+    # Slot, worker işi gerçekten bitirince bırakılır: zaman aşımı ya da iptalden sonra
+    # worker çalışmaya devam ettiğinden eşzamanlı render sayısı PDF_MAX_CONCURRENT'i aşmaz
+    future.add_done_callback(lambda _: _release_slot(loop))
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), PDF_RENDER_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Çalışan worker durdurulamaz; iş bitince üretilen dosyayı sil
+        future.add_done_callback(_discard_result)
+        raise PdfRenderTimeout(f"PDF oluşturma {PDF_RENDER_TIMEOUT:.0f} saniyeyi aştı")
+
+
+def iter_file(f, chunk_size=PDF_STREAM_CHUNK_SIZE):
+    """
+    Açık dosyayı parça parça okur ve sonunda kapatır (StreamingResponse için).
+
+    Dosya önceden açıldığından okuma sırasında silinse (önbellekten atılsa) de tamamlanır.
+    """
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def discard(path):
+    """Geçici PDF dosyasını siler"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _release_slot(loop):
+    """Future callback'i executor thread'inde çalışır; semafor event loop'ta bırakılır"""
+    try:
+        loop.call_soon_threadsafe(_semaphore.release)
+    except RuntimeError:
+        # Event loop kapanmış (uygulama kapanıyor)
+        pass
+
+
+def _discard_result(future):
+    if not future.cancelled() and future.exception() is None:
+        discard(future.result()[0])
+
+
+def shutdown():
+    """Uygulama kapanırken bekleyen işleri iptal edip havuzu kapatır"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
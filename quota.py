@@ -0,0 +1,327 @@
+# quota.py
+import asyncio
+import contextvars
+import datetime
+import email.utils
+import hashlib
+import json
+import os
+import random
+import time
+
+import httpx
+from fastapi import HTTPException
+
+from rate_limit import AdaptiveTokenBucket
+
+# Google kotaları (dakika başına istek). Kapsam: user = Google hesabı,
+# property = Search Console mülkü / GA4 property, api_key = PageSpeed API key'i
+SEARCH_ANALYTICS_QPM = int(os.getenv("SEARCH_ANALYTICS_QPM", "1200"))
+SEARCH_CONSOLE_USER_QPM = int(os.getenv("SEARCH_CONSOLE_USER_QPM", "200"))
+URL_INSPECTION_QPM = int(os.getenv("URL_INSPECTION_QPM", "600"))
+GA_DATA_QPM = int(os.getenv("GA_DATA_QPM", "120"))
+PAGESPEED_REQUESTS_PER_MINUTE = int(os.getenv("PAGESPEED_REQUESTS_PER_MINUTE", "240"))
+
+# Uç nokta -> {kapsam: dakika başına istek}
+ENDPOINT_QUOTAS = {
+    "searchanalytics.query": {"user": SEARCH_ANALYTICS_QPM, "property": SEARCH_ANALYTICS_QPM},
+    "sites.list": {"user": SEARCH_CONSOLE_USER_QPM},
+    "urlInspection.inspect": {"property": URL_INSPECTION_QPM},
+    "runReport": {"property": GA_DATA_QPM},
+    "pagespeed": {"api_key": PAGESPEED_REQUESTS_PER_MINUTE},
+}
+
+# 429/5xx yanıtlarında tekrar deneme sayısı ve bekleme sınırları (saniye)
+GOOGLE_API_MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", "5"))
+GOOGLE_API_BACKOFF_BASE = float(os.getenv("GOOGLE_API_BACKOFF_BASE", "1"))
+GOOGLE_API_BACKOFF_MAX = float(os.getenv("GOOGLE_API_BACKOFF_MAX", "60"))
+# GA4 propertyQuota'da kalan token bu değerin altına inerse property kota dolmuş sayılır
+GA_TOKEN_RESERVE = int(os.getenv("GA_TOKEN_RESERVE", "200"))
+
+# Hız sınırı (tekrar denenir) ve günlük kota (tekrar denenmez) hata nedenleri
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded", "RATE_LIMIT_EXCEEDED"}
+DAILY_LIMIT_REASONS = {"dailyLimitExceeded", "dailyLimitExceededUnreg"}
+
+# Google kota günü Pasifik saatiyle gece yarısı sıfırlanır
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:
+    QUOTA_TIMEZONE = datetime.timezone.utc
+
+# İsteği yapan kullanıcı; execute()'a user_id verilmezse buradan okunur
+quota_user = contextvars.ContextVar("quota_user", default=None)
+
+
+def set_quota_user(user_id):
+    """Geçerli istek/iş için kota kullanıcısını ayarlar"""
+    quota_user.set(user_id)
+
+
+def quota_day_bounds(now=None):
+    """
+    Geçerli kota gününün başlangıcı ve bir sonraki sıfırlanma zamanı.
+
+    Returns:
+        tuple: (başlangıç, sıfırlanma) naive UTC
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    local = now.astimezone(QUOTA_TIMEZONE)
+    start = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    reset = start + datetime.timedelta(days=1)
+
+    def to_utc(value):
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return to_utc(start), to_utc(reset)
+
+
+def seconds_until_daily_reset():
+    _, reset_at = quota_day_bounds()
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return max(1.0, (reset_at - now).total_seconds())
+
+
+class QuotaExceededError(HTTPException):
+    """Kota dolduğunda (ya da 429 tekrar denemeleri tükendiğinde) fırlatılır; Retry-After ile 429 döner"""
+
+    def __init__(self, endpoint, retry_after, daily=False):
+        self.endpoint = endpoint
+        self.retry_after = max(1, int(retry_after))
+        self.daily = daily
+        scope = "daily" if daily else "rate"
+        super().__init__(
+            status_code=429,
+            detail=f"Google API {scope} quota exceeded for {endpoint}",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+
+def _parse_retry_after(value):
+    """Retry-After başlığı: saniye ya da HTTP tarihi"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (parsed - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def _error_reasons(content):
+    """Google hata gövdesindeki neden kodları ve mesaj"""
+    try:
+        error = json.loads(content).get("error", {})
+    except (TypeError, ValueError, AttributeError):
+        return set(), ""
+    if not isinstance(error, dict):
+        return set(), ""
+    reasons = {item.get("reason") for item in error.get("errors", []) if isinstance(item, dict)}
+    reasons |= {item.get("reason") for item in error.get("details", []) if isinstance(item, dict)}
+    reasons.discard(None)
+    return reasons, error.get("message", "")
+
+
+def classify(error):
+    """
+    Hatayı sınıflandırır.
+
+    Returns:
+        tuple: (tür, Retry-After saniyesi) — tür 'daily', 'rate', 'server' ya da None (tekrar denenmez)
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        retry_after = _parse_retry_after(error.response.headers.get("retry-after"))
+        content = error.response.content
+    elif isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return "server", None
+    else:
+        # googleapiclient HttpError
+        resp = getattr(error, "resp", None)
+        if resp is None:
+            return None, None
+        try:
+            status = int(getattr(resp, "status", 0))
+        except (TypeError, ValueError):
+            return None, None
+        retry_after = _parse_retry_after(resp.get("retry-after")) if hasattr(resp, "get") else None
+        content = getattr(error, "content", b"")
+
+    reasons, message = _error_reasons(content)
+    if reasons & DAILY_LIMIT_REASONS or (status in (403, 429) and "per day" in message.lower()):
+        return "daily", retry_after
+    if status == 429 or (status == 403 and reasons & RATE_LIMIT_REASONS):
+        return "rate", retry_after
+    if status >= 500:
+        return "server", retry_after
+    return None, None
+
+
+def backoff_delay(attempt):
+    """Eşit jitter'lı üstel bekleme: yarısı sabit, yarısı rastgele"""
+    ceiling = min(GOOGLE_API_BACKOFF_MAX, GOOGLE_API_BACKOFF_BASE * 2 ** attempt)
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def _mask(value):
+    """API key'leri metriklerde ve anahtarlarda açık tutmamak için"""
+    return hashlib.sha256(value.encode()).hexdigest()[:12]
+
+
+class QuotaManager:
+    """
+    Google API çağrıları için merkezi kota yöneticisi.
+
+    Her çağrı uç noktasının kota kapsamlarındaki (kullanıcı, mülk, API key)
+    token bucket'lardan birer token alır; token yoksa çağrı kuyrukta bekler.
+    429 yanıtları ilgili bucket'ların hızını düşürür ve Retry-After süresince
+    bekletir, 5xx yanıtları jitter'lı üstel beklemeyle tekrar denenir. Günlük
+    kota dolduğunda kapsam sıfırlanma zamanına kadar kapalı tutulur ve
+    QuotaExceededError (429 + Retry-After) fırlatılır.
+    """
+
+    def __init__(self, quotas=ENDPOINT_QUOTAS):
+        self.quotas = quotas
+        # (uç nokta, kapsam, kimlik) -> AdaptiveTokenBucket
+        self._buckets = {}
+        # (uç nokta, kapsam, kimlik) -> kotanın açılacağı zaman (monotonic)
+        self._exhausted = {}
+        # uç nokta -> sayaçlar
+        self._counters = {}
+
+    def _keys(self, endpoint, user_id=None, property_key=None, api_key=None):
+        """Çağrının kota kapsamları, en özelden en genele"""
+        ids = {"property": property_key, "api_key": _mask(api_key) if api_key else None, "user": user_id}
+        scopes = self.quotas.get(endpoint, {})
+        return [
+            (endpoint, scope, ids[scope])
+            for scope in ("property", "api_key", "user")
+            if scope in scopes and ids[scope] is not None
+        ]
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            per_minute = self.quotas[key[0]][key[1]]
+            bucket = AdaptiveTokenBucket(per_minute / 60, max(1, per_minute // 60))
+            self._buckets[key] = bucket
+        return bucket
+
+    def _count(self, endpoint, name):
+        counters = self._counters.setdefault(
+            endpoint, {"calls": 0, "retries": 0, "throttled": 0, "rejected": 0}
+        )
+        counters[name] += 1
+
+    def _check_exhausted(self, endpoint, keys):
+        now = time.monotonic()
+        for key in keys:
+            until = self._exhausted.get(key)
+            if until is None:
+                continue
+            if until > now:
+                self._count(endpoint, "rejected")
+                raise QuotaExceededError(endpoint, until - now, daily=True)
+            del self._exhausted[key]
+
+    def exhaust(self, key, seconds):
+        """Kapsamı verilen süre boyunca kapalı tutar"""
+        self._exhausted[key] = max(self._exhausted.get(key, 0.0), time.monotonic() + seconds)
+
+    async def run(self, endpoint, call, user_id=None, property_key=None, api_key=None):
+        """
+        Asenkron çağrıyı kota dahilinde çalıştırır.
+
+        Args:
+            endpoint (str): Uç nokta adı (ENDPOINT_QUOTAS anahtarı)
+            call: Argümansız, awaitable döndüren fonksiyon; her denemede yeniden çağrılır
+            user_id, property_key, api_key: Kota kapsamlarının kimlikleri
+
+        Returns:
+            Çağrının sonucu
+        """
+        keys = self._keys(endpoint, user_id, property_key, api_key)
+        buckets = [self._bucket(key) for key in keys]
+        attempt = 0
+        while True:
+            self._check_exhausted(endpoint, keys)
+            for bucket in buckets:
+                await bucket.acquire()
+            self._count(endpoint, "calls")
+            try:
+                result = await call()
+            except Exception as e:
+                kind, retry_after = classify(e)
+                if kind is None:
+                    raise
+                if kind == "daily":
+                    seconds = retry_after or seconds_until_daily_reset()
+                    if keys:
+                        self.exhaust(keys[0], seconds)
+                    self._count(endpoint, "rejected")
+                    raise QuotaExceededError(endpoint, seconds, daily=True) from e
+
+                delay = min(GOOGLE_API_BACKOFF_MAX, retry_after or backoff_delay(attempt))
+                if kind == "rate":
+                    self._count(endpoint, "throttled")
+                    for bucket in buckets:
+                        bucket.penalize(delay)
+                if attempt >= GOOGLE_API_MAX_RETRIES:
+                    if kind == "rate":
+                        raise QuotaExceededError(endpoint, delay) from e
+                    raise
+                print(f"Google API {endpoint} {kind} hatası, {delay:.1f} sn sonra tekrar denenecek ({attempt + 1}/{GOOGLE_API_MAX_RETRIES})")
+                self._count(endpoint, "retries")
+                attempt += 1
+                # Hız sınırında bekleme bucket'larda yapılır; diğer tüm çağrılar da bekler
+                if kind != "rate" or not buckets:
+                    await asyncio.sleep(delay)
+                continue
+
+            for bucket in buckets:
+                bucket.reward()
+            return result
+
+    def observe_ga_quota(self, property_path, property_quota):
+        """
+        GA4 yanıtındaki propertyQuota'yı işler: saatlik ya da günlük token
+        neredeyse bittiyse property'nin runReport kapsamını sıfırlanmaya kadar kapatır.
+        """
+        if not property_quota:
+            return
+        key = ("runReport", "property", property_path)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        windows = {
+            "tokensPerHour": 3600 - (now.minute * 60 + now.second),
+            "tokensPerProjectPerHour": 3600 - (now.minute * 60 + now.second),
+            "tokensPerDay": seconds_until_daily_reset(),
+        }
+        for name, seconds in windows.items():
+            remaining = (property_quota.get(name) or {}).get("remaining")
+            if remaining is not None and remaining < GA_TOKEN_RESERVE:
+                print(f"GA4 {name} kotası azaldı ({property_path}: {remaining} token kaldı)")
+                self.exhaust(key, seconds)
+
+    def stats(self):
+        now = time.monotonic()
+        endpoints = {}
+        for (endpoint, scope, _), bucket in self._buckets.items():
+            entry = endpoints.setdefault(endpoint, {"buckets": 0, "slowed": 0, "blocked": 0, "exhausted": 0})
+            entry["buckets"] += 1
+            if bucket.rate < bucket.max_rate:
+                entry["slowed"] += 1
+            if bucket.blocked_until > now:
+                entry["blocked"] += 1
+        for (endpoint, _, _), until in self._exhausted.items():
+            if until > now:
+                endpoints.setdefault(endpoint, {"buckets": 0, "slowed": 0, "blocked": 0, "exhausted": 0})["exhausted"] += 1
+        for endpoint, counters in self._counters.items():
+            endpoints.setdefault(endpoint, {}).update(counters)
+        return endpoints
+
+
+quota_manager = QuotaManager()
@@ -0,0 +1,85 @@
+# rate_limit.py
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Asenkron token bucket.
+
+    Saniyede `rate` token dolar, en fazla `capacity` token birikir. Token yoksa
+    acquire() bekler; bekleyenler sırayla (FIFO) servis edilir.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    @property
+    def available(self):
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Karşı tarafın hız sınırına uyum sağlayan token bucket.
+
+    penalize() (429 vb.) hızı yarıya indirir ve istenirse bir süre tüm çağrıları
+    bekletir; reward() başarılı çağrılarda hızı yapılandırılan değere doğru artırır.
+    """
+
+    def __init__(self, rate, capacity, min_rate_fraction=0.1, recovery_fraction=0.05):
+        super().__init__(rate, capacity)
+        self.max_rate = rate
+        self.min_rate = rate * min_rate_fraction
+        self.recovery = rate * recovery_fraction
+        self.blocked_until = 0.0
+        self.penalties = 0
+
+    def penalize(self, pause=None):
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.penalties += 1
+        if pause:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def reward(self):
+        if self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.recovery)
+
+    async def acquire(self, tokens=1):
+        # Kota penceresi kapalıyken çağrılar kuyrukta bekler
+        while True:
+            wait = self.blocked_until - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        await super().acquire(tokens)
+
+    def stats(self):
+        return {
+            "rate": round(self.rate, 3),
+            "maxRate": round(self.max_rate, 3),
+            "tokens": round(self.available, 2),
+            "penalties": self.penalties,
+            "blockedFor": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+        }
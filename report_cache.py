@@ -0,0 +1,180 @@
+# report_cache.py
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+
+# pdf_builder şablonları değiştiğinde artırılmalı; eski raporlar böylece geçersiz olur
+TEMPLATE_VERSION = "3"
+
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "seo_report_cache")
+# Diskte tutulacak en fazla rapor boyutu (byte)
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def report_key(kind, domain, rows, day=None):
+    """
+    Rapor girdilerinden içerik adresli anahtar üretir.
+
+    Aynı tür, domain, satırlar, şablon sürümü ve gün için aynı anahtar döner.
+    Satırlar anahtar sırasından bağımsız (sort_keys) JSON'a çevrilir.
+
+    Returns:
+        str: sha256 hex
+    """
+    day = day or datetime.date.today()
+    payload = json.dumps(
+        [kind, domain.strip().lower(), rows, TEMPLATE_VERSION, day.isoformat()],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def etag_for(key):
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match başlığı verilen ETag'i içeriyor mu"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ReportCache:
+    """
+    Oluşturulmuş PDF'leri diskte tutan LRU önbellek.
+
+    Toplam boyut max_bytes'ı aşınca en uzun süredir kullanılmayan raporlar silinir.
+    Aynı rapor için eşzamanlı istekler tek bir render'ı bekler.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # anahtar -> boyut, en eski başta
+        self._total_bytes = 0
+        self._pending = {}
+        self._loaded = False
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _load(self):
+        """Önceki çalışmalardan kalan dosyaları erişim sırasına göre indeksler"""
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._loaded = True
+
+    def open(self, key):
+        """
+        Önbellekteki raporu okumak için açar.
+
+        Dosya tanıtıcısı döndürülür; rapor akış sırasında LRU ile silinse de
+        açık tanıtıcı üzerinden okuma eksiksiz tamamlanır.
+
+        Returns:
+            tuple | None: (açık dosya, boyut)
+        """
+        self._load()
+        size = self._entries.get(key)
+        if size is None:
+            return None
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        os.utime(f.fileno())
+        self._entries.move_to_end(key)
+        return f, size
+
+    def put(self, key, source_path, size):
+        """Oluşturulan geçici PDF'i önbelleğe taşır"""
+        self._load()
+        path = self._path(key)
+        shutil.move(source_path, path)
+        self._forget(key)
+        self._entries[key] = size
+        self._total_bytes += size
+        self._evict(keep=key)
+        return path, size
+
+    async def get_or_render(self, key, render):
+        """
+        Rapor önbellekte yoksa render() ile oluşturur.
+
+        Args:
+            key (str): report_key ile üretilen anahtar
+            render: (geçici dosya yolu, boyut) döndüren coroutine fonksiyonu
+
+        Returns:
+            tuple: (durum, açık dosya, boyut) - durum 'HIT' veya 'MISS'
+        """
+        status = "HIT"
+        while True:
+            cached = self.open(key)
+            if cached is not None:
+                return (status,) + cached
+
+            task = self._pending.get(key)
+            if task is None:
+                task = asyncio.create_task(self._render(key, render))
+                self._pending[key] = task
+                task.add_done_callback(lambda t: self._on_render_done(key, t))
+            await asyncio.shield(task)
+            # Oluşan rapor bir sonraki turda açılır; o arada silindiyse yeniden oluşturulur
+            status = "MISS"
+
+    def _on_render_done(self, key, task):
+        self._pending.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Rapor oluşturma hatası ({key[:12]}): {task.exception()}")
+
+    async def _render(self, key, render):
+        tmp_path, size = await render()
+        return self.put(key, tmp_path, size)
+
+    def _forget(self, key):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self, keep):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            self._forget(key)
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "maxBytes": self.max_bytes
+        }
+
+
+report_cache = ReportCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES)
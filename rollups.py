@@ -0,0 +1,288 @@
+# rollups.py
+import numpy as np
+from sqlalchemy import delete, insert, func, literal, true, cast, type_coerce, Float, nulls_last
+from sqlalchemy.dialects.postgresql import array, ARRAY
+from sqlalchemy.future import select
+
+from keyword_metrics import top_indices
+from models import SearchAnalyticsRow, SearchAnalyticsRollup
+
+# Günlük toplamı tutulan boyutlar; 'total' günün site toplamıdır
+ROLLUP_DIMENSIONS = ("query", "page", "country", "device")
+TOTAL_DIMENSION = "total"
+
+GROUPABLE_DIMENSIONS = ROLLUP_DIMENSIONS + ("date",)
+ORDER_METRICS = ("clicks", "impressions", "ctr", "position")
+DEFAULT_PERCENTILES = (50, 90, 99)
+MAX_TOP = 1000
+
+
+class RollupError(ValueError):
+    """Geçersiz rollup parametresi"""
+
+
+def parse_dimensions(value):
+    """'query,date' -> ['query', 'date']"""
+    dimensions = [name.strip() for name in (value or "").split(",") if name.strip()]
+    if not dimensions:
+        raise RollupError("At least one dimension is required")
+    invalid = [name for name in dimensions if name not in GROUPABLE_DIMENSIONS]
+    if invalid:
+        raise RollupError(f"Unknown dimensions: {', '.join(invalid)}")
+    if len(set(dimensions)) != len(dimensions):
+        raise RollupError("Dimensions must not repeat")
+    return dimensions
+
+
+def parse_percentiles(value):
+    """'50,90' -> [50.0, 90.0]"""
+    if not value:
+        return list(DEFAULT_PERCENTILES)
+    try:
+        percentiles = [float(p) for p in value.split(",") if p.strip()]
+    except ValueError:
+        raise RollupError("Percentiles must be numbers")
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise RollupError("Percentiles must be between 0 and 100")
+    return percentiles
+
+
+def validate(top, order_by):
+    if top < 1 or top > MAX_TOP:
+        raise RollupError(f"top must be between 1 and {MAX_TOP}")
+    if order_by not in ORDER_METRICS:
+        raise RollupError(f"order_by must be one of: {', '.join(ORDER_METRICS)}")
+
+
+async def refresh_daily_rollups(db, site_id, day):
+    """Bir günün ham satırlarından rollup'ları yeniden hesaplar (commit çağırana aittir)"""
+    await db.execute(
+        delete(SearchAnalyticsRollup)
+        .where(SearchAnalyticsRollup.site_id == site_id, SearchAnalyticsRollup.date == day)
+    )
+
+    row = SearchAnalyticsRow
+    for dimension in ROLLUP_DIMENSIONS + (TOTAL_DIMENSION,):
+        if dimension == TOTAL_DIMENSION:
+            value, group_by = literal(""), []
+        else:
+            value = getattr(row, dimension)
+            group_by = [value]
+        await db.execute(
+            insert(SearchAnalyticsRollup).from_select(
+                ["site_id", "date", "dimension", "value", "clicks", "impressions", "position_sum"],
+                select(
+                    row.site_id, row.date, literal(dimension), value,
+                    func.sum(row.clicks), func.sum(row.impressions),
+                    func.sum(row.position * row.impressions)
+                )
+                .where(row.site_id == site_id, row.date == day)
+                .group_by(row.site_id, row.date, *group_by)
+            )
+        )
+
+
+def _grouped(site_id, start_date, end_date, dimensions):
+    """
+    İstenen boyutlara göre gruplanmış CTE'yi döndürür.
+
+    En fazla bir boyut (+ tarih) isteniyorsa önceden hesaplanmış günlük rollup'lar,
+    aksi halde ham satırlar kullanılır.
+
+    Returns:
+        tuple: (CTE, kaynak adı)
+    """
+    non_date = [name for name in dimensions if name != "date"]
+    if len(non_date) <= 1:
+        rollup = SearchAnalyticsRollup
+        columns = [rollup.date if name == "date" else rollup.value for name in dimensions]
+        stmt = (
+            select(
+                *[column.label(name) for column, name in zip(columns, dimensions)],
+                func.sum(rollup.clicks).label("clicks"),
+                func.sum(rollup.impressions).label("impressions"),
+                func.sum(rollup.position_sum).label("position_sum")
+            )
+            .where(
+                rollup.site_id == site_id,
+                rollup.dimension == (non_date[0] if non_date else TOTAL_DIMENSION),
+                rollup.date >= start_date,
+                rollup.date <= end_date
+            )
+            .group_by(*columns)
+        )
+        return stmt.cte("grouped"), "rollup"
+
+    row = SearchAnalyticsRow
+    columns = [getattr(row, name) for name in dimensions]
+    stmt = (
+        select(
+            *[column.label(name) for column, name in zip(columns, dimensions)],
+            func.sum(row.clicks).label("clicks"),
+            func.sum(row.impressions).label("impressions"),
+            func.sum(row.position * row.impressions).label("position_sum")
+        )
+        .where(row.site_id == site_id, row.date >= start_date, row.date <= end_date)
+        .group_by(*columns)
+    )
+    return stmt.cte("grouped"), "rows"
+
+
+def build_rollup_query(grouped, dimensions, top, order_by, percentiles):
+    """
+    Top-k satırları ve tüm grupların toplam/yüzdelik değerlerini tek sorguda döndürür.
+
+    Gruplanmış CTE iki kez kullanıldığı için PostgreSQL onu bir kez hesaplar (materialize).
+    """
+    g = grouped.c
+    impressions = cast(func.nullif(g.impressions, 0), Float)
+    ctr = cast(g.clicks, Float) / impressions
+    position = g.position_sum / impressions
+    fractions = [p / 100 for p in percentiles]
+
+    def percentile(expr, name):
+        # Birden çok oran verildiği için sonuç dizidir
+        return type_coerce(
+            func.percentile_cont(array(fractions)).within_group(expr), ARRAY(Float)
+        ).label(name)
+
+    stats = (
+        select(
+            func.count().label("group_count"),
+            func.sum(g.clicks).label("total_clicks"),
+            func.sum(g.impressions).label("total_impressions"),
+            func.sum(g.position_sum).label("total_position_sum"),
+            percentile(g.clicks, "p_clicks"),
+            percentile(g.impressions, "p_impressions"),
+            percentile(ctr, "p_ctr"),
+            percentile(position, "p_position")
+        )
+        .select_from(grouped)
+        .subquery("stats")
+    )
+
+    order_columns = {"clicks": g.clicks, "impressions": g.impressions, "ctr": ctr, "position": position}
+    # Pozisyonda küçük değer daha iyidir
+    primary = order_columns[order_by]
+    primary = nulls_last(primary.asc() if order_by == "position" else primary.desc())
+
+    return (
+        select(*[g[name] for name in dimensions], g.clicks, g.impressions, g.position_sum, stats)
+        .select_from(grouped.join(stats, true()))
+        .order_by(primary, g.impressions.desc())
+        .limit(top)
+    )
+
+
+def _metrics(clicks, impressions, position_sum):
+    clicks = int(clicks or 0)
+    impressions = int(impressions or 0)
+    return {
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": clicks / impressions if impressions else 0,
+        "position": float(position_sum or 0) / impressions if impressions else 0,
+    }
+
+
+def _percentile_dict(percentiles, values):
+    return {
+        f"p{p:g}": (float(v) if v is not None else None)
+        for p, v in zip(percentiles, values or [None] * len(percentiles))
+    }
+
+
+def _empty_result(dimensions, percentiles, source):
+    return {
+        "dimensions": dimensions,
+        "source": source,
+        "groupCount": 0,
+        "totals": _metrics(0, 0, 0),
+        "percentiles": {metric: _percentile_dict(percentiles, None) for metric in ORDER_METRICS},
+        "rows": [],
+    }
+
+
+async def query_rollup(db, site_id, start_date, end_date, dimensions, top=100, order_by="clicks", percentiles=DEFAULT_PERCENTILES):
+    """
+    Yerel veriden gruplanmış metrikleri döndürür.
+
+    Returns:
+        dict: groupCount, totals, percentiles ve top-k rows (API satır biçiminde)
+    """
+    grouped, source = _grouped(site_id, start_date, end_date, dimensions)
+    result = await db.execute(build_rollup_query(grouped, dimensions, top, order_by, percentiles))
+    records = result.all()
+    if not records:
+        return _empty_result(dimensions, percentiles, source)
+
+    first = records[0]
+    return {
+        "dimensions": dimensions,
+        "source": source,
+        "groupCount": int(first.group_count),
+        "totals": _metrics(first.total_clicks, first.total_impressions, first.total_position_sum),
+        "percentiles": {
+            "clicks": _percentile_dict(percentiles, first.p_clicks),
+            "impressions": _percentile_dict(percentiles, first.p_impressions),
+            "ctr": _percentile_dict(percentiles, first.p_ctr),
+            "position": _percentile_dict(percentiles, first.p_position),
+        },
+        "rows": [
+            {
+                "keys": [str(record._mapping[name]) for name in dimensions],
+                **_metrics(record.clicks, record.impressions, record.position_sum)
+            }
+            for record in records
+        ],
+    }
+
+
+def summarize_rows(rows, dimensions, top=100, order_by="clicks", percentiles=DEFAULT_PERCENTILES):
+    """
+    API'den gelen gruplanmış satırlar için query_rollup ile aynı yanıtı NumPy ile üretir.
+
+    Yerel veri yokken canlı API yanıtı üzerinde kullanılır.
+    """
+    if not rows:
+        return _empty_result(dimensions, percentiles, "live")
+
+    n = len(rows)
+    clicks = np.fromiter((row.get("clicks", 0) for row in rows), dtype=np.float64, count=n)
+    impressions = np.fromiter((row.get("impressions", 0) for row in rows), dtype=np.float64, count=n)
+    position = np.fromiter((row.get("position", 0) for row in rows), dtype=np.float64, count=n)
+    position_sum = position * impressions
+
+    has_impressions = impressions > 0
+    ctr = np.divide(clicks, impressions, out=np.zeros(n), where=has_impressions)
+
+    # Gösterimi olmayan gruplar CTR/pozisyon sıralamasında ve yüzdeliklerinde yer almaz
+    order_values = {
+        "clicks": clicks,
+        "impressions": impressions,
+        "ctr": np.where(has_impressions, ctr, -np.inf),
+        "position": np.where(has_impressions, -position, -np.inf),
+    }[order_by]
+    indices = top_indices(order_values, top)
+
+    def pct(values):
+        if not len(values):
+            return _percentile_dict(percentiles, None)
+        return _percentile_dict(percentiles, np.percentile(values, percentiles))
+
+    return {
+        "dimensions": dimensions,
+        "source": "live",
+        "groupCount": n,
+        "totals": _metrics(clicks.sum(), impressions.sum(), position_sum.sum()),
+        "percentiles": {
+            "clicks": pct(clicks),
+            "impressions": pct(impressions),
+            "ctr": pct(ctr[has_impressions]),
+            "position": pct(position[has_impressions]),
+        },
+        "rows": [
+            {"keys": rows[i]["keys"], **_metrics(clicks[i], impressions[i], position_sum[i])}
+            for i in indices
+        ],
+    }
@@ -0,0 +1,76 @@
+# search_console.py
+from datetime import date, timedelta
+
+from google_services import execute
+
+# Search Analytics API'nin tek istekte döndürebildiği en fazla satır
+MAX_ROWS_PER_PAGE = 25000
+
+
+def site_property_url(site):
+    """Google API tam URL formatı bekler: https://domain.com/"""
+    return f"https://{site}/"
+
+
+async def iter_search_analytics(service, site_url, body, limit=None, page_size=MAX_ROWS_PER_PAGE):
+    """
+    Search Analytics satırlarını startRow ile sayfa sayfa çekip tek tek döndürür.
+
+    Bellekte aynı anda yalnızca bir sayfa tutulur.
+
+    Args:
+        service: searchconsole v1 servisi
+        site_url (str): Search Console mülk URL'si
+        body (dict): Sorgu gövdesi (rowLimit/startRow bu fonksiyon tarafından ayarlanır)
+        limit (int, optional): En fazla döndürülecek satır; None ise tümü
+        page_size (int): İstek başına satır sayısı (en fazla MAX_ROWS_PER_PAGE)
+
+    Yields:
+        dict: Search Analytics satırı
+    """
+    page_size = min(page_size, MAX_ROWS_PER_PAGE)
+    start_row = 0
+    while True:
+        row_limit = page_size if limit is None else min(page_size, limit - start_row)
+        if row_limit <= 0:
+            return
+
+        response = await execute(
+            service.searchanalytics().query(
+                siteUrl=site_url,
+                body={**body, "rowLimit": row_limit, "startRow": start_row}
+            ),
+            "searchanalytics.query",
+            property_key=site_url
+        )
+        rows = response.get("rows", [])
+        for row in rows:
+            yield row
+
+        # Eksik sayfa son sayfadır
+        if len(rows) < row_limit:
+            return
+        start_row += len(rows)
+
+
+async def fetch_search_analytics(service, site_url, body, limit=None):
+    """iter_search_analytics satırlarını liste olarak döndürür"""
+    return [row async for row in iter_search_analytics(service, site_url, body, limit=limit)]
+
+
+async def fetch_top_pages(service, site, limit=20, days=30):
+    """
+    Search Console'dan son `days` gündeki en çok tıklanan sayfaları getirir.
+
+    Returns:
+        list: Search Analytics satırları (keys[0] sayfa URL'si)
+    """
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+
+    request_body = {
+        "startDate": start_date.strftime("%Y-%m-%d"),
+        "endDate": end_date.strftime("%Y-%m-%d"),
+        "dimensions": ["page"]
+    }
+    return await fetch_search_analytics(service, site_property_url(site), request_body, limit=limit)
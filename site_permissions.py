@@ -0,0 +1,187 @@
+# site_permissions.py
+import asyncio
+import os
+import time
+from urllib.parse import urlparse
+
+from google_services import execute, get_service
+
+# sites.list sonucunun önbellekte tutulacağı süre
+SITE_PERMISSIONS_TTL_SECONDS = int(os.getenv("SITE_PERMISSIONS_TTL_SECONDS", "600"))
+
+# URL incelemesi ve site işlemleri için yeterli yetkiler
+VERIFIED_PERMISSION_LEVELS = ("siteOwner", "siteFullUser")
+
+DOMAIN_PROPERTY_PREFIX = "sc-domain:"
+
+
+def property_covers(property_url, url):
+    """
+    URL'nin Search Console mülkünün kapsamında olup olmadığı.
+
+    sc-domain: mülkleri alan adını ve tüm alt alan adlarını, URL önekli mülkler
+    aynı şema + host altındaki önek yolunu kapsar.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    host = parsed.hostname.lower()
+
+    if property_url.startswith(DOMAIN_PROPERTY_PREFIX):
+        domain = property_url[len(DOMAIN_PROPERTY_PREFIX):].lower()
+        return host == domain or host.endswith("." + domain)
+
+    prefix = urlparse(property_url)
+    return (
+        parsed.scheme == prefix.scheme
+        and host == (prefix.hostname or "").lower()
+        and (parsed.path or "/").startswith(prefix.path or "/")
+    )
+
+
+class SiteIndex:
+    """
+    Kullanıcının Search Console mülklerinin sorgulama indeksi.
+
+    URL önekli mülkler host'a göre (aynı host'ta farklı şema/yol önekleri ayrı
+    kayıtlardır), alan adı mülkleri (sc-domain:) alan adıyla tutulur; adaylar
+    sözlük aramasıyla bulunur, kapsam property_covers ile doğrulanır.
+    """
+
+    def __init__(self, entries, fetched_at=None):
+        self.entries = entries
+        self.fetched_at = fetched_at if fetched_at is not None else time.monotonic()
+        # siteUrl -> siteEntry
+        self._sites = {}
+        # host -> o host'taki URL önekli mülkler
+        self._hosts = {}
+        # alan adı -> siteEntry
+        self._domains = {}
+        for entry in entries:
+            site_url = entry.get("siteUrl", "")
+            self._sites[site_url] = entry
+            if site_url.startswith(DOMAIN_PROPERTY_PREFIX):
+                self._domains[site_url[len(DOMAIN_PROPERTY_PREFIX):].lower()] = entry
+            else:
+                host = (urlparse(site_url).hostname or "").lower()
+                self._hosts.setdefault(host, []).append(entry)
+
+    def is_fresh(self, ttl=SITE_PERMISSIONS_TTL_SECONDS):
+        return time.monotonic() - self.fetched_at < ttl
+
+    def verified_sites(self):
+        """Sahip ya da tam yetkili olunan mülkler"""
+        return [
+            {"siteUrl": entry.get("siteUrl", ""), "permissionLevel": entry.get("permissionLevel", "")}
+            for entry in self.entries
+            if entry.get("permissionLevel") in VERIFIED_PERMISSION_LEVELS
+        ]
+
+    def _covering(self, url):
+        """URL'yi kapsayan mülkler"""
+        host = (urlparse(url).hostname or "").lower()
+        labels = host.split(".")
+        candidates = list(self._hosts.get(host, []))
+        candidates += [self._domains.get(".".join(labels[i:])) for i in range(len(labels) - 1)]
+        return [entry for entry in candidates if entry is not None and property_covers(entry["siteUrl"], url)]
+
+    def find(self, target, verified_only=True):
+        """
+        Hedefi kapsayan mülkü döndürür.
+
+        Hedef bir mülkün siteUrl'si ise o mülk döner. Aksi halde URL olarak ele
+        alınır (şemasızsa önce https, sonra http denenir) ve kapsayan mülklerden
+        en özeli seçilir: URL önekli mülkler alan adı mülklerinden önce, uzun
+        önek kısa önekten önce gelir.
+
+        Returns:
+            dict | None: siteEntry ({'siteUrl', 'permissionLevel'})
+        """
+        target = target.strip()
+
+        def allowed(entry):
+            return not verified_only or entry.get("permissionLevel") in VERIFIED_PERMISSION_LEVELS
+
+        entry = self._sites.get(target)
+        if entry is not None:
+            return entry if allowed(entry) else None
+
+        if target.startswith(DOMAIN_PROPERTY_PREFIX):
+            return None
+        if "://" in target:
+            urls = [target]
+        else:
+            urls = [f"https://{target}", f"http://{target}"]
+
+        for url in urls:
+            if not urlparse(url).path:
+                url += "/"
+            matches = [entry for entry in self._covering(url) if allowed(entry)]
+            if matches:
+                return max(
+                    matches,
+                    key=lambda entry: (
+                        not entry["siteUrl"].startswith(DOMAIN_PROPERTY_PREFIX),
+                        len(entry["siteUrl"])
+                    )
+                )
+        return None
+
+
+class SitePermissionStore:
+    """
+    Kullanıcı bazlı SiteIndex önbelleği.
+
+    İndeks TTL dolunca ya da OAuth callback'inde yeniden oluşturulur; aynı kullanıcı
+    için eşzamanlı yenilemeler tek bir sites.list çağrısında birleştirilir.
+    """
+
+    def __init__(self, ttl=SITE_PERMISSIONS_TTL_SECONDS):
+        self.ttl = ttl
+        # user_id -> SiteIndex
+        self._indexes = {}
+        # user_id -> devam eden sites.list görevi
+        self._refreshing = {}
+
+    async def get(self, user_id, creds, refresh=False):
+        """
+        Kullanıcının site indeksini döndürür; yoksa, süresi dolduysa ya da refresh=True ise yeniler.
+
+        Returns:
+            SiteIndex
+        """
+        index = self._indexes.get(user_id)
+        if index is not None and not refresh and index.is_fresh(self.ttl):
+            return index
+        return await asyncio.shield(self._start_refresh(user_id, creds))
+
+    async def refresh(self, user_id, creds):
+        """İndeksi hemen yeniden oluşturur (OAuth callback sonrası)"""
+        self.invalidate(user_id)
+        return await asyncio.shield(self._start_refresh(user_id, creds))
+
+    def invalidate(self, user_id):
+        self._indexes.pop(user_id, None)
+
+    def _start_refresh(self, user_id, creds):
+        task = self._refreshing.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(user_id, creds))
+            self._refreshing[user_id] = task
+            task.add_done_callback(lambda t: self._on_refresh_done(user_id, t))
+        return task
+
+    def _on_refresh_done(self, user_id, task):
+        self._refreshing.pop(user_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Site listesi alınamadı (user_id={user_id}): {task.exception()}")
+
+    async def _fetch(self, user_id, creds):
+        service = get_service("searchconsole", "v1", creds)
+        response = await execute(service.sites().list(), "sites.list", user_id=user_id)
+        index = SiteIndex((response or {}).get("siteEntry", []))
+        self._indexes[user_id] = index
+        return index
+
+    def stats(self):
+        return {"users": len(self._indexes), "refreshing": len(self._refreshing)}
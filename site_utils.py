@@ -0,0 +1,19 @@
+# site_utils.py
+import re
+
+# Yalnızca baştaki protokol atılır (yol içindeki 'http://' korunur)
+SCHEME_PREFIX = re.compile(r"^https?://", re.IGNORECASE)
+
+
+def normalize_site_url(url):
+    """Site URL'sini standart hale getirir (protokolü ve sonundaki slaşı kaldırır)"""
+    return SCHEME_PREFIX.sub("", url).rstrip("/")
+
+
+def site_host(url):
+    """
+    Site araması için kanonik anahtar: normalize edilmiş URL'nin küçük harfli hali.
+
+    'https://Example.com/', 'example.com' ve 'http://EXAMPLE.COM' aynı anahtarı üretir.
+    """
+    return normalize_site_url(url.strip()).lower()
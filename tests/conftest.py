@@ -0,0 +1,9 @@
+# conftest.py
+import os
+import sys
+
+# Modüller depo kökünde düz olarak duruyor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# auth modülü JWT_SECRET olmadan yüklenmez
+os.environ.setdefault("JWT_SECRET", "test-secret")
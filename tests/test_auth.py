@@ -0,0 +1,47 @@
+# test_auth.py
+import time
+
+import jwt
+import pytest
+
+import auth
+from auth import TokenCache, create_jwt, verify_token
+
+
+def test_token_cache_expires_entries():
+    cache = TokenCache()
+    cache.put("live", 1, time.time() + 60)
+    cache.put("dead", 2, time.time() - 1)
+    assert cache.get("live") == 1
+    assert cache.get("dead") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache(max_size=2)
+    exp = time.time() + 60
+    cache.put("a", 1, exp)
+    cache.put("b", 2, exp)
+    cache.get("a")
+    cache.put("c", 3, exp)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_verify_token_round_trip(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    token = create_jwt(42)
+    assert verify_token(token) == 42
+    assert verify_token(token) == 42
+    assert auth.token_cache.stats()["hits"] == 1
+
+
+def test_verify_token_rejects_bad_tokens(monkeypatch):
+    monkeypatch.setattr(auth, "token_cache", TokenCache())
+    forged = jwt.encode({"sub": "1", "exp": int(time.time()) + 60}, "other-secret", algorithm="HS256")
+    expired = jwt.encode({"sub": "1", "exp": int(time.time()) - 10}, auth.SECRET, algorithm="HS256")
+    no_exp = jwt.encode({"sub": "1"}, auth.SECRET, algorithm="HS256")
+    for token in (forged, expired, no_exp):
+        with pytest.raises(jwt.InvalidTokenError):
+            verify_token(token)
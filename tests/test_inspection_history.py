@@ -0,0 +1,29 @@
+# test_inspection_history.py
+import pytest
+
+import inspection_history
+from inspection_history import _impression_change
+
+
+@pytest.fixture(autouse=True)
+def thresholds(monkeypatch):
+    monkeypatch.setattr(inspection_history, "URL_REINSPECT_MIN_IMPRESSION_DELTA", 50)
+    monkeypatch.setattr(inspection_history, "URL_REINSPECT_IMPRESSION_CHANGE", 0.5)
+
+
+def test_missing_side_is_ignored():
+    assert _impression_change(None, 500) is None
+    assert _impression_change(500, None) is None
+
+
+def test_small_changes_are_ignored():
+    # Göreli değişim büyük ama mutlak fark eşiğin altında
+    assert _impression_change(10, 40) is None
+    # Mutlak fark büyük ama göreli değişim eşiğin altında
+    assert _impression_change(1000, 1400) is None
+
+
+def test_significant_change_returns_ratio():
+    assert _impression_change(100, 200) == pytest.approx(1.0)
+    assert _impression_change(1000, 400) == pytest.approx(0.6)
+    assert _impression_change(0, 80) == pytest.approx(80.0)
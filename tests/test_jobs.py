@@ -0,0 +1,19 @@
+# test_jobs.py
+import jobs
+from jobs import retry_delay
+
+
+def test_retry_delay_grows_exponentially_with_jitter(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 60)
+    monkeypatch.setattr(jobs, "JOB_RETRY_MAX_SECONDS", 3600)
+    for attempts, base in ((0, 60), (1, 60), (2, 120), (3, 240)):
+        for _ in range(50):
+            delay = retry_delay(attempts)
+            assert base <= delay <= base * 1.25
+
+
+def test_retry_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 60)
+    monkeypatch.setattr(jobs, "JOB_RETRY_MAX_SECONDS", 300)
+    for _ in range(50):
+        assert 300 <= retry_delay(20) <= 375
@@ -0,0 +1,42 @@
+# test_keyword_metrics.py
+import random
+
+import numpy as np
+
+from keyword_metrics import rate_metric, rate_position, top_indices
+
+
+def test_rate_metric_boundaries_stay_in_lower_bucket():
+    assert rate_metric(20, "clicks") == "Geliştirilebilir"
+    assert rate_metric(21, "clicks") == "Orta"
+    assert rate_metric(100, "clicks") == "İyi"
+    assert rate_metric(101, "clicks") == "Mükemmel"
+    assert rate_metric(500, "impressions") == "Orta"
+    assert rate_metric(5.5, "ctr") == "Mükemmel"
+
+
+def test_rate_metric_unknown_metric():
+    assert rate_metric(10, "position") == "Belirsiz"
+
+
+def test_rate_position_boundaries_move_up():
+    assert rate_position(1) == "Mükemmel"
+    assert rate_position(3) == "Mükemmel"
+    assert rate_position(3.1) == "İyi"
+    assert rate_position(10) == "İyi"
+    assert rate_position(20) == "Orta"
+    assert rate_position(20.5) == "Geliştirilebilir"
+
+
+def test_top_indices_matches_stable_sort():
+    rng = random.Random(7)
+    for _ in range(200):
+        values = np.array([rng.randint(0, 5) for _ in range(rng.randint(0, 30))], dtype=float)
+        k = rng.randint(-1, 35)
+        expected = sorted(range(len(values)), key=lambda i: values[i], reverse=True)[:max(k, 0)]
+        assert top_indices(values, k).tolist() == expected
+
+
+def test_top_indices_empty_and_zero_k():
+    assert top_indices(np.array([], dtype=float), 3).tolist() == []
+    assert top_indices(np.array([1.0, 2.0]), 0).tolist() == []
@@ -0,0 +1,74 @@
+# test_quota.py
+import datetime
+import json
+
+import httpx
+import httplib2
+from googleapiclient.errors import HttpError
+
+import quota
+from quota import backoff_delay, classify, quota_day_bounds
+
+
+def _body(*reasons, message=""):
+    return json.dumps({"error": {"message": message, "errors": [{"reason": reason} for reason in reasons]}}).encode()
+
+
+def _http_error(status, content=b"", headers=None):
+    resp = httplib2.Response({"status": status, **(headers or {})})
+    return HttpError(resp, content)
+
+
+def _status_error(status, content=b"", headers=None):
+    request = httpx.Request("GET", "https://www.googleapis.com/")
+    response = httpx.Response(status, content=content, headers=headers, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def test_classify_daily_limit():
+    assert classify(_http_error(403, _body("dailyLimitExceeded"))) == ("daily", None)
+    assert classify(_http_error(429, _body(message="Quota exceeded per day"))) == ("daily", None)
+
+
+def test_classify_rate_limit():
+    assert classify(_http_error(403, _body("userRateLimitExceeded"))) == ("rate", None)
+    assert classify(_http_error(429, headers={"retry-after": "7"})) == ("rate", 7.0)
+    assert classify(_status_error(429, headers={"Retry-After": "3"})) == ("rate", 3.0)
+
+
+def test_classify_server_and_transport_errors():
+    assert classify(_http_error(503)) == ("server", None)
+    assert classify(_status_error(500)) == ("server", None)
+    assert classify(httpx.ConnectError("boom")) == ("server", None)
+
+
+def test_classify_non_retryable():
+    assert classify(_http_error(403, _body("forbidden"))) == (None, None)
+    assert classify(_http_error(404)) == (None, None)
+    assert classify(_status_error(400, b"not json")) == (None, None)
+    assert classify(ValueError("boom")) == (None, None)
+
+
+def test_backoff_delay_uses_equal_jitter(monkeypatch):
+    monkeypatch.setattr(quota, "GOOGLE_API_BACKOFF_BASE", 1.0)
+    monkeypatch.setattr(quota, "GOOGLE_API_BACKOFF_MAX", 60.0)
+    for attempt, ceiling in ((0, 1), (3, 8), (10, 60)):
+        for _ in range(50):
+            assert ceiling / 2 <= backoff_delay(attempt) <= ceiling
+
+
+def test_quota_day_bounds_pacific_midnight():
+    # PDT (UTC-7): gün 07:00 UTC'de başlar
+    now = datetime.datetime(2026, 7, 1, 3, 0, tzinfo=datetime.timezone.utc)
+    assert quota_day_bounds(now) == (datetime.datetime(2026, 6, 30, 7), datetime.datetime(2026, 7, 1, 7))
+    # PST (UTC-8)
+    now = datetime.datetime(2026, 1, 15, 12, 0, tzinfo=datetime.timezone.utc)
+    assert quota_day_bounds(now) == (datetime.datetime(2026, 1, 15, 8), datetime.datetime(2026, 1, 16, 8))
+
+
+def test_quota_day_bounds_across_dst_change():
+    # 8 Mart 2026 yaz saatine geçiş: gün 23 saat sürer
+    now = datetime.datetime(2026, 3, 8, 12, 0, tzinfo=datetime.timezone.utc)
+    start, reset = quota_day_bounds(now)
+    assert start == datetime.datetime(2026, 3, 8, 8)
+    assert reset == datetime.datetime(2026, 3, 9, 7)
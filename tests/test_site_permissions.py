@@ -0,0 +1,58 @@
+# test_site_permissions.py
+from site_permissions import property_covers, SiteIndex
+
+
+def test_url_prefix_property():
+    assert property_covers("https://example.com/", "https://example.com/page")
+    assert property_covers("https://example.com/blog/", "https://EXAMPLE.com/blog/post")
+    assert not property_covers("https://example.com/blog/", "https://example.com/shop")
+    assert not property_covers("https://example.com/", "http://example.com/page")
+    assert not property_covers("https://example.com/", "https://sub.example.com/")
+    assert not property_covers("https://example.com/", "https://example.com.evil.test/")
+
+
+def test_domain_property():
+    assert property_covers("sc-domain:example.com", "http://example.com/")
+    assert property_covers("sc-domain:example.com", "https://a.b.Example.com/x")
+    assert not property_covers("sc-domain:example.com", "https://notexample.com/")
+
+
+def test_rejects_non_http_urls():
+    assert not property_covers("sc-domain:example.com", "ftp://example.com/")
+    assert not property_covers("https://example.com/", "example.com/page")
+    assert not property_covers("https://example.com/", "https:///nohost")
+
+
+def _index():
+    return SiteIndex([
+        {"siteUrl": "sc-domain:example.com", "permissionLevel": "siteOwner"},
+        {"siteUrl": "https://example.com/", "permissionLevel": "siteFullUser"},
+        {"siteUrl": "https://example.com/blog/", "permissionLevel": "siteOwner"},
+        {"siteUrl": "http://example.com/", "permissionLevel": "siteOwner"},
+        {"siteUrl": "https://shop.example.com/", "permissionLevel": "siteUnverifiedUser"},
+    ])
+
+
+def test_site_index_exact_site_url():
+    assert _index().find("http://example.com/")["siteUrl"] == "http://example.com/"
+    assert _index().find("sc-domain:example.com")["siteUrl"] == "sc-domain:example.com"
+
+
+def test_site_index_picks_most_specific_property():
+    index = _index()
+    assert index.find("https://example.com/blog/post")["siteUrl"] == "https://example.com/blog/"
+    assert index.find("https://example.com/about")["siteUrl"] == "https://example.com/"
+    assert index.find("example.com")["siteUrl"] == "https://example.com/"
+
+
+def test_site_index_falls_back_to_domain_property():
+    index = _index()
+    # Doğrulanmamış URL önekli mülk atlanır, alan adı mülkü kapsar
+    assert index.find("https://shop.example.com/cart")["siteUrl"] == "sc-domain:example.com"
+    assert index.find("https://shop.example.com/", verified_only=False)["siteUrl"] == "https://shop.example.com/"
+
+
+def test_site_index_rejects_uncovered_urls():
+    index = _index()
+    assert index.find("https://other.test/") is None
+    assert index.find("sc-domain:other.test") is None
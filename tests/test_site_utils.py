@@ -0,0 +1,16 @@
+# test_site_utils.py
+from site_utils import normalize_site_url, site_host
+
+
+def test_site_host_same_key_for_equivalent_urls():
+    keys = {site_host(url) for url in ("https://Example.com/", "example.com", "http://EXAMPLE.COM", " https://example.com ")}
+    assert keys == {"example.com"}
+
+
+def test_site_host_strips_only_leading_scheme():
+    assert site_host("https://example.com/https://docs/") == "example.com/https://docs"
+    assert site_host("HTTPS://Example.com/Blog/") == "example.com/blog"
+
+
+def test_normalize_site_url_keeps_case():
+    assert normalize_site_url("https://Example.com/Blog/") == "Example.com/Blog"
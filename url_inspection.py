@@ -0,0 +1,766 @@
+# url_inspection.py
+import asyncio
+import datetime
+import os
+import socket
+import uuid
+import xml.etree.ElementTree as ET
+import zlib
+from urllib.parse import urljoin
+
+from sqlalchemy import insert, update, delete, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from google_services import execute, get_service
+from http_client import get_http_client
+import site_utils
+from inspection_history import record_inspection, select_for_reinspection
+from models import UrlInspectionJob, UrlInspectionItem, UrlInspectionQuotaUsage, InspectedUrl, Site
+from quota import quota_day_bounds, QuotaExceededError
+from site_permissions import property_covers, DOMAIN_PROPERTY_PREFIX
+
+# URL Inspection API günlük kotası (mülk başına); dakika kotası quota.URL_INSPECTION_QPM ile uygulanır
+URL_INSPECTION_QPD = int(os.getenv("URL_INSPECTION_QPD", "2000"))
+# Bir iş içinde aynı anda yapılan inceleme sayısı
+URL_INSPECTION_CONCURRENCY = int(os.getenv("URL_INSPECTION_CONCURRENCY", "5"))
+# Bir işte incelenebilecek en fazla URL
+URL_INSPECTION_MAX_URLS = int(os.getenv("URL_INSPECTION_MAX_URLS", "10000"))
+# Sitemap index'inden okunacak en fazla alt sitemap
+URL_INSPECTION_MAX_SITEMAPS = int(os.getenv("URL_INSPECTION_MAX_SITEMAPS", "50"))
+# Sitemap protokol sınırı: sıkıştırılmamış en fazla 50 MB
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+# Sitemap isteğinde izlenecek en fazla yönlendirme
+SITEMAP_MAX_REDIRECTS = 5
+# Canlılık sinyali bu kadar eskiyen iş başka bir süreç tarafından devralınır
+URL_INSPECTION_LEASE_SECONDS = int(os.getenv("URL_INSPECTION_LEASE_SECONDS", "120"))
+# Yeniden inceleme taramasının aralığı ve kullanabileceği günlük kota payı
+URL_REINSPECT_INTERVAL_SECONDS = int(os.getenv("URL_REINSPECT_INTERVAL_SECONDS", "3600"))
+URL_REINSPECT_QUOTA_SHARE = float(os.getenv("URL_REINSPECT_QUOTA_SHARE", "0.5"))
+# Aynı mülk için eşzamanlı yeniden inceleme planlamasını engelleyen advisory lock
+REINSPECT_LOCK_ID = 7212
+# Tek seferde okunan / yazılan satır sayısı
+URL_INSPECTION_PAGE_SIZE = 500
+URL_INSPECTION_INSERT_BATCH = 5000
+
+ACTIVE_STATUSES = ("pending", "running", "throttled")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# Bu süreci iş sahipliğinde tanımlayan kimlik
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class InspectionError(Exception):
+    """İş oluşturulamadığında (geçersiz sitemap, URL listesi vb.) fırlatılır"""
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def summarize_inspection(response):
+    """inspectionResult'tan saklanacak/döndürülecek alanları seçer"""
+    result = (response or {}).get("inspectionResult", {})
+    index_status = result.get("indexStatusResult", {})
+    return {
+        "verdict": index_status.get("verdict"),
+        "coverageState": index_status.get("coverageState"),
+        "indexingState": index_status.get("indexingState"),
+        "robotsTxtState": index_status.get("robotsTxtState"),
+        "pageFetchState": index_status.get("pageFetchState"),
+        "lastCrawlTime": index_status.get("lastCrawlTime"),
+        "crawledAs": index_status.get("crawledAs"),
+        "googleCanonical": index_status.get("googleCanonical"),
+        "userCanonical": index_status.get("userCanonical"),
+        "mobileUsability": result.get("mobileUsabilityResult", {}).get("verdict"),
+        "richResults": result.get("richResultsResult", {}).get("verdict"),
+        "inspectionResultLink": result.get("inspectionResultLink"),
+    }
+
+
+# ---------- URL toplama ----------
+def prepare_urls(property_url, urls, limit=URL_INSPECTION_MAX_URLS):
+    """
+    URL listesini sadeleştirir: boşlar ve tekrarlar atılır, mülk kapsamı dışındakiler ayrılır.
+
+    Returns:
+        tuple: (incelenecek URL'ler, kapsam dışı URL sayısı)
+    """
+    seen = set()
+    accepted = []
+    rejected = 0
+    for url in urls:
+        url = (url or "").strip()
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        if not property_covers(property_url, url):
+            rejected += 1
+            continue
+        accepted.append(url)
+    if len(accepted) > limit:
+        raise InspectionError(f"At most {limit} URLs can be inspected in one job")
+    return accepted, rejected
+
+
+async def _read_body(response, limit=SITEMAP_MAX_BYTES):
+    """
+    Yanıt gövdesini parça parça okur; gzip'li gövdeyi de aynı sınırla açar.
+
+    Raises:
+        InspectionError: Gövde (açılmış hali) sınırı aşarsa
+    """
+    body = bytearray()
+    decompressor = None
+    first = True
+    async for chunk in response.aiter_bytes():
+        if first:
+            first = False
+            if chunk[:2] == b"\x1f\x8b":
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if decompressor is not None:
+            # En fazla limit + 1 bayt açılır; fazlası sınır aşımı demektir
+            chunk = decompressor.decompress(chunk, limit - len(body) + 1)
+        body += chunk
+        if len(body) > limit:
+            raise InspectionError(f"Sitemap exceeds {limit // (1024 * 1024)} MB")
+    return bytes(body)
+
+
+async def _fetch_sitemap(client, property_url, url):
+    """
+    Sitemap'i indirir; yönlendirmeler tek tek izlenir ve her adım mülk kapsamında olmalıdır.
+
+    Returns:
+        bytes: Sıkıştırılmamış sitemap içeriği
+    """
+    for _ in range(SITEMAP_MAX_REDIRECTS + 1):
+        async with client.stream("GET", url, follow_redirects=False) as response:
+            if response.is_redirect:
+                location = urljoin(url, response.headers.get("location", ""))
+                if not property_covers(property_url, location):
+                    raise InspectionError(f"Sitemap redirects outside the inspected property ({location})")
+                url = location
+                continue
+            response.raise_for_status()
+            return await _read_body(response)
+    raise InspectionError(f"Too many redirects ({url})")
+
+
+async def fetch_sitemap_urls(property_url, sitemap_url, limit=URL_INSPECTION_MAX_URLS):
+    """
+    Sitemap'teki (ya da sitemap index'indeki alt sitemap'lerdeki) URL'leri döndürür.
+
+    Sadece mülk kapsamındaki sitemap'ler okunur (yönlendirmeler dahil); gzip'li
+    sitemap'ler desteklenir, içerik SITEMAP_MAX_BYTES ile sınırlıdır.
+    """
+    if not property_covers(property_url, sitemap_url):
+        raise InspectionError("Sitemap must belong to the inspected property")
+
+    client = get_http_client()
+    queue = [sitemap_url]
+    seen = set()
+    urls = []
+    while queue and len(urls) < limit:
+        current = queue.pop(0)
+        if current in seen or not property_covers(property_url, current):
+            continue
+        seen.add(current)
+        if len(seen) > URL_INSPECTION_MAX_SITEMAPS:
+            break
+
+        try:
+            root = ET.fromstring(await _fetch_sitemap(client, property_url, current))
+        except InspectionError:
+            raise
+        except Exception as e:
+            raise InspectionError(f"Sitemap could not be read ({current}): {e}")
+
+        locations = [
+            element.text.strip()
+            for element in root.iter()
+            if element.tag.endswith("loc") and element.text and element.text.strip()
+        ]
+        if root.tag.endswith("sitemapindex"):
+            queue.extend(locations)
+        else:
+            urls.extend(locations)
+
+    return urls[:limit]
+
+
+# ---------- Kota ----------
+async def quota_used(db, property_url, day_start):
+    """Mülkün `day_start` kota gününde kullandığı inceleme hakkı (tüm süreçler ve tekil incelemeler)"""
+    used = await db.scalar(
+        select(UrlInspectionQuotaUsage.used)
+        .where(UrlInspectionQuotaUsage.property_url == property_url, UrlInspectionQuotaUsage.day_start == day_start)
+    )
+    return used or 0
+
+
+class PropertyQuota:
+    """
+    Mülk başına günlük kota (dakika limiti kota yöneticisindedir).
+
+    Sayaç DB'de tutulur ve her inceleme hakkı tek bir upsert ile atomik olarak
+    ayrılır; tüm replikalar ve tekil /inspect-url çağrıları aynı günlük
+    bütçeyi paylaşır. Süreç yalnızca kotanın dolduğu günü hatırlar.
+    """
+
+    def __init__(self, property_url):
+        self.property_url = property_url
+        # Son görülen sayaç değeri (metrikler için)
+        self.used_today = 0
+        self.exhausted_until = None
+
+    async def acquire(self, session_factory):
+        """
+        Bir inceleme hakkı ayırır.
+
+        Returns:
+            datetime | None: Gün kotası dolduysa kotanın sıfırlanacağı zaman (naive UTC)
+        """
+        day_start, reset_at = quota_day_bounds()
+        if self.exhausted_until == reset_at:
+            return reset_at
+
+        stmt = pg_insert(UrlInspectionQuotaUsage).values(
+            property_url=self.property_url, day_start=day_start, used=1
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UrlInspectionQuotaUsage.property_url, UrlInspectionQuotaUsage.day_start],
+            set_={"used": UrlInspectionQuotaUsage.used + 1},
+            where=UrlInspectionQuotaUsage.used < URL_INSPECTION_QPD
+        ).returning(UrlInspectionQuotaUsage.used)
+        async with session_factory() as db:
+            used = (await db.execute(stmt)).scalar_one_or_none()
+            await db.commit()
+
+        if used is None:
+            self.used_today = URL_INSPECTION_QPD
+            self.exhausted_until = reset_at
+            return reset_at
+        self.used_today = used
+        return None
+
+    def stats(self):
+        return {
+            "usedToday": self.used_today,
+            "dailyLimit": URL_INSPECTION_QPD,
+        }
+
+
+# mülk URL'si -> PropertyQuota (aynı mülkteki tüm işler paylaşır)
+_quotas = {}
+
+
+def _get_quota(property_url):
+    quota = _quotas.get(property_url)
+    if quota is None:
+        quota = PropertyQuota(property_url)
+        _quotas[property_url] = quota
+    return quota
+
+
+async def reserve_inspection(session_factory, property_url):
+    """
+    Tekil inceleme için mülkün günlük kotasından bir hak ayırır.
+
+    Raises:
+        QuotaExceededError: Gün kotası dolduysa (Retry-After: sıfırlanmaya kalan süre)
+    """
+    reset_at = await _get_quota(property_url).acquire(session_factory)
+    if reset_at is not None:
+        raise QuotaExceededError("urlInspection.inspect", (reset_at - _utcnow()).total_seconds(), daily=True)
+
+
+async def prune_quota_usage(session_factory):
+    """Geçmiş kota günlerinin sayaçlarını siler"""
+    day_start, _ = quota_day_bounds()
+    async with session_factory() as db:
+        await db.execute(delete(UrlInspectionQuotaUsage).where(UrlInspectionQuotaUsage.day_start < day_start))
+        await db.commit()
+
+
+# ---------- İşler ----------
+async def create_job(db, user_id, property_url, urls):
+    """İşi ve URL satırlarını oluşturur; iş bu süreç adına sahiplenilmiş olarak döner"""
+    job = UrlInspectionJob(
+        user_id=user_id,
+        property_url=property_url,
+        status="pending",
+        total=len(urls),
+        completed=0,
+        failed=0,
+        claimed_by=WORKER_ID,
+        heartbeat_at=_utcnow()
+    )
+    db.add(job)
+    await db.flush()
+    for i in range(0, len(urls), URL_INSPECTION_INSERT_BATCH):
+        await db.execute(
+            insert(UrlInspectionItem),
+            [{"job_id": job.id, "url": url, "status": "pending"} for url in urls[i:i + URL_INSPECTION_INSERT_BATCH]]
+        )
+    await db.commit()
+    return job
+
+
+async def get_job(db, job_id, user_id):
+    result = await db.execute(
+        select(UrlInspectionJob).where(UrlInspectionJob.id == job_id, UrlInspectionJob.user_id == user_id)
+    )
+    return result.scalar_one_or_none()
+
+
+def job_to_dict(job):
+    quota = _quotas.get(job.property_url)
+    return {
+        "jobId": job.id,
+        "property": job.property_url,
+        "status": job.status,
+        "total": job.total,
+        "completed": job.completed,
+        "failed": job.failed,
+        "error": job.error,
+        "createdAt": job.created_at.isoformat() if job.created_at else None,
+        "finishedAt": job.finished_at.isoformat() if job.finished_at else None,
+        "quota": quota.stats() if quota else None,
+    }
+
+
+def item_to_dict(item):
+    return {
+        "seq": item.seq,
+        "url": item.url,
+        "status": item.status,
+        "result": item.result,
+        "error": item.error,
+        "inspectedAt": item.inspected_at.isoformat() if item.inspected_at else None,
+    }
+
+
+async def list_results(db, job_id, offset=0, limit=URL_INSPECTION_PAGE_SIZE):
+    """İşin bitiş sırası `offset`ten büyük olan sonuçları döndürür"""
+    result = await db.execute(
+        select(UrlInspectionItem)
+        .where(UrlInspectionItem.job_id == job_id, UrlInspectionItem.seq > offset)
+        .order_by(UrlInspectionItem.seq)
+        .limit(limit)
+    )
+    return [item_to_dict(item) for item in result.scalars()]
+
+
+# iş ID'si -> ilerleme bekleyenleri uyandıran event
+_progress = {}
+
+
+def _progress_event(job_id):
+    event = _progress.get(job_id)
+    if event is None:
+        event = asyncio.Event()
+        _progress[job_id] = event
+    return event
+
+
+def _notify(job_id):
+    event = _progress.pop(job_id, None)
+    if event is not None:
+        event.set()
+
+
+async def iter_results(session_factory, job_id, offset=0):
+    """
+    Sonuçları bitiş sırasıyla döndürür; iş sürüyorsa yeni sonuçları bekleyerek iş bitene kadar devam eder.
+
+    Akış yanıtları istek bittikten sonra da okunduğundan kendi session'larını açar.
+    """
+    last = offset
+    while True:
+        # Sorgudan önce alınır: sorgu ile bekleme arasında gelen bildirim kaçmaz
+        event = _progress_event(job_id)
+        async with session_factory() as db:
+            rows = await list_results(db, job_id, last)
+            status = None if rows else await db.scalar(
+                select(UrlInspectionJob.status).where(UrlInspectionJob.id == job_id)
+            )
+
+        for row in rows:
+            last = row["seq"]
+            yield row
+        if rows:
+            continue
+        if status is None or status in FINISHED_STATUSES:
+            return
+        # Başka süreçte çalışan işler için bildirim gelmez; periyodik olarak tekrar bakılır
+        try:
+            await asyncio.wait_for(event.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _set_status(session_factory, job_id, status, **values):
+    async with session_factory() as db:
+        await db.execute(
+            update(UrlInspectionJob)
+            .where(
+                UrlInspectionJob.id == job_id,
+                UrlInspectionJob.claimed_by == WORKER_ID,
+                UrlInspectionJob.status.in_(ACTIVE_STATUSES)
+            )
+            .values(status=status, **values)
+        )
+        await db.commit()
+
+
+async def _inspect(session_factory, credential_loader, job, quota, url):
+    """
+    Tek URL'yi kota dahilinde inceler; 429/5xx tekrar denemeleri kota yöneticisindedir.
+
+    Returns:
+        tuple: (özet sonuç, hata mesajı)
+    """
+    while True:
+        reset_at = await quota.acquire(session_factory)
+        if reset_at is not None:
+            wait = (reset_at - _utcnow()).total_seconds()
+        else:
+            try:
+                creds = await credential_loader(job.user_id)
+                service = get_service("searchconsole", "v1", creds)
+                response = await execute(
+                    service.urlInspection().index().inspect(
+                        body={"inspectionUrl": url, "siteUrl": job.property_url}
+                    ),
+                    "urlInspection.inspect",
+                    property_key=job.property_url,
+                    user_id=job.user_id
+                )
+                return summarize_inspection(response), None
+            except QuotaExceededError as e:
+                wait = e.retry_after
+            except Exception as e:
+                return None, str(e)
+
+        # Kota doldu: iş kota açılana kadar bekler, URL kaybedilmez
+        await _set_status(session_factory, job.id, "throttled")
+        await asyncio.sleep(max(1.0, wait))
+        await _set_status(session_factory, job.id, "running")
+
+
+async def _record(session_factory, job, item_id, url, result, error):
+    """
+    Sonucu yazar, URL'nin inceleme geçmişine işler ve iş sayaçlarını artırır.
+
+    Sayaç güncellemesi iş satırını kilitlediği için seq (completed + failed)
+    commit sırasıyla artar; okuyucular seq'e göre boşluksuz ilerler.
+    """
+    job_id = job.id
+    ok = error is None
+    async with session_factory() as db:
+        if ok:
+            await record_inspection(db, job.user_id, job.property_url, url, result)
+        result_row = await db.execute(
+            update(UrlInspectionJob)
+            .where(UrlInspectionJob.id == job_id)
+            .values(
+                completed=UrlInspectionJob.completed + (1 if ok else 0),
+                failed=UrlInspectionJob.failed + (0 if ok else 1),
+                heartbeat_at=_utcnow()
+            )
+            .returning(UrlInspectionJob.completed + UrlInspectionJob.failed)
+        )
+        seq = result_row.scalar_one()
+        await db.execute(
+            update(UrlInspectionItem)
+            .where(UrlInspectionItem.id == item_id)
+            .values(
+                status="ok" if ok else "error",
+                seq=seq,
+                result=result,
+                error=error,
+                inspected_at=_utcnow()
+            )
+        )
+        await db.commit()
+    _notify(job_id)
+
+
+async def _worker(session_factory, credential_loader, job, quota, queue):
+    while True:
+        try:
+            item_id, url = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        result, error = await _inspect(session_factory, credential_loader, job, quota, url)
+        await _record(session_factory, job, item_id, url, result, error)
+
+
+async def _heartbeat(session_factory, job_id):
+    """
+    İş sürdükçe sahipliği tazeler.
+
+    İş iptal edildiyse ya da sahiplik başka sürece geçtiyse döner; run_job işi bırakır.
+    """
+    while True:
+        await asyncio.sleep(URL_INSPECTION_LEASE_SECONDS / 3)
+        async with session_factory() as db:
+            result = await db.execute(
+                update(UrlInspectionJob)
+                .where(
+                    UrlInspectionJob.id == job_id,
+                    UrlInspectionJob.claimed_by == WORKER_ID,
+                    UrlInspectionJob.status.in_(ACTIVE_STATUSES)
+                )
+                .values(heartbeat_at=_utcnow())
+            )
+            await db.commit()
+        if result.rowcount == 0:
+            return
+
+
+async def run_job(session_factory, credential_loader, job_id):
+    """
+    İşin bekleyen URL'lerini inceler.
+
+    Yarıda kalan iş (yeniden başlatma, çökme) yalnızca 'pending' URL'lerle devam eder.
+    """
+    async with session_factory() as db:
+        job = await db.get(UrlInspectionJob, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return
+        job.status = "running"
+        await db.commit()
+        pending = (await db.execute(
+            select(UrlInspectionItem.id, UrlInspectionItem.url)
+            .where(UrlInspectionItem.job_id == job_id, UrlInspectionItem.status == "pending")
+            .order_by(UrlInspectionItem.id)
+        )).all()
+
+    queue = asyncio.Queue()
+    for row in pending:
+        queue.put_nowait((row.id, row.url))
+
+    quota = _get_quota(job.property_url)
+    heartbeat = asyncio.create_task(_heartbeat(session_factory, job_id))
+    workers = [
+        asyncio.create_task(_worker(session_factory, credential_loader, job, quota, queue))
+        for _ in range(max(1, min(URL_INSPECTION_CONCURRENCY, len(pending))))
+    ]
+    try:
+        waiting = set(workers) | {heartbeat}
+        while not all(task.done() for task in workers):
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+            if heartbeat in done:
+                # İptal edildi ya da başka süreç devraldı: durumu ona bırak
+                for task in workers:
+                    task.cancel()
+                return
+    except BaseException as e:
+        for task in workers:
+            task.cancel()
+        if isinstance(e, (asyncio.CancelledError, KeyboardInterrupt)):
+            # Kapanış/iptal: durum değiştirilmez, aktif iş başka süreçte ya da yeniden başlatmada devam eder
+            raise
+        await _set_status(session_factory, job_id, "failed", error=str(e), finished_at=_utcnow())
+        _notify(job_id)
+        raise
+    finally:
+        heartbeat.cancel()
+
+    await _set_status(session_factory, job_id, "completed", finished_at=_utcnow())
+    _notify(job_id)
+
+
+# iş ID'si -> bu süreçte çalışan görev
+_running = {}
+
+
+def start_job(session_factory, credential_loader, job_id):
+    """İşi arka planda başlatır; zaten çalışıyorsa mevcut görevi döndürür"""
+    task = _running.get(job_id)
+    if task is None:
+        task = asyncio.create_task(run_job(session_factory, credential_loader, job_id))
+        _running[job_id] = task
+        task.add_done_callback(lambda t: _on_job_done(job_id, t))
+    return task
+
+
+def _on_job_done(job_id, task):
+    _running.pop(job_id, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"URL inceleme işi başarısız (job_id={job_id}): {task.exception()}")
+
+
+async def cancel_job(session_factory, job_id):
+    async with session_factory() as db:
+        await db.execute(
+            update(UrlInspectionJob)
+            .where(UrlInspectionJob.id == job_id, UrlInspectionJob.status.in_(ACTIVE_STATUSES))
+            .values(status="cancelled", finished_at=_utcnow())
+        )
+        await db.commit()
+    task = _running.get(job_id)
+    if task is not None:
+        task.cancel()
+    _notify(job_id)
+
+
+async def claim_orphaned_jobs(session_factory):
+    """
+    Sahipsiz ya da canlılık sinyali eskimiş aktif işleri bu süreç adına sahiplenir.
+
+    Returns:
+        list: Sahiplenilen iş ID'leri
+    """
+    stale_before = _utcnow() - datetime.timedelta(seconds=URL_INSPECTION_LEASE_SECONDS)
+    async with session_factory() as db:
+        result = await db.execute(
+            update(UrlInspectionJob)
+            .where(
+                UrlInspectionJob.status.in_(ACTIVE_STATUSES),
+                or_(UrlInspectionJob.claimed_by.is_(None), UrlInspectionJob.heartbeat_at < stale_before)
+            )
+            .values(claimed_by=WORKER_ID, heartbeat_at=_utcnow())
+            .returning(UrlInspectionJob.id)
+        )
+        job_ids = list(result.scalars())
+        await db.commit()
+    return job_ids
+
+
+async def run_recovery_loop(session_factory, credential_loader, interval=60):
+    """Yarıda kalmış işleri (açılışta ve periyodik olarak) devralıp devam ettirir"""
+    while True:
+        try:
+            for job_id in await claim_orphaned_jobs(session_factory):
+                print(f"URL inceleme işi devam ettiriliyor: {job_id}")
+                start_job(session_factory, credential_loader, job_id)
+        except Exception as e:
+            print(f"URL inceleme işleri devralınamadı: {e}")
+        await asyncio.sleep(interval)
+
+
+# ---------- Yeniden inceleme ----------
+async def _find_site_id(db, user_id, property_url):
+    """Mülke karşılık gelen (gösterim rollup'ları tutulan) kullanıcı sitesi"""
+    host = site_utils.site_host(property_url.removeprefix(DOMAIN_PROPERTY_PREFIX))
+    return await db.scalar(select(Site.id).where(Site.user_id == user_id, Site.site_host == host))
+
+
+async def schedule_reinspection(session_factory, credential_loader, user_id, property_url, limit=None, dry_run=False):
+    """
+    Sonucu eskiyen ya da gösterimleri belirgin değişen URL'ler için yeniden inceleme işi başlatır.
+
+    İş, günlük kotanın URL_REINSPECT_QUOTA_SHARE payının o gün kalanıyla sınırlanır;
+    mülkte aktif iş varsa yeni iş açılmaz.
+
+    Returns:
+        dict: Seçim özeti; iş açıldıysa 'job', dry_run ise 'urls' içerir
+    """
+    async with session_factory() as db:
+        if db.bind.dialect.name == "postgresql":
+            locked = await db.scalar(
+                select(func.pg_try_advisory_xact_lock(REINSPECT_LOCK_ID, func.hashtext(property_url)))
+            )
+            if not locked:
+                return {"selected": 0, "skipped": "locked"}
+
+        active = await db.scalar(
+            select(UrlInspectionJob.id)
+            .where(UrlInspectionJob.property_url == property_url, UrlInspectionJob.status.in_(ACTIVE_STATUSES))
+            .limit(1)
+        )
+        if active is not None:
+            return {"selected": 0, "skipped": "active job", "activeJobId": active}
+
+        day_start, _ = quota_day_bounds()
+        budget = int(URL_INSPECTION_QPD * URL_REINSPECT_QUOTA_SHARE) - await quota_used(db, property_url, day_start)
+        budget = max(0, min(budget, URL_INSPECTION_MAX_URLS, limit if limit is not None else budget))
+
+        site_id = await _find_site_id(db, user_id, property_url)
+        selection = await select_for_reinspection(db, property_url, budget, site_id=site_id)
+        summary = {
+            "selected": len(selection["urls"]),
+            "changed": selection["changed"],
+            "stale": selection["stale"],
+            "budget": budget,
+        }
+        if dry_run:
+            await db.rollback()
+            return {**summary, "urls": selection["urls"]}
+        if not selection["urls"]:
+            # Yeni gösterim referansları yine de saklanır
+            await db.commit()
+            return summary
+
+        job = await create_job(db, user_id, property_url, selection["urls"])
+
+    start_job(session_factory, credential_loader, job.id)
+    print(f"Yeniden inceleme işi başlatıldı: {job.id} ({property_url}, {summary['changed']} değişen, {summary['stale']} eski)")
+    return {**summary, "job": job_to_dict(job)}
+
+
+async def run_reinspection_loop(session_factory, credential_loader, interval=URL_REINSPECT_INTERVAL_SECONDS):
+    """İncelenmiş URL'si olan her mülk için periyodik olarak yeniden inceleme planlar"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await prune_quota_usage(session_factory)
+        except Exception as e:
+            print(f"Eski kota sayaçları silinemedi: {e}")
+        try:
+            async with session_factory() as db:
+                rows = (await db.execute(
+                    select(InspectedUrl.property_url, InspectedUrl.user_id, func.max(InspectedUrl.checked_at))
+                    .group_by(InspectedUrl.property_url, InspectedUrl.user_id)
+                )).all()
+            # Mülk başına en son inceleyen kullanıcı
+            owners = {}
+            for property_url, user_id, checked_at in sorted(rows, key=lambda row: row[2]):
+                owners[property_url] = user_id
+
+            for property_url, user_id in owners.items():
+                try:
+                    await schedule_reinspection(session_factory, credential_loader, user_id, property_url)
+                except Exception as e:
+                    print(f"Yeniden inceleme planlanamadı ({property_url}): {e}")
+        except Exception as e:
+            print(f"Yeniden inceleme taraması başarısız: {e}")
+
+
+# Arka plan döngülerinin görevleri
+_background = []
+
+
+def start_background_tasks(session_factory, credential_loader):
+    """Yarıda kalan işleri devralma ve yeniden inceleme döngülerini başlatır"""
+    if not _background:
+        _background.append(asyncio.create_task(run_recovery_loop(session_factory, credential_loader)))
+        _background.append(asyncio.create_task(run_reinspection_loop(session_factory, credential_loader)))
+
+
+async def release_jobs(session_factory):
+    """Kapanışta bu sürecin işlerini bırakır; başka süreç beklemeden devralabilir"""
+    while _background:
+        _background.pop().cancel()
+    for task in list(_running.values()):
+        task.cancel()
+    async with session_factory() as db:
+        await db.execute(
+            update(UrlInspectionJob)
+            .where(UrlInspectionJob.claimed_by == WORKER_ID, UrlInspectionJob.status.in_(ACTIVE_STATUSES))
+            .values(claimed_by=None)
+        )
+        await db.commit()
+
+
+def stats():
+    return {
+        "running": len(_running),
+        "properties": {url: quota.stats() for url, quota in _quotas.items()},
+    }
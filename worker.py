@@ -0,0 +1,39 @@
+# worker.py
+"""
+Arka plan işlerini (gece ön hesaplamaları) API'den ayrı bir süreçte çalıştırır.
+
+API süreçlerinde JOB_WORKER_ENABLED=false verilerek işler yalnızca burada çalıştırılır.
+"""
+import asyncio
+
+from main import (
+    engine,
+    job_scheduler,
+    check_schema_version,
+    warm_up_google_services,
+    shutdown_google_services,
+    get_http_client,
+    close_http_client,
+)
+
+
+async def main():
+    await check_schema_version(engine)
+    warm_up_google_services()
+    get_http_client()
+    job_scheduler.start()
+    print("Arka plan worker'ı başladı")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_scheduler.stop()
+        shutdown_google_services()
+        await close_http_client()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass